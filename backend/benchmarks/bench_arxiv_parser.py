@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+arXiv Atom parser microbenchmark.
+Compares the original ElementTree parser (ET.fromstring + namespaced find calls)
+with the streaming parser in services.arxiv_service. Reports entries per second
+and peak Python heap (tracemalloc; lxml's C allocations are not counted).
+
+Usage:
+    python benchmarks/bench_arxiv_parser.py                      # synthetic 100/1000/5000-entry feeds
+    python benchmarks/bench_arxiv_parser.py --feed saved.xml     # recorded feeds
+    python benchmarks/bench_arxiv_parser.py --record feed.xml --query "cat:cs.LG" --max-results 500
+"""
+import argparse
+import gc
+import os
+import re
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.feeds import make_feed  # noqa: E402
+from services import arxiv_service  # noqa: E402
+from services.arxiv_service import ARXIV_NS  # noqa: E402
+
+
+# --- Original implementation, kept here as the baseline ---
+
+def legacy_parse_entry(entry: ET.Element) -> Dict:
+    def text(tag, ns="atom"):
+        el = entry.find(f"{ns}:{tag}", ARXIV_NS) if ns else entry.find(tag)
+        return el.text.strip() if el is not None and el.text else None
+
+    raw_id = text("id") or ""
+    arxiv_id = raw_id.replace("http://arxiv.org/abs/", "").replace("https://arxiv.org/abs/", "")
+    authors = []
+    for author_el in entry.findall("atom:author", ARXIV_NS):
+        name_el = author_el.find("atom:name", ARXIV_NS)
+        if name_el is not None and name_el.text:
+            authors.append(name_el.text.strip())
+    categories = []
+    primary_category = None
+    for cat_el in entry.findall("atom:category", ARXIV_NS):
+        term = cat_el.get("term")
+        if term:
+            categories.append(term)
+    pc_el = entry.find("arxiv:primary_category", ARXIV_NS)
+    if pc_el is not None:
+        primary_category = pc_el.get("term")
+    pdf_url = abstract_url = doi_url = None
+    for link_el in entry.findall("atom:link", ARXIV_NS):
+        rel = link_el.get("rel", "")
+        title = link_el.get("title", "")
+        href = link_el.get("href", "")
+        if rel == "alternate":
+            abstract_url = href
+        elif title == "pdf":
+            pdf_url = href
+        elif title == "doi":
+            doi_url = href
+    published = text("published")
+    updated = text("updated")
+    year = None
+    if published:
+        match = re.search(r"(\d{4})", published)
+        if match:
+            year = int(match.group(1))
+    summary = re.sub(r"\s+", " ", text("summary") or "").strip()
+    title = re.sub(r"\s+", " ", text("title") or "").strip()
+    return {
+        "arxiv_id": arxiv_id, "title": title, "summary": summary, "authors": authors,
+        "categories": categories, "primary_category": primary_category, "published": published,
+        "updated": updated, "year": year, "pdf_url": pdf_url, "abstract_url": abstract_url,
+        "doi_url": doi_url, "doi": text("doi", "arxiv"), "comment": text("comment", "arxiv"),
+        "journal_ref": text("journal_ref", "arxiv"),
+    }
+
+
+def legacy_parse_feed(xml_text: str) -> Dict:
+    root = ET.fromstring(xml_text)
+    total_el = root.find("opensearch:totalResults", ARXIV_NS)
+    start_el = root.find("opensearch:startIndex", ARXIV_NS)
+    papers = [p for p in (legacy_parse_entry(e) for e in root.findall("atom:entry", ARXIV_NS)) if p["title"] != "Error"]
+    return {
+        "total_results": int(total_el.text) if total_el is not None and total_el.text else 0,
+        "start_index": int(start_el.text) if start_el is not None and start_el.text else 0,
+        "papers": papers,
+    }
+
+
+# --- Harness ---
+
+def measure(fn: Callable, payload, repeat: int) -> Tuple[float, int, Dict]:
+    """Best-of-N wall time and peak traced memory for one parse."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = fn(payload)
+        best = min(best, time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    fn(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def run(feeds: List[Tuple[str, bytes]], repeat: int):
+    backend = "lxml" if arxiv_service._lxml_etree is not None and arxiv_service.ARXIV_PARSER != "stdlib" else "xml.etree"
+    print(f"streaming backend: {backend}")
+    print(f"{'feed':<28}{'entries':>8}{'parser':>11}{'entries/s':>12}{'ms':>9}{'peak KiB':>10}")
+    for name, content in feeds:
+        legacy_time, legacy_peak, legacy = measure(legacy_parse_feed, content.decode("utf-8"), repeat)
+        new_time, new_peak, new = measure(arxiv_service._parse_feed, content, repeat)
+        if legacy != new:
+            print(f"  WARNING: parsers disagree on {name}")
+        n = len(new["papers"])
+        for label, elapsed, peak in (("legacy", legacy_time, legacy_peak), ("streaming", new_time, new_peak)):
+            print(f"{name:<28}{n:>8}{label:>11}{n / elapsed:>12.0f}{elapsed * 1000:>9.2f}{peak / 1024:>10.0f}")
+
+
+def record(path: str, query: str, max_results: int):
+    import httpx
+
+    params = {"search_query": query, "start": 0, "max_results": max_results,
+              "sortBy": "submittedDate", "sortOrder": "descending"}
+    resp = httpx.get(arxiv_service.ARXIV_API_BASE, params=params, timeout=120.0, follow_redirects=True)
+    resp.raise_for_status()
+    with open(path, "wb") as f:
+        f.write(resp.content)
+    print(f"recorded {len(resp.content)} bytes to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feed", action="append", help="Recorded Atom feed file (repeatable)")
+    parser.add_argument("--sizes", default="100,1000,5000", help="Synthetic feed sizes when no --feed is given")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--record", help="Fetch a live feed from arXiv and save it to this path")
+    parser.add_argument("--query", default="cat:cs.LG")
+    parser.add_argument("--max-results", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.query, args.max_results)
+        sys.exit(0)
+
+    if args.feed:
+        feeds = []
+        for path in args.feed:
+            with open(path, "rb") as f:
+                feeds.append((os.path.basename(path), f.read()))
+    else:
+        feeds = [(f"synthetic-{n}", make_feed(n).encode("utf-8")) for n in map(int, args.sizes.split(","))]
+    run(feeds, args.repeat)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Discover endpoint latency benchmark.
+Fires concurrent requests at /api/discover/search and /api/discover/trends on a
+running server and reports p50/p99 latency per endpoint. Run it once against the
+baseline build and once against the current build to compare.
+
+Usage:
+    python benchmarks/bench_discover.py --base-url http://localhost:8001
+        --email bench@example.com --password secret --requests 50 --concurrency 5
+"""
+import argparse
+import asyncio
+import math
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+DEFAULT_QUERIES = ["transformers", "diffusion models", "graph neural networks", "reinforcement learning"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    resp = await client.post("/api/auth/login", json={"email": email, "password": password})
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+async def run_endpoint(client: httpx.AsyncClient, path: str, queries: List[str], total: int, concurrency: int, extra: Dict) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal errors
+        params = {"query": queries[i % len(queries)], **extra}
+        async with sem:
+            started = time.perf_counter()
+            try:
+                resp = await client.get(path, params=params)
+                resp.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                return
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    wall = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(total)])
+    wall = time.perf_counter() - wall
+
+    return {
+        "endpoint": path,
+        "requests": total,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": statistics.fmean(latencies) if latencies else 0.0,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+    }
+
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120.0) as client:
+        token = args.token or await login(client, args.email, args.password)
+        client.headers["Authorization"] = f"Bearer {token}"
+
+        queries = args.query or DEFAULT_QUERIES
+        results = [
+            await run_endpoint(client, "/api/discover/search", queries, args.requests, args.concurrency, {"limit": 10}),
+            await run_endpoint(client, "/api/discover/trends", queries, args.requests, args.concurrency, {}),
+        ]
+
+    print(f"{'endpoint':<24}{'n':>6}{'err':>6}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'req/s':>8}")
+    for r in results:
+        print(
+            f"{r['endpoint']:<24}{r['requests']:>6}{r['errors']:>6}"
+            f"{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['mean_ms']:>10.1f}{r['throughput_rps']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--token", help="Bearer token (skips login)")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--query", action="append", help="Query to rotate through (repeatable)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+arXiv harvester run against a local stand-in feed.
+Starts a small HTTP server that answers arXiv API queries with synthetic
+submittedDate-sorted pages (benchmarks.feeds), points ARXIV_API_BASE at it and
+runs services.harvester over the given categories. Reports papers per minute and
+the checkpoints left behind; with --max-per-run smaller than the corpus, the
+second pass shows the harvest resuming from its checkpoint.
+
+Usage:
+    python benchmarks/bench_harvester.py                           # 2 categories x 2000 papers, no rate limit
+    python benchmarks/bench_harvester.py --interval 3 --papers 600  # with arXiv's 3s request interval
+    python benchmarks/bench_harvester.py --max-per-run 1000 --passes 2
+    python benchmarks/bench_harvester.py --serve 8099               # only run the stand-in feed
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.feeds import make_feed  # noqa: E402
+
+
+class StandinFeed(BaseHTTPRequestHandler):
+    """Serves `papers` entries per category, newest first, paged by start/max_results."""
+
+    papers = 2000
+    latency = 0.0
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        search = query.get("search_query", [""])[0]
+        start = int(query.get("start", ["0"])[0])
+        max_results = int(query.get("max_results", ["10"])[0])
+        match = re.search(r"cat:(\S+)", search)
+        category = match.group(1) if match else "cs.LG"
+        count = max(0, min(max_results, self.papers - start))
+        body = make_feed(count, start=start, total=self.papers, category=category).encode("utf-8")
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/atom+xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), StandinFeed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(args):
+    server = serve(0)
+    workdir = tempfile.mkdtemp(prefix="harvest-bench-")
+    # Configure the services before they are imported
+    os.environ["ARXIV_API_BASE"] = f"http://127.0.0.1:{server.server_port}/api/query"
+    os.environ["ARXIV_MIN_INTERVAL"] = str(args.interval or 0.001)
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("PAPER_STORE_PATH", f"{workdir}/paper_store.db")
+    os.environ["HARVEST_CATEGORIES"] = args.categories
+    os.environ["HARVEST_PAGE_SIZE"] = str(args.page_size)
+    os.environ["HARVEST_MAX_PER_RUN"] = str(args.max_per_run)
+
+    from db.postgres import init_db
+    from services import harvester
+    from services.http_client import UpstreamClients
+    from services.paper_store import paper_store
+
+    init_db()
+
+    async def main():
+        UpstreamClients.start()
+        try:
+            for n in range(1, args.passes + 1):
+                started = time.perf_counter()
+                stored = await harvester.harvest_all()
+                elapsed = time.perf_counter() - started
+                print(f"pass {n}: {stored} papers in {elapsed:.2f}s ({stored / elapsed * 60:,.0f} papers/min)")
+                for cp in harvester.get_checkpoints():
+                    state = f"resume at {cp['next_start']}" if cp["in_progress"] else f"done until {cp['harvested_until']}"
+                    print(f"  {cp['category']:<8} total {cp['total_harvested']:>6}  {state}")
+        finally:
+            await UpstreamClients.close()
+
+    asyncio.run(main())
+    # The stand-in lists the same IDs in every category, like cross-listed papers
+    print(f"paper store: {paper_store.stats()['papers']} distinct papers in {workdir}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categories", default="cs.LG,cs.CL")
+    parser.add_argument("--papers", type=int, default=2000, help="Papers per category in the stand-in feed")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--max-per-run", type=int, default=5000)
+    parser.add_argument("--passes", type=int, default=1)
+    parser.add_argument("--interval", type=float, default=0.0, help="Seconds between arXiv requests (arXiv asks for 3)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per stand-in response")
+    parser.add_argument("--serve", type=int, help="Only run the stand-in feed on this port")
+    args = parser.parse_args()
+
+    StandinFeed.papers = args.papers
+    StandinFeed.latency = args.latency_ms / 1000
+    if args.serve:
+        print(f"stand-in arXiv feed on http://127.0.0.1:{args.serve}/api/query")
+        serve(args.serve)
+        threading.Event().wait()
+    else:
+        run(args)
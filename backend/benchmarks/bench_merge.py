@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Cross-source merge benchmark.
+Builds synthetic multi-search results where each paper may appear in arXiv,
+Semantic Scholar and OpenAlex with different IDs, missing DOIs and lightly
+perturbed titles, then times services.merge_service.merge_papers. Reports
+merge time per 100 results and how many duplicates were found vs. planted.
+
+Usage:
+    python benchmarks/bench_merge.py
+    python benchmarks/bench_merge.py --sizes 100,1000,10000 --dup-rate 0.5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.merge_service import merge_papers  # noqa: E402
+
+
+def _perturb(title: str, rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.3:
+        return title.upper()
+    if roll < 0.6:
+        return title.replace(" ", ": ", 1) + "."
+    return title
+
+
+def synthetic_results(n: int, dup_rate: float, seed: int = 0) -> Tuple[List[Dict], int]:
+    """About n records; returns (records, number of planted duplicates)."""
+    rng = random.Random(seed)
+    vocab = [f"word{i}" for i in range(5000)]
+    records = []
+    planted = 0
+    k = 0
+    while len(records) < n:
+        title = " ".join(rng.choice(vocab) for _ in range(rng.randint(6, 14)))
+        arxiv_id = f"2301.{k:05d}"
+        doi = f"10.1000/j.{k}" if rng.random() < 0.6 else None
+        year = 2020 + k % 5
+        copies = ["arxiv"]
+        if rng.random() < dup_rate:
+            copies += rng.sample(["semantic_scholar", "openalex"], rng.randint(1, 2))
+        for source in copies:
+            records.append({
+                "source": source,
+                "source_id": arxiv_id + "v1" if source == "arxiv" else f"{source[:2]}{k}",
+                "title": _perturb(title, rng) if source != "arxiv" else title,
+                "abstract": "x" * rng.randint(50, 1500),
+                "authors": [f"Author {j}" for j in range(rng.randint(1, 6))],
+                "year": year,
+                "citation_count": rng.randint(0, 500) if source != "arxiv" else 0,
+                "url": f"https://example.org/{source}/{k}",
+                "pdf_url": None,
+                # Only some copies carry the identifiers; the rest rely on title matching
+                "doi": doi if source != "arxiv" and rng.random() < 0.5 else None,
+                "arxiv_id": arxiv_id if source == "semantic_scholar" and rng.random() < 0.5 else None,
+                "journal": None,
+                "fields_of_study": ["cs.LG"],
+            })
+        planted += len(copies) - 1
+        k += 1
+    rng.shuffle(records)
+    return records, planted
+
+
+def run(sizes: List[int], dup_rate: float, repeat: int):
+    print(f"{'records':>8}{'planted':>9}{'merged':>8}{'ms total':>10}{'ms/100':>9}")
+    for n in sizes:
+        records, planted = synthetic_results(n, dup_rate)
+        best = float("inf")
+        merged = records
+        for _ in range(repeat):
+            started = time.perf_counter()
+            merged = merge_papers(records)
+            best = min(best, time.perf_counter() - started)
+        found = len(records) - len(merged)
+        print(f"{len(records):>8}{planted:>9}{found:>8}{best * 1000:>10.2f}{best * 1000 / len(records) * 100:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="30,100,1000,10000")
+    parser.add_argument("--dup-rate", type=float, default=0.4, help="Share of papers also returned by another source")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(",")], args.dup_rate, args.repeat)
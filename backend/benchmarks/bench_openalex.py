@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+OpenAlex decode benchmark.
+Compares the original path (full work objects, json.loads, dict + sort abstract
+rebuild) with the current one (select= projection, orjson when installed,
+preallocated abstract rebuild). Reports bytes per page and decode time per page.
+
+Usage:
+    python benchmarks/bench_openalex.py --record pages/ --query "diffusion models" --pages 5
+    python benchmarks/bench_openalex.py --pages-dir pages/
+    python benchmarks/bench_openalex.py              # synthetic pages, no network
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import openalex_service  # noqa: E402
+from services.openalex_service import OA_API, WORK_FIELDS, _parse_work, loads  # noqa: E402
+
+
+def legacy_parse_page(content: bytes) -> List[Dict]:
+    data = json.loads(content)
+    papers = []
+    for w in data.get("results", []):
+        abstract = ""
+        inv = w.get("abstract_inverted_index")
+        if inv:
+            words = {}
+            for word, positions in inv.items():
+                for pos in positions:
+                    words[pos] = word
+            abstract = " ".join(words[k] for k in sorted(words.keys()))
+        authors = [(a.get("author") or {}).get("display_name", "") for a in (w.get("authorships") or [])[:10]]
+        papers.append({"title": w.get("display_name"), "abstract": abstract[:2000], "authors": authors})
+    return papers
+
+
+def current_parse_page(content: bytes) -> List[Dict]:
+    return [_parse_work(w) for w in loads(content).get("results", [])]
+
+
+def synthetic_page(per_page: int = 50, projected: bool = False, seed: int = 0) -> bytes:
+    """A page shaped like /works output; the full variant carries the heavy fields select= drops."""
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(800)]
+    results = []
+    for n in range(per_page):
+        words = [rng.choice(vocab) for _ in range(220)]
+        inv: Dict[str, List[int]] = {}
+        for pos, word in enumerate(words):
+            inv.setdefault(word, []).append(pos)
+        work = {
+            "id": f"https://openalex.org/W{seed}{n:05d}",
+            "doi": f"https://doi.org/10.0000/{seed}.{n}",
+            "display_name": " ".join(words[:10]),
+            "title": " ".join(words[:10]),
+            "publication_year": 2020 + n % 5,
+            "cited_by_count": rng.randint(0, 5000),
+            "authorships": [{"author": {"id": f"A{k}", "display_name": f"Author {k}"}, "institutions": [{"display_name": "Inst"}] * 2} for k in range(6)],
+            "abstract_inverted_index": inv,
+            "open_access": {"is_oa": True, "oa_url": "https://example.org/pdf"},
+            "primary_location": {"source": {"display_name": "Journal"}},
+            "concepts": [{"display_name": f"Concept {k}", "score": 0.5, "level": 1, "wikidata": "Q1"} for k in range(8)],
+        }
+        if not projected:
+            work.update({
+                "referenced_works": [f"https://openalex.org/W{rng.randint(1, 10**9)}" for _ in range(45)],
+                "related_works": [f"https://openalex.org/W{rng.randint(1, 10**9)}" for _ in range(10)],
+                "counts_by_year": [{"year": 2015 + y, "cited_by_count": rng.randint(0, 300)} for y in range(10)],
+                "locations": [{"source": {"display_name": "Repo", "issn": ["0000-0000"]}, "landing_page_url": "https://example.org"}] * 4,
+                "topics": [{"display_name": f"Topic {k}", "score": 0.9, "field": {"display_name": "CS"}} for k in range(3)],
+                "mesh": [], "grants": [], "keywords": [{"display_name": f"kw{k}", "score": 0.3} for k in range(5)],
+                "ids": {"openalex": "W1", "doi": "10.0000/x", "mag": "1"},
+            })
+        results.append(work)
+    return json.dumps({"meta": {"count": 100000, "per_page": per_page}, "results": results}).encode("utf-8")
+
+
+def record(out_dir: str, query: str, pages: int):
+    import httpx
+
+    os.makedirs(out_dir, exist_ok=True)
+    base = {"search": query, "per_page": 50, "mailto": "research-search@example.com"}
+    with httpx.Client(timeout=60.0) as client:
+        for page in range(1, pages + 1):
+            for label, extra in (("full", {}), ("select", {"select": WORK_FIELDS})):
+                resp = client.get(f"{OA_API}/works", params={**base, "page": page, **extra})
+                resp.raise_for_status()
+                path = os.path.join(out_dir, f"{label}-{page}.json")
+                with open(path, "wb") as f:
+                    f.write(resp.content)
+                print(f"recorded {path} ({len(resp.content)} bytes)")
+
+
+def best_time(fn, payload: bytes, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(pairs: List[Tuple[bytes, bytes]], repeat: int):
+    codec = "orjson" if openalex_service.orjson is not None else "json"
+    print(f"codec: {codec}, pages: {len(pairs)}")
+    full_bytes = sum(len(f) for f, _ in pairs) / len(pairs)
+    sel_bytes = sum(len(s) for _, s in pairs) / len(pairs)
+    legacy_ms = sum(best_time(legacy_parse_page, f, repeat) for f, _ in pairs) / len(pairs) * 1000
+    current_ms = sum(best_time(current_parse_page, s, repeat) for _, s in pairs) / len(pairs) * 1000
+    print(f"{'path':<10}{'KiB/page':>12}{'decode ms/page':>18}")
+    print(f"{'before':<10}{full_bytes / 1024:>12.1f}{legacy_ms:>18.2f}")
+    print(f"{'after':<10}{sel_bytes / 1024:>12.1f}{current_ms:>18.2f}")
+    print(f"bytes -{(1 - sel_bytes / full_bytes) * 100:.0f}%, decode x{legacy_ms / current_ms:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", help="Directory to save live full/select pages into")
+    parser.add_argument("--pages-dir", help="Directory of recorded full-N.json / select-N.json pages")
+    parser.add_argument("--query", default="transformers")
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.query, args.pages)
+        sys.exit(0)
+
+    if args.pages_dir:
+        pairs = []
+        for full_path in sorted(glob.glob(os.path.join(args.pages_dir, "full-*.json"))):
+            select_path = full_path.replace("full-", "select-")
+            with open(full_path, "rb") as f, open(select_path, "rb") as g:
+                pairs.append((f.read(), g.read()))
+    else:
+        pairs = [(synthetic_page(seed=i), synthetic_page(projected=True, seed=i)) for i in range(args.pages)]
+    run(pairs, args.repeat)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Relevance ranking benchmark.
+Times services.ranking_service.rank_papers (BM25 over title + abstract blended
+with citations and recency) on synthetic candidate sets of realistic size.
+
+Usage:
+    python benchmarks/bench_ranking.py
+    python benchmarks/bench_ranking.py --sizes 90,300,1000 --query "graph neural networks"
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ranking_service import rank_papers  # noqa: E402
+
+
+def synthetic_candidates(n: int, query: str, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    vocab = [f"word{i}" for i in range(3000)] + query.lower().split() * 20
+    return [{
+        "title": " ".join(rng.choice(vocab) for _ in range(rng.randint(6, 14))),
+        "abstract": " ".join(rng.choice(vocab) for _ in range(rng.randint(120, 250))),
+        "citation_count": int(rng.paretovariate(1.2)) - 1,
+        "year": rng.randint(1995, 2025),
+    } for _ in range(n)]
+
+
+def run(sizes: List[int], query: str, repeat: int):
+    print(f"query: {query!r}")
+    print(f"{'candidates':>11}{'best ms':>10}{'median ms':>11}")
+    for n in sizes:
+        papers = synthetic_candidates(n, query)
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rank_papers(query, list(papers))
+            times.append(time.perf_counter() - started)
+        times.sort()
+        print(f"{n:>11}{times[0] * 1000:>10.2f}{times[len(times) // 2] * 1000:>11.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="30,90,300,1000")
+    parser.add_argument("--query", default="attention transformers for protein folding")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(",")], args.query, args.repeat)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Semantic reranking benchmark.
+Times services.embedding_service.semantic_rerank on synthetic candidate sets:
+cold (every paper encoded), warm from the SQLite cache (memory cleared) and warm
+from memory, next to the BM25 ranking it is offered as an alternative to.
+
+Usage:
+    python benchmarks/bench_semantic.py
+    python benchmarks/bench_semantic.py --sizes 90,300,1000 --query "graph neural networks"
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="embed-bench-"), "embeddings.db"))
+
+from benchmarks.bench_ranking import synthetic_candidates  # noqa: E402
+from services.embedding_service import embedding_cache, semantic_rerank  # noqa: E402
+from services.ranking_service import rank_papers  # noqa: E402
+
+
+async def _timed(query, papers) -> float:
+    started = time.perf_counter()
+    await semantic_rerank(query, list(papers))
+    return (time.perf_counter() - started) * 1000
+
+
+async def run(sizes: List[int], query: str, repeat: int):
+    print(f"query: {query!r}  cache: {embedding_cache.path}")
+    print(f"{'candidates':>11}{'cold ms':>10}{'disk ms':>10}{'memory ms':>11}{'bm25 ms':>10}")
+    for seed, n in enumerate(sizes):
+        papers = synthetic_candidates(n, query, seed=seed)
+        cold = await _timed(query, papers)
+        embedding_cache._memory.clear()
+        disk = await _timed(query, papers)
+        memory = sorted([await _timed(query, papers) for _ in range(repeat)])[repeat // 2]
+        bm25 = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rank_papers(query, list(papers))
+            bm25.append((time.perf_counter() - started) * 1000)
+        bm25.sort()
+        print(f"{n:>11}{cold:>10.2f}{disk:>10.2f}{memory:>11.2f}{bm25[repeat // 2]:>10.2f}")
+    embedding_cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="30,90,300,1000")
+    parser.add_argument("--query", default="attention transformers for protein folding")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run([int(s) for s in args.sizes.split(",")], args.query, args.repeat))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Typeahead benchmark.
+Builds a services.suggest_service index from synthetic titles and author names
+(no paper store or Neo4j needed) and times suggest() for prefixes of 1 to 12
+characters taken from indexed entries, reporting p50/p99 per prefix length.
+
+Usage:
+    python benchmarks/bench_suggest.py
+    python benchmarks/bench_suggest.py --papers 1000000 --queries 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.arxiv_service import ARXIV_CATEGORIES  # noqa: E402
+from services.suggest_service import SuggestBuilder, SuggestIndex  # noqa: E402
+
+WORDS = (
+    "learning neural network deep graph attention transformer model language vision "
+    "reinforcement policy optimization stochastic gradient bayesian inference causal "
+    "representation contrastive diffusion generative adversarial robust efficient sparse "
+    "quantum protein molecular retrieval question answering translation segmentation"
+).split()
+FIRST = "Alice Bob Chen Dmitri Elena Fatima Gustavo Hiro Ines Jamal Kenji Laura Mehmet Nadia Omar Priya".split()
+LAST = "Smith Wang Garcia Müller Kowalski Tanaka Okafor Silva Nguyen Rossi Ivanova Haddad Kim Novak Schmidt".split()
+
+
+def synthetic_builder(papers: int, seed: int = 0):
+    rng = random.Random(seed)
+    builder = SuggestBuilder()
+    categories = list(ARXIV_CATEGORIES)
+    titles = []
+    for i in range(papers):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 10))).capitalize() + f" {i}"
+        authors = [f"{rng.choice(FIRST)} {rng.choice(LAST)}{rng.randint(1, 2000)}" for _ in range(rng.randint(1, 4))]
+        builder.add_paper(title, authors, [rng.choice(categories)])
+        titles.append(title)
+    return builder, titles
+
+
+def run(args):
+    started = time.perf_counter()
+    builder, titles = synthetic_builder(args.papers)
+    index = SuggestIndex()
+    index.load(builder)
+    print(f"built {len(index._base):,} entries from {args.papers:,} papers in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(1)
+    print(f"{'prefix len':>10}{'p50 ms':>9}{'p99 ms':>9}{'avg results':>13}")
+    for length in (1, 2, 3, 5, 8, 12):
+        times, found = [], 0
+        for _ in range(args.queries):
+            prefix = rng.choice(titles)[:length]
+            started = time.perf_counter()
+            found += len(index.suggest(prefix, args.limit))
+            times.append((time.perf_counter() - started) * 1000)
+        times.sort()
+        print(f"{length:>10}{times[len(times) // 2]:>9.3f}{times[int(len(times) * 0.99)]:>9.3f}{found / args.queries:>13.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=8)
+    run(parser.parse_args())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Vector index benchmark.
+Fills a services.vector_index.VectorIndex in a temporary directory with clustered
+synthetic unit vectors (no text encoding), builds the IVF lists and times
+similar() lookups, with recall@10 against an exact scan of the same memmap. Then
+appends a batch and shows the incremental build and the tail scan.
+
+Usage:
+    python benchmarks/bench_vector_index.py
+    python benchmarks/bench_vector_index.py --size 1000000 --nprobe 8,16,32
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.embedding_service import EMBEDDING_DIM  # noqa: E402
+from services.vector_index import VectorIndex  # noqa: E402
+
+BATCH = 50000
+
+
+def clustered_vectors(rng, centers: np.ndarray, n: int, noise: float) -> np.ndarray:
+    points = centers[rng.integers(0, len(centers), n)] + rng.standard_normal((n, EMBEDDING_DIM), dtype=np.float32) * noise
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+
+def fill(index: VectorIndex, rng, centers, start: int, n: int, noise: float):
+    for i in range(start, start + n, BATCH):
+        count = min(BATCH, start + n - i)
+        keys = [f"bench:{j}" for j in range(i, i + count)]
+        docs = [{"source": "bench", "source_id": str(j), "title": f"Paper {j}"} for j in range(i, i + count)]
+        index._write(keys, docs, [""] * count, clustered_vectors(rng, centers, count, noise))
+
+
+def exact_top(vectors, row: int, k: int) -> set:
+    query = vectors[row].astype(np.float32)
+    scores = np.concatenate([vectors[i:i + 65536].astype(np.float32) @ query for i in range(0, len(vectors), 65536)])
+    scores[row] = -np.inf
+    return set(np.argpartition(-scores, k)[:k].tolist())
+
+
+def measure(index: VectorIndex, rng, queries: int, total: int, label: str):
+    vectors = index._vectors()
+    rows = rng.integers(0, total, queries)
+    times, recall = [], []
+    for row in rows:
+        started = time.perf_counter()
+        result = index.similar(f"bench:{row}", 10)
+        times.append((time.perf_counter() - started) * 1000)
+        found = {int(p["source_id"]) for p in result["papers"]}
+        recall.append(len(found & exact_top(vectors, int(row), 10)) / 10)
+    times.sort()
+    print(f"{label:<26}{times[len(times) // 2]:>9.2f}{times[int(len(times) * 0.95)]:>9.2f}"
+          f"{np.mean(recall):>10.3f}{result['candidates']:>12,}  ({result['method']})")
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix="vector-bench-")
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.topics, EMBEDDING_DIM)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    index = VectorIndex(directory)
+    started = time.perf_counter()
+    fill(index, rng, centers, 0, args.size, args.noise)
+    print(f"wrote {args.size:,} vectors in {time.perf_counter() - started:.1f}s "
+          f"({os.path.getsize(os.path.join(directory, 'vectors.f16')) / 2**20:,.0f} MiB) to {directory}")
+    print(f"{'':<26}{'p50 ms':>9}{'p95 ms':>9}{'recall@10':>10}{'candidates':>12}")
+    measure(index, rng, min(args.queries, 20), args.size, "exact scan")
+
+    print(f"build: {index.build()}")
+    for nprobe in [int(n) for n in args.nprobe.split(",")]:
+        index.nprobe = nprobe
+        measure(index, rng, args.queries, args.size, f"ivf nprobe={nprobe}")
+
+    appended = max(args.size // 100, 1)
+    fill(index, rng, centers, args.size, appended, args.noise)
+    measure(index, rng, args.queries, args.size + appended, f"+{appended:,} unbuilt tail")
+    print(f"build: {index.build()}")
+    measure(index, rng, args.queries, args.size + appended, "after incremental build")
+    index.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200000)
+    parser.add_argument("--topics", type=int, default=5000, help="Cluster centres the vectors are drawn around")
+    parser.add_argument("--noise", type=float, default=0.06, help="Per-dimension spread around each centre")
+    parser.add_argument("--nprobe", default="16")
+    parser.add_argument("--queries", type=int, default=200)
+    run(parser.parse_args())
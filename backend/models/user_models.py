@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table, Boolean, Text, Index, func
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from db.postgres import Base
@@ -84,6 +84,82 @@ class SavedArxivPaper(Base):
     user = relationship("User", back_populates="saved_arxiv_papers")
 
 
+class ArxivPaperVersion(Base):
+    __tablename__ = "arxiv_paper_versions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    base_id = Column(String(50), unique=True, index=True, nullable=False)
+    latest_version = Column(Integer, nullable=True)
+    updated = Column(String(50), nullable=True)
+    checked_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class ArxivHarvestCheckpoint(Base):
+    __tablename__ = "arxiv_harvest_checkpoints"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    category = Column(String(20), unique=True, index=True, nullable=False)
+    # Submission times are arXiv's GMT YYYYMMDDHHMM strings
+    harvested_until = Column(String(12), nullable=True)
+    window_from = Column(String(12), nullable=True)
+    window_to = Column(String(12), nullable=True)
+    next_start = Column(Integer, default=0)
+    total_harvested = Column(Integer, default=0)
+    last_run_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+
+class AISummaryCache(Base):
+    __tablename__ = "ai_summary_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # sha256 of title, abstract, model and prompt version
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)
+    model = Column(String(100), nullable=False)
+    prompt_version = Column(String(20), nullable=False)
+    title = Column(String(1000), nullable=True)
+    result = Column(Text, nullable=False)
+    # The LLM client returns text only, so token counts are estimated from length
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    latency_ms = Column(Integer, default=0)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    last_hit_at = Column(DateTime, nullable=True)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(32), unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
+    kind = Column(String(50), nullable=False)
+    # queued, running, succeeded, failed or cancelled
+    status = Column(String(20), nullable=False, index=True, default="queued")
+    payload = Column(Text, nullable=False)
+    # sha256 of kind and payload, so a repeated request can reuse an existing job
+    payload_hash = Column(String(64), nullable=False, index=True)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    # Not claimable before this (retry backoff)
+    run_after = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    # A running job whose lease has expired is treated as abandoned and claimed again
+    lease_until = Column(DateTime, nullable=True)
+    worker = Column(String(100), nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+# At most one queued or running job per user and payload, so concurrent identical requests share it
+Index(
+    "uq_jobs_pending_payload", func.coalesce(Job.user_id, 0), Job.payload_hash, unique=True,
+    sqlite_where=Job.status.in_(("queued", "running")), postgresql_where=Job.status.in_(("queued", "running")),
+)
+
 
 class Workspace(Base):
     __tablename__ = "workspaces"
@@ -1,3 +1,4 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
 from sqlalchemy.orm import Session
@@ -5,11 +6,16 @@ from db.postgres import get_db
 from models.user_models import User, SavedArxivPaper
 from schemas.arxiv_schemas import (
     ArxivSearchResponse, ArxivPaperResponse, ArxivCategoryResponse,
-    AISummaryRequest, AISummaryResponse, SavedPaperCreate, SavedPaperResponse
+    AISummaryRequest, AISummaryBatchRequest, AISummaryResponse, SavedPaperCreate, SavedPaperResponse,
+    ArxivBatchRequest, ArxivBatchResponse, ArxivVersionUpdate
 )
-from services.arxiv_service import search_arxiv, get_arxiv_paper, get_latest_papers, get_categories
-from services.ai_service import summarize_paper
+from services.arxiv_service import search_arxiv, get_arxiv_paper, get_arxiv_papers, get_latest_papers, get_categories
+from services.reading_list_service import get_version_updates
+from services.ai_service import summarize_paper, stream_summary
+from services.job_queue import accepted_response, enqueue
+from services.summary_batch import summarize_batch, AI_BATCH_MAX_PAPERS
 from services.auth_service import get_current_user
+from services.sse import SSE_HEADERS, ClosingStreamingResponse, sse_event
 
 router = APIRouter(prefix="/api/arxiv", tags=["arXiv"])
 
@@ -94,20 +100,96 @@ async def get_paper(
     return paper
 
 
+@router.post("/papers/batch", response_model=ArxivBatchResponse)
+async def get_papers_batch(
+    data: ArxivBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Resolve up to 500 arXiv IDs in a few batched upstream calls."""
+    if len(data.ids) > 500:
+        raise HTTPException(status_code=400, detail="Provide at most 500 arXiv IDs")
+
+    papers = await get_arxiv_papers(data.ids)
+
+    saved_ids = {s.arxiv_id for s in db.query(SavedArxivPaper).filter(
+        SavedArxivPaper.user_id == current_user.id
+    ).all()}
+
+    for arxiv_id, paper in papers.items():
+        paper["is_saved"] = arxiv_id in saved_ids or paper["arxiv_id"] in saved_ids
+
+    missing = [i for i in dict.fromkeys(i.strip() for i in data.ids) if i and i not in papers]
+    return {"papers": papers, "missing": missing}
+
+
 @router.post("/summarize", response_model=AISummaryResponse)
 async def ai_summarize(
     data: AISummaryRequest,
+    background: bool = Query(False, description="Queue as a background job and return 202 with a job handle"),
     current_user: User = Depends(get_current_user),
 ):
     """Generate AI summary for a paper using Gemini."""
+    if background:
+        return accepted_response(await enqueue("summarize", data.model_dump(), current_user.id))
     result = await summarize_paper(
         title=data.title,
         abstract=data.abstract,
         authors=data.authors,
+        owner=current_user.id,
     )
     return result
 
 
+@router.post("/summarize/stream")
+async def ai_summarize_stream(
+    data: AISummaryRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    AI summary as Server-Sent Events: a "section" event when each section header
+    is parsed, "token" events as text arrives, then a "summary" event with the
+    parsed result and time to first token (or an "error" event).
+    """
+    async def events():
+        summary = stream_summary(data.title, data.abstract, data.authors, owner=current_user.id)
+        try:
+            async for event in summary:
+                yield sse_event(event)
+        finally:
+            # Close it now rather than at garbage collection, so its LLM slot is freed on disconnect
+            await summary.aclose()
+
+    return ClosingStreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/summarize/batch")
+async def ai_summarize_batch(
+    data: AISummaryBatchRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    AI summaries for up to AI_BATCH_MAX_PAPERS papers as NDJSON. Duplicate papers
+    are summarized once; cached summaries come first, the rest stream back as the
+    shared worker pool finishes them, and a final "done" event reports papers/min.
+    """
+    if not data.papers:
+        raise HTTPException(status_code=400, detail="No papers to summarize")
+    if len(data.papers) > AI_BATCH_MAX_PAPERS:
+        raise HTTPException(status_code=400, detail=f"At most {AI_BATCH_MAX_PAPERS} papers per batch")
+
+    async def events():
+        batch = summarize_batch(current_user.id, [p.model_dump() for p in data.papers])
+        try:
+            async for event in batch:
+                yield json.dumps(event, separators=(",", ":")) + "\n"
+        finally:
+            # Drops the batch's queued jobs as soon as the client goes away
+            await batch.aclose()
+
+    return ClosingStreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @router.post("/save", response_model=SavedPaperResponse)
 async def save_paper(
     data: SavedPaperCreate,
@@ -158,6 +240,15 @@ async def unsave_paper(
     return {"message": "Paper removed from reading list"}
 
 
+@router.get("/reading-list/updates", response_model=List[ArxivVersionUpdate])
+async def get_reading_list_updates(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Saved papers that have a newer version on arXiv (checked by a background job)."""
+    return get_version_updates(db, current_user.id)
+
+
 @router.get("/reading-list", response_model=List[SavedPaperResponse])
 async def get_reading_list(
     current_user: User = Depends(get_current_user),
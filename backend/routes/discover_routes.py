@@ -1,22 +1,51 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
 from db.postgres import get_db
 from models.user_models import User, Workspace, WorkspacePaper
 from services.auth_service import get_current_user
 from services.semantic_scholar_service import search_semantic_scholar, get_paper_details
-from services.openalex_service import search_openalex
-from services.arxiv_service import search_arxiv
-from services.ai_service import summarize_paper
+from services.openalex_service import search_openalex, get_publication_histogram
+from services.arxiv_service import search_arxiv, to_unified
+from services.compare_service import COMPARE_MAX_PAPERS, NARRATIVE_MODES, compare, local_comparison, narrative_prompt, stream_narrative
+from services.job_queue import accepted_response, enqueue
+from services.enrichment_service import enrich_papers
+from services.hedging import call_with_hedge
+from services.merge_service import dedup_keys, merge_papers
+from services.rate_limiter import background_lane
+from services.search_cursor import InvalidCursor, decode_cursor, encode_cursor, fingerprint, seen_digest
+from services.ranking_service import rank_papers
+from services.embedding_service import semantic_rerank
+from services.vector_index import vector_index
+from services.suggest_service import KINDS as SUGGEST_KINDS, suggest_index
+from services.sse import SSE_HEADERS, ClosingStreamingResponse, sse_event
 from pydantic import BaseModel
 from datetime import datetime, timezone
 import asyncio
+import json
+import os
+import time
 
 router = APIRouter(prefix="/api/discover", tags=["Discover"])
 
+MAX_TREND_QUERIES = 5
+# Deepest result each API will page to; sources are treated as exhausted there
+SOURCE_MAX_RESULTS = {"arxiv": 30000, "semantic_scholar": 1000, "openalex": 10000}
+
+SEARCH_PREFETCH = os.environ.get("SEARCH_PREFETCH", "true").lower() in ("1", "true", "yes")
+# Next-page prefetches in flight, kept referenced until they finish
+_prefetches = set()
+
 
 # --- Schemas ---
 
+class SourceLink(BaseModel):
+    source: str
+    source_id: str
+    url: Optional[str] = None
+    pdf_url: Optional[str] = None
+
+
 class UnifiedPaper(BaseModel):
     source: str
     source_id: str
@@ -30,6 +59,24 @@ class UnifiedPaper(BaseModel):
     doi: Optional[str] = None
     journal: Optional[str] = None
     fields_of_study: List[str] = []
+    sources: List[SourceLink] = []
+    score: Optional[float] = None
+
+
+class SourceTiming(BaseModel):
+    status: str
+    latency_ms: float
+    hedged: bool = False
+    hedge_won: bool = False
+    returned: int = 0
+    error: Optional[str] = None
+
+
+class RankingInfo(BaseModel):
+    method: str
+    latency_ms: float
+    cached: int = 0
+    encoded: int = 0
 
 
 class MultiSearchResponse(BaseModel):
@@ -37,6 +84,34 @@ class MultiSearchResponse(BaseModel):
     sources_searched: List[str]
     total_results: int
     papers: List[UnifiedPaper]
+    timed_out_sources: List[str] = []
+    timings: Dict[str, SourceTiming] = {}
+    duplicates_merged: int = 0
+    # Papers left out because an earlier page of the same search already returned them
+    already_seen: int = 0
+    ranking: Optional[RankingInfo] = None
+    next_cursor: Optional[str] = None
+
+
+class SimilarPapersResponse(BaseModel):
+    paper: UnifiedPaper
+    papers: List[UnifiedPaper]
+    method: str
+    candidates: int
+    latency_ms: float
+
+
+class Suggestion(BaseModel):
+    text: str
+    kind: str
+    value: str
+    weight: float
+
+
+class SuggestResponse(BaseModel):
+    query: str
+    suggestions: List[Suggestion]
+    latency_ms: float
 
 
 class CompareRequest(BaseModel):
@@ -94,127 +169,337 @@ async def multi_search(
     limit: int = Query(10, ge=1, le=30),
     year_from: Optional[int] = Query(None),
     year_to: Optional[int] = Query(None),
-    sort: str = Query("relevance"),
+    sort: str = Query("relevance", description="relevance (BM25 + citations + recency), citations or year"),
+    budget_ms: Optional[int] = Query(None, ge=100, le=30000, description="Return whatever has arrived after this many ms"),
+    dedupe: bool = Query(True, description="Merge the same paper found in several sources"),
+    rank: Optional[str] = Query(None, description="semantic: reorder by embedding similarity to the query"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page, with the same parameters"),
     current_user: User = Depends(get_current_user),
 ):
-    """Search across multiple research databases simultaneously."""
+    """
+    Search across multiple research databases simultaneously. With budget_ms,
+    sources that haven't answered in time are listed in timed_out_sources and
+    their results are left out; their fetches still finish and warm the cache.
+    With rank=semantic the merged results are reordered by embedding similarity,
+    and the added latency is reported under ranking. Pass next_cursor back to get
+    the following page; it is fetched in the background as soon as this one is
+    returned, and papers already shown are left out.
+    """
+    if rank not in (None, "semantic"):
+        raise HTTPException(status_code=400, detail="rank must be 'semantic'")
     source_list = [s.strip() for s in sources.split(",")]
-    tasks = []
-
-    if "arxiv" in source_list:
-        tasks.append(("arxiv", _search_arxiv_unified(query, limit)))
-    if "semantic_scholar" in source_list:
-        year_filter = None
-        if year_from and year_to:
-            year_filter = f"{year_from}-{year_to}"
-        elif year_from:
-            year_filter = f"{year_from}-"
-        tasks.append(("semantic_scholar", search_semantic_scholar(query, limit=limit, year=year_filter)))
-    if "openalex" in source_list:
-        tasks.append(("openalex", search_openalex(query, limit=limit, from_year=year_from, to_year=year_to)))
-
-    results = await asyncio.gather(*[t[1] for t in tasks], return_exceptions=True)
+    params = fingerprint(query=query, sources=source_list, limit=limit, year_from=year_from, year_to=year_to, dedupe=dedupe)
+    if cursor:
+        try:
+            state = decode_cursor(cursor, params)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        positions, seen_pages = state["pos"], state["seen"]
+    else:
+        state = {"page": 0}
+        positions, seen_pages = {name: 0 for name in source_list if name in SOURCE_MAX_RESULTS}, []
+    searches = _source_searches(query, [s for s in source_list if s in positions], limit, year_from, year_to, positions)
+    started = time.perf_counter()
+    tasks = {name: asyncio.ensure_future(_run_source(name, factory)) for name, factory in searches}
+    done, pending = await asyncio.wait(tasks.values(), timeout=budget_ms / 1000 if budget_ms else None)
+    for task in pending:
+        task.cancel()
 
     all_papers = []
     sources_searched = []
+    timed_out = []
+    timings = {}
     total = 0
 
-    for i, (src_name, _) in enumerate(tasks):
-        res = results[i]
+    for src_name, task in tasks.items():
+        if task in pending:
+            timed_out.append(src_name)
+            timings[src_name] = {"status": "timeout", "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+            continue
+        _, res, timing = task.result()
         if isinstance(res, Exception):
+            timings[src_name] = {**timing, "status": "error", "error": str(res)}
             continue
         sources_searched.append(src_name)
-        total += res.get("total", res.get("total_results", 0))
-        for p in res.get("papers", []):
+        source_total = res.get("total", res.get("total_results", 0))
+        total += source_total
+        papers = res.get("papers", [])
+        timings[src_name] = {**timing, "status": "ok", "returned": len(papers)}
+        for p in papers:
             all_papers.append(p)
-
-    # Sort by citation count if available and sort=citations
-    if sort == "citations":
+        # Timed-out and failed sources keep their position and are retried on the next page. A short
+        # page alone doesn't end a source (arXiv sometimes returns fewer entries than asked for);
+        # its total or an empty page does.
+        next_start = positions[src_name] + limit
+        if not papers or next_start >= min(source_total, SOURCE_MAX_RESULTS[src_name]):
+            del positions[src_name]
+        else:
+            positions[src_name] = next_start
+
+    found = len(all_papers)
+    already_seen = 0
+    if dedupe:
+        all_papers = merge_papers(all_papers)
+        merged = len(all_papers)
+        # Drop papers a recent page already returned, possibly from another source
+        seen_set = {digest for digests in seen_pages for digest in digests}
+        fresh = []
+        page_seen = []
+        for paper in all_papers:
+            digests = [seen_digest(k) for k in dedup_keys(paper)]
+            if not seen_set.intersection(digests):
+                fresh.append(paper)
+                page_seen.extend(digests)
+        already_seen = merged - len(fresh)
+        all_papers = fresh
+        seen_pages.append(page_seen)
+
+    next_cursor = None
+    if positions:
+        next_cursor = encode_cursor(params, positions, seen_pages, state["page"] + 1)
+        if SEARCH_PREFETCH:
+            _prefetch(_source_searches(query, list(positions), limit, year_from, year_to, positions))
+
+    ranking = None
+    if rank == "semantic":
+        all_papers, ranking = await semantic_rerank(query, all_papers)
+    elif sort == "citations":
         all_papers.sort(key=lambda x: x.get("citation_count", 0), reverse=True)
     elif sort == "year":
         all_papers.sort(key=lambda x: x.get("year") or 0, reverse=True)
+    else:
+        rank_started = time.perf_counter()
+        all_papers = rank_papers(query, all_papers)
+        ranking = {"method": "bm25", "latency_ms": round((time.perf_counter() - rank_started) * 1000, 2)}
 
     return {
         "query": query,
         "sources_searched": sources_searched,
         "total_results": total,
         "papers": all_papers[:limit * len(source_list)],
+        "timed_out_sources": timed_out,
+        "timings": timings,
+        "duplicates_merged": found - len(all_papers) - already_seen,
+        "already_seen": already_seen,
+        "ranking": ranking,
+        "next_cursor": next_cursor,
     }
 
 
-async def _search_arxiv_unified(query: str, limit: int) -> dict:
-    result = await search_arxiv(query=query, max_results=limit)
-    papers = []
-    for p in result.get("papers", []):
-        papers.append({
-            "source": "arxiv",
-            "source_id": p["arxiv_id"],
-            "title": p["title"],
-            "abstract": p.get("summary", ""),
-            "authors": p.get("authors", []),
-            "year": p.get("year"),
-            "citation_count": 0,
-            "url": p.get("abstract_url", ""),
-            "pdf_url": p.get("pdf_url"),
-            "doi": p.get("doi"),
-            "journal": p.get("journal_ref"),
-            "fields_of_study": p.get("categories", []),
-        })
+@router.get("/search/stream")
+async def multi_search_stream(
+    query: str = Query(..., min_length=1),
+    sources: str = Query("arxiv,semantic_scholar,openalex", description="Comma-separated sources"),
+    limit: int = Query(10, ge=1, le=30),
+    year_from: Optional[int] = Query(None),
+    year_to: Optional[int] = Query(None),
+    budget_ms: Optional[int] = Query(None, ge=100, le=30000, description="Close the stream after this many ms"),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Progressive multi-source search as NDJSON. Each source's papers are sent as a
+    "batch" event the moment that source answers; a final "summary" event lists
+    per-source status, totals and latencies (and any sources cut off by budget_ms).
+    """
+    source_list = [s.strip() for s in sources.split(",")]
+    searches = _source_searches(query, source_list, limit, year_from, year_to)
+
+    async def events():
+        started = time.perf_counter()
+        pending = [asyncio.ensure_future(_run_source(name, factory)) for name, factory in searches]
+        summary = {}
+        total = 0
+        try:
+            try:
+                for next_done in asyncio.as_completed(pending, timeout=budget_ms / 1000 if budget_ms else None):
+                    name, result, timing = await next_done
+                    if isinstance(result, Exception):
+                        summary[name] = {**timing, "status": "error", "error": str(result)}
+                        continue
+                    papers = [UnifiedPaper(**p).model_dump() for p in result.get("papers", [])]
+                    source_total = result.get("total", result.get("total_results", 0))
+                    total += source_total
+                    summary[name] = {**timing, "status": "ok", "total": source_total, "returned": len(papers)}
+                    yield _ndjson({"event": "batch", "source": name, "total": source_total, "latency_ms": timing["latency_ms"], "papers": papers})
+            except asyncio.TimeoutError:
+                elapsed = round((time.perf_counter() - started) * 1000, 1)
+                for name, _ in searches:
+                    summary.setdefault(name, {"status": "timeout", "latency_ms": elapsed})
+
+            yield _ndjson({
+                "event": "summary",
+                "query": query,
+                "sources_searched": [n for n, s in summary.items() if s["status"] == "ok"],
+                "total_results": total,
+                "timed_out_sources": [n for n, s in summary.items() if s["status"] == "timeout"],
+                "sources": summary,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+        finally:
+            # Client went away mid-stream: stop the searches still running
+            for task in pending:
+                task.cancel()
+
+    return ClosingStreamingResponse(events(), media_type="application/x-ndjson")
+
+
+def _ndjson(event: dict) -> str:
+    return json.dumps(event, separators=(",", ":")) + "\n"
+
+
+async def _run_source(name: str, factory) -> tuple:
+    """Run one source search (hedged when slow); returns (name, result or exception, timing)."""
+    started = time.perf_counter()
+    try:
+        result, timing = await call_with_hedge(name, factory)
+    except Exception as e:
+        return name, e, {"latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+    return name, result, timing
+
+
+def _source_searches(
+    query: str,
+    source_list: List[str],
+    limit: int,
+    year_from: Optional[int],
+    year_to: Optional[int],
+    positions: Optional[Dict[str, int]] = None,
+) -> List[tuple]:
+    """
+    (source name, search factory) pairs; factories can be called twice when hedging.
+    positions gives each source's result offset, mapped to its own paging parameter.
+    Factories raise on upstream errors rather than returning an empty result, so a
+    failing source is reported as an error and keeps its cursor position.
+    """
+    positions = dict(positions or {})
+    tasks = []
+    if "arxiv" in source_list:
+        start = positions.get("arxiv", 0)
+        tasks.append(("arxiv", lambda: _search_arxiv_unified(query, limit, start)))
+    if "semantic_scholar" in source_list:
+        year_filter = None
+        if year_from and year_to:
+            year_filter = f"{year_from}-{year_to}"
+        elif year_from:
+            year_filter = f"{year_from}-"
+        offset = positions.get("semantic_scholar", 0)
+        tasks.append(("semantic_scholar", lambda: search_semantic_scholar(query, limit=limit, offset=offset, year=year_filter, raise_errors=True)))
+    if "openalex" in source_list:
+        # Positions always advance by limit, so they fall on OpenAlex page boundaries
+        page = positions.get("openalex", 0) // limit + 1
+        tasks.append(("openalex", lambda: search_openalex(query, limit=limit, page=page, from_year=year_from, to_year=year_to, raise_errors=True)))
+    return tasks
+
+
+def _prefetch(searches: List[tuple]):
+    """Run the next page's source searches in the background so the upstream cache is warm."""
+    async def run():
+        with background_lane():
+            await asyncio.gather(*(factory() for _, factory in searches), return_exceptions=True)
+
+    task = asyncio.create_task(run())
+    _prefetches.add(task)
+    task.add_done_callback(_prefetches.discard)
+
+
+async def _search_arxiv_unified(query: str, limit: int, start: int = 0) -> dict:
+    result = await search_arxiv(query=query, start=start, max_results=limit, raise_errors=True)
+    papers = [to_unified(p) for p in result.get("papers", [])]
+    # arXiv has no citation data; fill it from Semantic Scholar within the inline budget
+    await enrich_papers(papers)
     return {"total": result.get("total_results", 0), "papers": papers}
 
 
+# --- Typeahead ---
+
+@router.get("/suggest", response_model=SuggestResponse)
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(8, ge=1, le=20),
+    kinds: Optional[str] = Query(None, description="Comma-separated: title, author, category"),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Completions for partial input from the in-memory suggestion index; never calls
+    the upstream APIs.
+    """
+    kind_list = [k.strip() for k in kinds.split(",") if k.strip()] if kinds else None
+    if kind_list and not set(kind_list) <= set(SUGGEST_KINDS):
+        raise HTTPException(status_code=400, detail=f"kinds must be among {', '.join(SUGGEST_KINDS)}")
+    started = time.perf_counter()
+    suggestions = suggest_index.suggest(q, limit, kind_list)
+    return {"query": q, "suggestions": suggestions, "latency_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+
+# --- More Like This ---
+
+@router.get("/similar/{paper_id:path}", response_model=SimilarPapersResponse)
+async def similar_papers(
+    paper_id: str,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Papers closest to the given one in embedding space, from every paper the
+    server has seen. paper_id is "source:id" (e.g. arxiv:2301.00001) or a bare ID.
+    """
+    result = await asyncio.to_thread(vector_index.similar, paper_id, limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Paper is not in the similarity index yet")
+    return result
+
+
 # --- Paper Comparison ---
 
 @router.post("/compare")
 async def compare_papers(
     data: CompareRequest,
+    narrative: str = Query("auto", description="AI narrative: inline, background (job handle in narrative_job), none, or auto (inline for small comparisons)"),
+    background: bool = Query(False, description="Queue the whole comparison as a background job and return 202 with a job handle"),
     current_user: User = Depends(get_current_user),
 ):
-    """Compare multiple papers side-by-side. Generates AI comparison if 2-5 papers provided."""
-    if len(data.papers) < 2 or len(data.papers) > 5:
-        raise HTTPException(status_code=400, detail="Provide 2-5 papers for comparison")
-
-    # Build comparison matrix
-    matrix = {
-        "titles": [],
-        "authors": [],
-        "years": [],
-        "citations": [],
-        "sources": [],
-        "journals": [],
-        "fields": [],
-        "has_pdf": [],
-    }
+    """
+    Compare 2 to COMPARE_MAX_PAPERS papers side-by-side: metadata matrix, pairwise
+    text similarity and author/field overlap computed locally, cached per-paper
+    summaries, and an AI narrative written inline or as a background job.
+    """
+    _check_compare(data.papers)
+    if narrative not in NARRATIVE_MODES:
+        raise HTTPException(status_code=400, detail=f"narrative must be one of: {', '.join(NARRATIVE_MODES)}")
+    if background:
+        return accepted_response(await enqueue("compare", {"papers": data.papers}, current_user.id))
+    return await compare(data.papers, current_user.id, narrative)
+
+
+@router.post("/compare/stream")
+async def compare_papers_stream(
+    data: CompareRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Same comparison as Server-Sent Events: a "matrix" event with everything computed
+    locally straight away, then the AI narrative streamed as "section"/"token"
+    events and a final "narrative" (or "error").
+    """
+    _check_compare(data.papers)
+    local = await local_comparison(data.papers)
 
-    for p in data.papers:
-        matrix["titles"].append(p.get("title", ""))
-        matrix["authors"].append(", ".join(p.get("authors", [])[:3]))
-        matrix["years"].append(p.get("year"))
-        matrix["citations"].append(p.get("citation_count", 0))
-        matrix["sources"].append(p.get("source", ""))
-        matrix["journals"].append(p.get("journal") or "N/A")
-        matrix["fields"].append(", ".join(p.get("fields_of_study", [])[:3]) or "N/A")
-        matrix["has_pdf"].append(bool(p.get("pdf_url")))
-
-    # AI comparison
-    ai_comparison = None
-    try:
-        combined = "\n\n".join([
-            f"Paper {i+1}: {p.get('title', '')}\nAbstract: {(p.get('abstract') or '')[:300]}"
-            for i, p in enumerate(data.papers)
-        ])
-        from services.ai_service import summarize_paper
-        prompt_title = f"Comparison of {len(data.papers)} papers"
-        prompt_abstract = f"Compare these papers:\n{combined}\n\nProvide: 1) How they differ in approach 2) Common themes 3) Which is most impactful and why"
-        ai_comparison = await summarize_paper(prompt_title, prompt_abstract)
-    except Exception:
-        pass
+    async def events():
+        yield sse_event({"event": "matrix", **local})
+        narrative = stream_narrative(narrative_prompt(data.papers, local), owner=current_user.id)
+        try:
+            async for event in narrative:
+                yield sse_event(event)
+        finally:
+            # Close it now rather than at garbage collection, so its LLM slot is freed on disconnect
+            await narrative.aclose()
 
-    return {
-        "papers": data.papers,
-        "comparison_matrix": matrix,
-        "ai_comparison": ai_comparison,
-    }
+    return ClosingStreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+def _check_compare(papers: List[dict]):
+    if len(papers) < 2 or len(papers) > COMPARE_MAX_PAPERS:
+        raise HTTPException(status_code=400, detail=f"Provide 2-{COMPARE_MAX_PAPERS} papers for comparison")
 
 
 # --- Trend Analysis ---
@@ -222,28 +507,35 @@ async def compare_papers(
 @router.get("/trends")
 async def get_trends(
     query: str = Query(..., min_length=1),
+    compare: Optional[str] = Query(None, description="Comma-separated extra queries to compare against"),
+    year_from: Optional[int] = Query(None, ge=1800),
+    year_to: Optional[int] = Query(None, le=2100),
     current_user: User = Depends(get_current_user),
 ):
-    """Get publication trend data for a query across years."""
-    year_counts = {}
+    """Get publication trend data for one or more queries across years."""
     current_year = datetime.now().year
+    year_to = year_to or current_year
+    year_from = year_from or year_to - 9
+    if year_from > year_to:
+        raise HTTPException(status_code=400, detail="year_from must not be after year_to")
 
-    # Search across recent years
-    tasks = []
-    for yr in range(current_year - 9, current_year + 1):
-        tasks.append((yr, search_openalex(query, limit=1, from_year=yr, to_year=yr)))
-
-    results = await asyncio.gather(*[t[1] for t in tasks], return_exceptions=True)
+    queries = [query] + [q.strip() for q in (compare or "").split(",") if q.strip()]
+    queries = list(dict.fromkeys(queries))[:MAX_TREND_QUERIES]
 
-    trend_data = []
-    for i, (yr, _) in enumerate(tasks):
-        res = results[i]
-        if isinstance(res, Exception):
-            trend_data.append({"year": yr, "count": 0})
-        else:
-            trend_data.append({"year": yr, "count": res.get("total", 0)})
+    # One grouped upstream call per query, however many years are requested
+    histograms = await asyncio.gather(*[get_publication_histogram(q, year_from, year_to) for q in queries])
 
-    return {"query": query, "trend_data": trend_data}
+    series = [
+        {"query": q, "trend_data": [{"year": yr, "count": hist.get(yr, 0)} for yr in range(year_from, year_to + 1)]}
+        for q, hist in zip(queries, histograms)
+    ]
+    return {
+        "query": query,
+        "year_from": year_from,
+        "year_to": year_to,
+        "trend_data": series[0]["trend_data"],
+        "series": series,
+    }
 
 
 # --- Workspaces ---
@@ -280,7 +572,8 @@ async def get_workspace(
     if not ws:
         raise HTTPException(status_code=404, detail="Workspace not found")
     papers = db.query(WorkspacePaper).filter(WorkspacePaper.workspace_id == ws_id).order_by(WorkspacePaper.added_at.desc()).all()
-    return {**_workspace_to_dict(ws), "papers": [_wp_to_dict(p) for p in papers]}
+    paper_dicts = await enrich_papers([_wp_to_dict(p) for p in papers])
+    return {**_workspace_to_dict(ws), "papers": paper_dicts}
 
 
 @router.put("/workspaces/{ws_id}")
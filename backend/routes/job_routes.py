@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from db.postgres import get_db
+from models.user_models import User, Job
+from schemas.job_schemas import JobResponse
+from services.auth_service import get_current_user
+from services.job_queue import cancel_job, job_view
+
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+
+def _get_own_job(job_id: str, user: User, db: Session) -> Job:
+    job = db.query(Job).filter(Job.job_id == job_id, Job.user_id == user.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("", response_model=List[JobResponse])
+def list_jobs(
+    status: Optional[str] = Query(None, description="queued, running, succeeded, failed or cancelled"),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Current user's most recent background jobs."""
+    query = db.query(Job).filter(Job.user_id == current_user.id)
+    if status:
+        query = query.filter(Job.status == status)
+    return [job_view(job) for job in query.order_by(Job.id.desc()).limit(limit).all()]
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+def get_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Status of a background job, with its result once it has succeeded."""
+    return job_view(_get_own_job(job_id, current_user, db))
+
+
+@router.delete("/{job_id}", response_model=JobResponse)
+def delete_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Cancel a job that has not started yet."""
+    job = _get_own_job(job_id, current_user, db)
+    if not cancel_job(job):
+        raise HTTPException(status_code=409, detail=f"Job is {job.status} and can no longer be cancelled")
+    db.refresh(job)
+    return job_view(job)
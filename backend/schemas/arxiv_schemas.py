@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 
@@ -38,6 +38,15 @@ class ArxivSearchResponse(BaseModel):
     papers: List[ArxivPaperResponse]
 
 
+class ArxivBatchRequest(BaseModel):
+    ids: List[str]
+
+
+class ArxivBatchResponse(BaseModel):
+    papers: Dict[str, ArxivPaperResponse]
+    missing: List[str] = []
+
+
 class ArxivCategoryResponse(BaseModel):
     code: str
     name: str
@@ -49,10 +58,17 @@ class AISummaryRequest(BaseModel):
     authors: List[str] = []
 
 
+class AISummaryBatchRequest(BaseModel):
+    papers: List[AISummaryRequest]
+
+
 class AISummaryResponse(BaseModel):
     summary: str
     key_points: List[str] = []
     significance: str = ""
+    cached: bool = False
+    # "cached" (another model/prompt version) or "extractive" when the LLM was unavailable
+    fallback: Optional[str] = None
 
 
 class SavedPaperCreate(BaseModel):
@@ -79,3 +95,13 @@ class SavedPaperResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class ArxivVersionUpdate(BaseModel):
+    arxiv_id: str
+    title: str
+    saved_version: int
+    latest_version: int
+    latest_id: str
+    updated: Optional[str] = None
+    checked_at: Optional[datetime] = None
@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import Any, Optional
+from datetime import datetime
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    attempts: int = 0
+    max_attempts: int = 0
+    error: Optional[str] = None
+    result: Optional[Any] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    status_url: str
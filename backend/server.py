@@ -20,7 +20,24 @@ logger = logging.getLogger(__name__)
 from db.postgres import init_db, SessionLocal
 from db.neo4j import Neo4jConnection
 from models.user_models import Interest
-from routes import auth_routes, user_routes, paper_routes, arxiv_routes, discover_routes
+from services.http_client import UpstreamClients
+from services.response_cache import upstream_cache
+from services.paper_store import paper_store
+from services.embedding_service import embedding_cache
+from services.singleflight import upstream_flights
+from services.rate_limiter import scheduler_stats
+from services.hedging import hedging_stats
+from services.periodic import PeriodicTasks
+from services.reading_list_service import refresh_saved_versions, ARXIV_VERSION_CHECK_INTERVAL
+from services.enrichment_service import enrichment_stats, refresh_library_enrichment, ENRICHMENT_REFRESH_INTERVAL
+from services.vector_index import vector_index, refresh_vector_index, VECTOR_INDEX_INTERVAL
+from services.suggest_service import suggest_index, refresh_suggestions, SUGGEST_REFRESH_INTERVAL
+from services.ai_service import summary_cache_stats
+from services.summary_batch import summary_pool
+from services.llm_client import llm_client
+from services.job_queue import job_workers, job_stats, purge_finished_jobs, JOB_CLEANUP_INTERVAL
+from services.harvester import harvest_all, harvest_stats, HARVEST_INTERVAL, HARVEST_ENABLED
+from routes import auth_routes, user_routes, paper_routes, arxiv_routes, discover_routes, job_routes
 
 # Also import and expose the original recommendation endpoint for backwards compatibility
 from recommendation.engine import recommend_papers
@@ -75,11 +92,34 @@ async def lifespan(app: FastAPI):
         logger.info("Neo4j connection established")
     else:
         logger.warning("Neo4j connection failed - recommendations may be limited")
+
+    # Shared upstream clients (arXiv, Semantic Scholar, OpenAlex)
+    UpstreamClients.start()
+
+    # Workers for queued AI jobs
+    job_workers.start()
+
+    # Background maintenance jobs
+    PeriodicTasks.start("arxiv_version_check", ARXIV_VERSION_CHECK_INTERVAL, refresh_saved_versions)
+    PeriodicTasks.start("citation_refresh", ENRICHMENT_REFRESH_INTERVAL, refresh_library_enrichment)
+    if HARVEST_ENABLED:
+        PeriodicTasks.start("arxiv_harvest", HARVEST_INTERVAL, harvest_all, initial_delay=120)
+    PeriodicTasks.start("vector_index", VECTOR_INDEX_INTERVAL, refresh_vector_index, initial_delay=60)
+    PeriodicTasks.start("suggest_index", SUGGEST_REFRESH_INTERVAL, refresh_suggestions, initial_delay=5)
+    PeriodicTasks.start("job_cleanup", JOB_CLEANUP_INTERVAL, purge_finished_jobs, initial_delay=300)
     
     yield
     
     # Shutdown
     logger.info("Shutting down...")
+    await PeriodicTasks.stop_all()
+    await job_workers.stop()
+    await summary_pool.stop()
+    await UpstreamClients.close()
+    upstream_cache.close()
+    paper_store.close()
+    embedding_cache.close()
+    vector_index.close()
     Neo4jConnection.close()
 
 
@@ -105,6 +145,7 @@ app.include_router(user_routes.router)
 app.include_router(paper_routes.router)
 app.include_router(arxiv_routes.router)
 app.include_router(discover_routes.router)
+app.include_router(job_routes.router)
 
 
 # Keep original recommendation endpoint for backwards compatibility
@@ -128,6 +169,28 @@ def health_check():
     }
 
 
+@app.get("/api/metrics")
+def metrics():
+    """Internal counters for sizing caches and upstream usage"""
+    return {
+        "upstream_cache": upstream_cache.stats(),
+        "paper_store": paper_store.stats(),
+        "harvester": harvest_stats(),
+        "enrichment": enrichment_stats(),
+        "embeddings": embedding_cache.stats(),
+        "vector_index": vector_index.stats(),
+        "suggest": suggest_index.stats(),
+        "ai_summaries": summary_cache_stats(),
+        "summary_pool": summary_pool.stats(),
+        "llm": llm_client.stats(),
+        "jobs": job_stats(),
+        "singleflight": upstream_flights.stats(),
+        "rate_limits": scheduler_stats(),
+        "hedging": hedging_stats(),
+        "background_jobs": PeriodicTasks.stats(),
+    }
+
+
 @app.get("/")
 def root():
     return {
@@ -1,30 +1,61 @@
 """
 AI Service - Gemini-powered paper summarization and insights.
-Uses emergentintegrations library with Emergent LLM key.
+LLM calls go through services.llm_client (concurrency limits, deadlines, circuit breaker).
+Summaries are cached in the database, content-addressed by title, abstract,
+model and prompt version, so a paper is only sent to the LLM once. When the LLM
+is unavailable, an older cached summary of the paper or the abstract's leading
+sentences are returned instead.
 """
 import os
+import re
+import json
+import time
+import asyncio
+import hashlib
 import logging
-import uuid
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional
 from dotenv import load_dotenv
 from pathlib import Path
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from db.postgres import SessionLocal
+from models.user_models import AISummaryCache
+from services.job_queue import register_job
+from services.llm_client import API_KEY, llm_client
+from services.singleflight import SingleFlight
 
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(env_path)
 
 logger = logging.getLogger(__name__)
 
-API_KEY = os.environ.get("EMERGENT_LLM_KEY") or os.environ.get("GEMINI_API_KEY")
+SUMMARY_PROVIDER = "gemini"
+SUMMARY_MODEL = os.environ.get("AI_SUMMARY_MODEL", "gemini-2.0-flash")
+# Bump when the prompt or its parsing changes so older cached summaries are not served
+SUMMARY_PROMPT_VERSION = "v1"
+SUMMARY_SYSTEM_MESSAGE = "You are an expert research analyst who summarizes academic papers clearly and concisely."
+CHARS_PER_TOKEN = 4
+FALLBACK_SENTENCES = 2
 
+summary_flights = SingleFlight()
+_stats = {"hits": 0, "misses": 0, "generated": 0, "failures": 0, "fallbacks": 0, "generation_ms": 0.0, "streamed": 0}
+# Seconds from sending a streamed prompt to its first token
+_ttft = deque(maxlen=2000)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9])")
+SECTION_HEADERS = (("SUMMARY:", "summary"), ("KEY_POINTS:", "key_points"), ("SIGNIFICANCE:", "significance"))
+
+
+def summary_key(title: str, abstract: str) -> str:
+    parts = [title.strip(), abstract.strip(), f"{SUMMARY_PROVIDER}/{SUMMARY_MODEL}", SUMMARY_PROMPT_VERSION]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
 
-async def summarize_paper(title: str, abstract: str, authors: list = None) -> dict:
-    """Generate an AI summary of a research paper."""
-    if not API_KEY:
-        return {"summary": "AI summarization unavailable. API key not configured.", "key_points": [], "significance": ""}
 
+def _build_prompt(title: str, abstract: str, authors: list = None) -> str:
     authors_str = ", ".join(authors[:5]) if authors else "Unknown"
 
-    prompt = f"""Analyze this academic paper and provide a concise, insightful summary.
+    return f"""Analyze this academic paper and provide a concise, insightful summary.
 
 Paper Title: {title}
 Authors: {authors_str}
@@ -38,50 +69,320 @@ KEY_POINTS:
 - [Key finding or contribution 3]
 SIGNIFICANCE: [One sentence on why this paper matters and its potential impact]"""
 
+
+def _parse_summary(text: str) -> dict:
+    summary = ""
+    key_points = []
+    significance = ""
+
+    lines = text.strip().split("\n")
+    current_section = None
+
+    for line in lines:
+        line = line.strip()
+        if line.startswith("SUMMARY:"):
+            current_section = "summary"
+            summary = line[len("SUMMARY:"):].strip()
+        elif line.startswith("KEY_POINTS:"):
+            current_section = "key_points"
+        elif line.startswith("SIGNIFICANCE:"):
+            current_section = "significance"
+            significance = line[len("SIGNIFICANCE:"):].strip()
+        elif current_section == "summary" and line and not line.startswith("-"):
+            summary += " " + line
+        elif current_section == "key_points" and line.startswith("-"):
+            key_points.append(line[1:].strip())
+        elif current_section == "significance" and line:
+            significance += " " + line
+
+    return {
+        "summary": summary.strip() or text[:500],
+        "key_points": key_points or ["See full summary above"],
+        "significance": significance.strip() or "",
+    }
+
+
+def _generate(prompt: str, owner=None) -> Awaitable[str]:
+    return llm_client.complete(prompt, SUMMARY_SYSTEM_MESSAGE, f"{SUMMARY_PROVIDER}/{SUMMARY_MODEL}", owner=owner)
+
+
+def _generate_stream(prompt: str, owner=None) -> AsyncIterator[str]:
+    return llm_client.stream(prompt, SUMMARY_SYSTEM_MESSAGE, f"{SUMMARY_PROVIDER}/{SUMMARY_MODEL}", owner=owner)
+
+
+class SummaryStreamParser:
+    """
+    Incremental counterpart of _parse_summary. Text is forwarded as "token" events
+    tagged with the section being written; only the start of a line is held back,
+    until it is clear whether it is a section header ("section" event) or not.
+    headers is a sequence of (header, section name) pairs.
+    """
+
+    def __init__(self, headers=SECTION_HEADERS):
+        self.headers = headers
+        self.text = ""
+        self.section: Optional[str] = None
+        self._line = ""
+        self._line_start = True
+
+    def _token(self, text: str) -> Dict[str, Any]:
+        return {"event": "token", "section": self.section, "text": text}
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.text += chunk
+        events = []
+        for piece in chunk.splitlines(keepends=True):
+            if not self._line_start:
+                events.append(self._token(piece))
+            else:
+                self._line += piece
+                stripped = self._line.lstrip()
+                header = next((h for h in self.headers if stripped.startswith(h[0])), None)
+                if header is not None:
+                    self.section = header[1]
+                    self._line_start = False
+                    events.append({"event": "section", "section": self.section})
+                    rest = stripped[len(header[0]):].lstrip(" ")
+                    if rest:
+                        events.append(self._token(rest))
+                elif piece.endswith("\n") or not any(name.startswith(stripped) for name, _ in self.headers):
+                    self._line_start = False
+                    events.append(self._token(self._line))
+            if piece.endswith("\n"):
+                self._line = ""
+                self._line_start = True
+        return events
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Flush a held-back partial last line."""
+        if self._line_start and self._line:
+            return [self._token(self._line)]
+        return []
+
+
+def _cached_summary(key: str) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        entry = db.query(AISummaryCache).filter(AISummaryCache.content_hash == key).first()
+        if entry is None:
+            return None
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_hit_at = datetime.now(timezone.utc)
+        db.commit()
+        return json.loads(entry.result)
+    finally:
+        db.close()
+
+
+def _store_summary(key: str, title: str, result: dict, prompt: str, text: str, latency_ms: float):
+    db = SessionLocal()
+    try:
+        db.add(AISummaryCache(
+            content_hash=key, model=f"{SUMMARY_PROVIDER}/{SUMMARY_MODEL}", prompt_version=SUMMARY_PROMPT_VERSION,
+            title=title[:1000], result=json.dumps(result),
+            prompt_tokens=(len(SUMMARY_SYSTEM_MESSAGE) + len(prompt)) // CHARS_PER_TOKEN,
+            completion_tokens=len(text) // CHARS_PER_TOKEN, latency_ms=round(latency_ms), hits=0,
+        ))
+        db.commit()
+    except IntegrityError:
+        # Another worker stored the same summary first
+        db.rollback()
+    finally:
+        db.close()
+
+
+def _fallback_summary(title: str, abstract: str) -> dict:
+    """
+    Stand-in while the LLM is unavailable: a cached summary of the same title from
+    another model or prompt version, else the abstract's leading sentences.
+    """
+    _stats["fallbacks"] += 1
+    db = SessionLocal()
     try:
-        chat = LlmChat(
-            api_key=API_KEY,
-            session_id=f"summary-{uuid.uuid4().hex[:8]}",
-            system_message="You are an expert research analyst who summarizes academic papers clearly and concisely.",
+        entry = (
+            db.query(AISummaryCache)
+            .filter(AISummaryCache.title == title[:1000])
+            .order_by(AISummaryCache.created_at.desc())
+            .first()
         )
-        chat.with_model("gemini", "gemini-2.0-flash")
-
-        user_msg = UserMessage(text=prompt)
-        text = await chat.send_message(user_msg)
-
-        summary = ""
-        key_points = []
-        significance = ""
-
-        lines = text.strip().split("\n")
-        current_section = None
-
-        for line in lines:
-            line = line.strip()
-            if line.startswith("SUMMARY:"):
-                current_section = "summary"
-                summary = line[len("SUMMARY:"):].strip()
-            elif line.startswith("KEY_POINTS:"):
-                current_section = "key_points"
-            elif line.startswith("SIGNIFICANCE:"):
-                current_section = "significance"
-                significance = line[len("SIGNIFICANCE:"):].strip()
-            elif current_section == "summary" and line and not line.startswith("-"):
-                summary += " " + line
-            elif current_section == "key_points" and line.startswith("-"):
-                key_points.append(line[1:].strip())
-            elif current_section == "significance" and line:
-                significance += " " + line
+    finally:
+        db.close()
+    if entry is not None:
+        return {**json.loads(entry.result), "cached": True, "fallback": "cached"}
+    sentences = _SENTENCE_END.split(" ".join(abstract.split()))
+    return {
+        "summary": " ".join(sentences[:FALLBACK_SENTENCES]),
+        "key_points": sentences[FALLBACK_SENTENCES:FALLBACK_SENTENCES + 3],
+        "significance": "",
+        "cached": False,
+        "fallback": "extractive",
+    }
 
-        return {
-            "summary": summary.strip() or text[:500],
-            "key_points": key_points or ["See full summary above"],
-            "significance": significance.strip() or "",
-        }
+
+async def _summarize_uncached(key: str, title: str, abstract: str, authors: list = None, owner=None) -> dict:
+    prompt = _build_prompt(title, abstract, authors)
+    started = time.perf_counter()
+    text = await _generate(prompt, owner)
+    latency_ms = (time.perf_counter() - started) * 1000
+    result = _parse_summary(text)
+    _stats["generated"] += 1
+    _stats["generation_ms"] += latency_ms
+    await asyncio.to_thread(_store_summary, key, title, result, prompt, text, latency_ms)
+    return result
+
+
+def lookup_summary(key: str) -> Optional[dict]:
+    """
+    Cached summary for a summary_key, or None; counted as a cache hit or miss.
+    Blocking database call: use asyncio.to_thread from async code.
+    """
+    cached = _cached_summary(key)
+    if cached is None:
+        _stats["misses"] += 1
+        return None
+    _stats["hits"] += 1
+    return {**cached, "cached": True}
+
+
+async def generate_summary(key: str, title: str, abstract: str, authors: list = None, owner=None) -> dict:
+    """
+    Summarize a paper that missed the cache. Concurrent calls for the same key
+    share a single LLM call. Raises if the LLM call fails.
+    """
+    if not API_KEY:
+        raise RuntimeError("AI summarization unavailable. API key not configured.")
+    try:
+        result = await summary_flights.do("summary", key, lambda: _summarize_uncached(key, title, abstract, authors, owner))
+    except Exception:
+        _stats["failures"] += 1
+        raise
+    return {**result, "cached": False}
+
+
+async def summarize_paper(title: str, abstract: str, authors: list = None, owner=None, fallback: bool = True) -> dict:
+    """
+    Generate an AI summary of a research paper, or return the cached one.
+    Concurrent first requests for the same paper share a single LLM call.
+    owner (a user ID) counts the call against that user's LLM slots. If the LLM
+    fails and fallback is set, a cached or extractive stand-in is returned.
+    """
+    if not API_KEY:
+        return {"summary": "AI summarization unavailable. API key not configured.", "key_points": [], "significance": ""}
+
+    key = summary_key(title, abstract)
+    cached = await asyncio.to_thread(lookup_summary, key)
+    if cached is not None:
+        return cached
+
+    try:
+        return await generate_summary(key, title, abstract, authors, owner)
     except Exception as e:
         logger.error(f"AI summarize error: {e}")
+        if fallback:
+            return await asyncio.to_thread(_fallback_summary, title, abstract)
         return {
             "summary": f"AI summary generation failed: {str(e)}",
             "key_points": [],
             "significance": "",
         }
+
+
+async def stream_summary(title: str, abstract: str, authors: list = None, owner=None, fallback: bool = True) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of summarize_paper. Yields "section" and "token" events as
+    the LLM writes, then a "summary" event with the parsed result (the same shape
+    summarize_paper returns) or an "error" event. Cached summaries are sent as
+    their sections followed by the summary event, without calling the LLM, and
+    with fallback set a failed stream ends in a summary event with the stand-in.
+    """
+    started = time.perf_counter()
+    if not API_KEY:
+        yield {"event": "error", "error": "AI summarization unavailable. API key not configured."}
+        return
+
+    key = summary_key(title, abstract)
+    cached = await asyncio.to_thread(lookup_summary, key)
+    if cached is not None:
+        for _, section in SECTION_HEADERS:
+            yield {"event": "section", "section": section}
+        yield {"event": "summary", **cached, "ttft_ms": None, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+        return
+
+    prompt = _build_prompt(title, abstract, authors)
+    parser = SummaryStreamParser()
+    ttft = None
+    chunks = _generate_stream(prompt, owner)
+    try:
+        async for chunk in chunks:
+            if ttft is None:
+                ttft = time.perf_counter() - started
+                _ttft.append(ttft)
+            for event in parser.feed(chunk):
+                yield event
+    except Exception as e:
+        _stats["failures"] += 1
+        logger.error(f"AI summarize stream error: {e}")
+        if fallback:
+            stand_in = await asyncio.to_thread(_fallback_summary, title, abstract)
+            yield {"event": "summary", **stand_in, "error": str(e), "ttft_ms": None,
+                   "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+        else:
+            yield {"event": "error", "error": f"AI summary generation failed: {str(e)}"}
+        return
+    finally:
+        # Runs when the consumer closes this generator early too, so the LLM slot is freed at once
+        await chunks.aclose()
+    for event in parser.finish():
+        yield event
+
+    latency_ms = (time.perf_counter() - started) * 1000
+    result = _parse_summary(parser.text)
+    _stats["generated"] += 1
+    _stats["streamed"] += 1
+    _stats["generation_ms"] += latency_ms
+    await asyncio.to_thread(_store_summary, key, title, result, prompt, parser.text, latency_ms)
+    yield {
+        "event": "summary", **result, "cached": False,
+        "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+        "elapsed_ms": round(latency_ms, 1),
+    }
+
+
+async def _summarize_job(payload: Dict[str, Any], user_id: Optional[int]) -> dict:
+    """Background summary job; LLM failures raise so the job queue retries them."""
+    key = summary_key(payload["title"], payload["abstract"])
+    cached = await asyncio.to_thread(lookup_summary, key)
+    if cached is not None:
+        return cached
+    return await generate_summary(key, payload["title"], payload["abstract"], payload.get("authors"), user_id)
+
+
+register_job("summarize", _summarize_job)
+
+
+def summary_cache_stats() -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        entries, hits, tokens_saved, avg_latency = db.query(
+            func.count(AISummaryCache.id),
+            func.coalesce(func.sum(AISummaryCache.hits), 0),
+            func.coalesce(func.sum(AISummaryCache.hits * (AISummaryCache.prompt_tokens + AISummaryCache.completion_tokens)), 0),
+            func.avg(AISummaryCache.latency_ms),
+        ).one()
+    finally:
+        db.close()
+    lookups = _stats["hits"] + _stats["misses"]
+    ttft = sorted(_ttft)
+    return {
+        "model": f"{SUMMARY_PROVIDER}/{SUMMARY_MODEL}",
+        "prompt_version": SUMMARY_PROMPT_VERSION,
+        "entries": entries,
+        "total_hits": hits,
+        "estimated_tokens_saved": tokens_saved,
+        "avg_generation_ms": round(avg_latency) if avg_latency is not None else None,
+        **{k: round(v, 1) for k, v in _stats.items()},
+        "hit_ratio": round(_stats["hits"] / lookups, 3) if lookups else None,
+        "ttft_ms_p50": round(ttft[len(ttft) // 2] * 1000, 1) if ttft else None,
+        "ttft_ms_p95": round(ttft[int(len(ttft) * 0.95)] * 1000, 1) if ttft else None,
+        "collapsed": summary_flights.stats()["groups"].get("summary", {}).get("collapsed", 0),
+    }
@@ -3,16 +3,35 @@ arXiv API Service
 Provides search, browse, and paper retrieval from the arXiv public API.
 API Docs: https://info.arxiv.org/help/api/user-manual.html
 """
-import httpx
+import os
+import io
+import asyncio
 import xml.etree.ElementTree as ET
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import logging
 import re
 from urllib.parse import quote
+from services.rate_limiter import rate_limited_get
+from services.response_cache import upstream_cache
+from services.paper_store import paper_store
+
+try:
+    from lxml import etree as _lxml_etree  # optional, faster parser backend
+except ImportError:
+    _lxml_etree = None
 
 logger = logging.getLogger(__name__)
 
-ARXIV_API_BASE = "https://export.arxiv.org/api/query"
+# Overridable so the harvester can be pointed at a local stand-in feed
+ARXIV_API_BASE = os.environ.get("ARXIV_API_BASE", "https://export.arxiv.org/api/query")
+
+# IDs per id_list request when resolving papers in bulk
+ARXIV_ID_BATCH_SIZE = int(os.environ.get("ARXIV_ID_BATCH_SIZE", 100))
+
+# "auto" uses lxml when installed, "stdlib" forces xml.etree
+ARXIV_PARSER = os.environ.get("ARXIV_PARSER", "auto")
+# Feeds at least this large are parsed in a worker thread instead of on the event loop
+ARXIV_OFFLOAD_PARSE_BYTES = int(os.environ.get("ARXIV_OFFLOAD_PARSE_BYTES", 256 * 1024))
 
 ARXIV_NS = {
     "atom": "http://www.w3.org/2005/Atom",
@@ -52,107 +71,151 @@ ARXIV_CATEGORIES = {
 }
 
 
-def _parse_entry(entry: ET.Element) -> Dict[str, Any]:
-    """Parse a single Atom <entry> into a dict."""
-    def text(tag, ns="atom"):
-        el = entry.find(f"{ns}:{tag}", ARXIV_NS) if ns else entry.find(tag)
-        return el.text.strip() if el is not None and el.text else None
+# Clark-notation tags, precomputed so the per-entry loop does plain string compares
+_ATOM = "{%s}" % ARXIV_NS["atom"]
+_ARXIV = "{%s}" % ARXIV_NS["arxiv"]
+_OPENSEARCH = "{%s}" % ARXIV_NS["opensearch"]
+TAG_ENTRY = _ATOM + "entry"
+_TEXT_FIELDS = {
+    _ATOM + "id": "id",
+    _ATOM + "title": "title",
+    _ATOM + "summary": "summary",
+    _ATOM + "published": "published",
+    _ATOM + "updated": "updated",
+    _ARXIV + "comment": "comment",
+    _ARXIV + "journal_ref": "journal_ref",
+    _ARXIV + "doi": "doi",
+}
+_TAG_AUTHOR = _ATOM + "author"
+_TAG_NAME = _ATOM + "name"
+_TAG_CATEGORY = _ATOM + "category"
+_TAG_LINK = _ATOM + "link"
+_TAG_PRIMARY_CATEGORY = _ARXIV + "primary_category"
+_TAG_TOTAL_RESULTS = _OPENSEARCH + "totalResults"
+_TAG_START_INDEX = _OPENSEARCH + "startIndex"
+_VERSION_RE = re.compile(r"^(.+?)v(\d+)$")
 
-    # Extract arXiv ID from the <id> URL
-    raw_id = text("id") or ""
-    arxiv_id = raw_id.replace("http://arxiv.org/abs/", "").replace("https://arxiv.org/abs/", "")
 
-    # Authors
-    authors = []
-    for author_el in entry.findall("atom:author", ARXIV_NS):
-        name_el = author_el.find("atom:name", ARXIV_NS)
-        if name_el is not None and name_el.text:
-            authors.append(name_el.text.strip())
+def _collapse(text: Optional[str]) -> str:
+    return " ".join(text.split()) if text else ""
+
 
-    # Categories
+def _parse_entry(entry) -> Dict[str, Any]:
+    """Parse a single Atom <entry> into a dict in one pass over its children."""
+    fields: Dict[str, Optional[str]] = {}
+    authors = []
     categories = []
     primary_category = None
-    for cat_el in entry.findall("atom:category", ARXIV_NS):
-        term = cat_el.get("term")
-        if term:
-            categories.append(term)
-    pc_el = entry.find("arxiv:primary_category", ARXIV_NS)
-    if pc_el is not None:
-        primary_category = pc_el.get("term")
-
-    # Links
     pdf_url = None
     abstract_url = None
     doi_url = None
-    for link_el in entry.findall("atom:link", ARXIV_NS):
-        rel = link_el.get("rel", "")
-        title = link_el.get("title", "")
-        href = link_el.get("href", "")
-        if rel == "alternate":
-            abstract_url = href
-        elif title == "pdf":
-            pdf_url = href
-        elif title == "doi":
-            doi_url = href
-
-    # Published / updated
-    published = text("published")
-    updated = text("updated")
-
-    # Year extraction
-    year = None
-    if published:
-        match = re.search(r"(\d{4})", published)
-        if match:
-            year = int(match.group(1))
 
-    # Extension elements
-    comment = text("comment", "arxiv")
-    journal_ref = text("journal_ref", "arxiv")
-    doi = text("doi", "arxiv")
+    for child in entry:
+        tag = child.tag
+        field = _TEXT_FIELDS.get(tag)
+        if field is not None:
+            # First occurrence wins, matching Element.find()
+            if field not in fields:
+                fields[field] = child.text.strip() if child.text else None
+        elif tag == _TAG_AUTHOR:
+            for name_el in child:
+                if name_el.tag == _TAG_NAME:
+                    if name_el.text:
+                        authors.append(name_el.text.strip())
+                    break
+        elif tag == _TAG_CATEGORY:
+            term = child.get("term")
+            if term:
+                categories.append(term)
+        elif tag == _TAG_LINK:
+            rel = child.get("rel", "")
+            link_title = child.get("title", "")
+            href = child.get("href", "")
+            if rel == "alternate":
+                abstract_url = href
+            elif link_title == "pdf":
+                pdf_url = href
+            elif link_title == "doi":
+                doi_url = href
+        elif tag == _TAG_PRIMARY_CATEGORY and primary_category is None:
+            primary_category = child.get("term")
 
-    summary = text("summary") or ""
-    summary = re.sub(r"\s+", " ", summary).strip()
+    # Extract arXiv ID from the <id> URL
+    raw_id = fields.get("id") or ""
+    arxiv_id = raw_id.replace("http://arxiv.org/abs/", "").replace("https://arxiv.org/abs/", "")
 
-    title = text("title") or ""
-    title = re.sub(r"\s+", " ", title).strip()
+    published = fields.get("published")
+    year = None
+    if published:
+        if published[:4].isdigit():
+            year = int(published[:4])
+        else:
+            match = re.search(r"(\d{4})", published)
+            if match:
+                year = int(match.group(1))
 
     return {
         "arxiv_id": arxiv_id,
-        "title": title,
-        "summary": summary,
+        "title": _collapse(fields.get("title")),
+        "summary": _collapse(fields.get("summary")),
         "authors": authors,
         "categories": categories,
         "primary_category": primary_category,
         "published": published,
-        "updated": updated,
+        "updated": fields.get("updated"),
         "year": year,
         "pdf_url": pdf_url,
         "abstract_url": abstract_url,
         "doi_url": doi_url,
-        "doi": doi,
-        "comment": comment,
-        "journal_ref": journal_ref,
+        "doi": fields.get("doi"),
+        "comment": fields.get("comment"),
+        "journal_ref": fields.get("journal_ref"),
     }
 
 
-def _parse_feed(xml_text: str) -> Dict[str, Any]:
-    """Parse the full Atom feed response."""
-    root = ET.fromstring(xml_text)
-    total_el = root.find("opensearch:totalResults", ARXIV_NS)
-    total_results = int(total_el.text) if total_el is not None and total_el.text else 0
+def _iterparse(content: bytes):
+    if _lxml_etree is not None and ARXIV_PARSER != "stdlib":
+        return _lxml_etree.iterparse(io.BytesIO(content), events=("start", "end"), resolve_entities=False)
+    return ET.iterparse(io.BytesIO(content), events=("start", "end"))
 
-    start_el = root.find("opensearch:startIndex", ARXIV_NS)
-    start_index = int(start_el.text) if start_el is not None and start_el.text else 0
 
-    entries = root.findall("atom:entry", ARXIV_NS)
+def _parse_feed(content) -> Dict[str, Any]:
+    """
+    Parse an Atom feed incrementally. Each <entry> is converted as soon as it
+    closes and then dropped from the tree, so memory stays bounded by one entry
+    rather than the whole document.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+
+    total_results = 0
+    start_index = 0
     papers = []
-    for entry in entries:
-        parsed = _parse_entry(entry)
-        # Skip error entries
-        if parsed["title"] == "Error":
+    root = None
+    depth = 0
+
+    for event, elem in _iterparse(content):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth != 1:
+            # Only act on direct children of <feed>; nested elements are read via their entry
             continue
-        papers.append(parsed)
+        tag = elem.tag
+        if tag == TAG_ENTRY:
+            parsed = _parse_entry(elem)
+            # Skip error entries
+            if parsed["title"] != "Error":
+                papers.append(parsed)
+        elif tag == _TAG_TOTAL_RESULTS:
+            total_results = int(elem.text) if elem.text else 0
+        elif tag == _TAG_START_INDEX:
+            start_index = int(elem.text) if elem.text else 0
+        root.clear()
 
     return {
         "total_results": total_results,
@@ -161,6 +224,20 @@ def _parse_feed(xml_text: str) -> Dict[str, Any]:
     }
 
 
+async def _fetch_feed(params: Dict[str, Any], store: bool = True) -> Dict[str, Any]:
+    resp = await rate_limited_get("arxiv", ARXIV_API_BASE, params=params)
+    resp.raise_for_status()
+    content = resp.content
+    if len(content) >= ARXIV_OFFLOAD_PARSE_BYTES:
+        # Large feeds (100+ entries) are parsed in a worker thread to keep the event loop free
+        result = await asyncio.to_thread(_parse_feed, content)
+    else:
+        result = _parse_feed(content)
+    if store:
+        await paper_store.add_many("arxiv", result["papers"])
+    return result
+
+
 async def search_arxiv(
     query: str,
     search_field: str = "all",
@@ -169,13 +246,21 @@ async def search_arxiv(
     max_results: int = 20,
     sort_by: str = "relevance",
     sort_order: str = "descending",
+    raise_errors: bool = False,
 ) -> Dict[str, Any]:
     """
     Search arXiv papers.
     search_field: all, ti, au, abs, cat
     sort_by: relevance, lastUpdatedDate, submittedDate
     sort_order: ascending, descending
+    Errors give an empty result unless raise_errors is set.
     """
+    query = " ".join(query.split())
+    if search_field == "all" and sort_by == "relevance":
+        local = await paper_store.search("arxiv", query, max_results, start, category=category)
+        if local is not None:
+            return {"total_results": local[0], "start_index": start, "papers": local[1]}
+
     search_parts = []
     if query:
         clean_query = query.replace('"', '%22')
@@ -193,12 +278,17 @@ async def search_arxiv(
         "sortOrder": sort_order,
     }
 
+    async def fetch():
+        result = await _fetch_feed(params)
+        if search_field == "all":
+            await paper_store.add_total("arxiv", query, result["total_results"], category=category)
+        return result
+
     try:
-        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
-            resp = await client.get(ARXIV_API_BASE, params=params)
-            resp.raise_for_status()
-            return _parse_feed(resp.text)
+        return await upstream_cache.get_or_fetch("arxiv", "query", params, fetch)
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error(f"arXiv search error: {e}")
         return {"total_results": 0, "start_index": 0, "papers": []}
 
@@ -208,18 +298,80 @@ async def get_arxiv_paper(arxiv_id: str) -> Optional[Dict[str, Any]]:
     params = {"id_list": arxiv_id}
 
     try:
-        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
-            resp = await client.get(ARXIV_API_BASE, params=params)
-            resp.raise_for_status()
-            result = _parse_feed(resp.text)
-            if result["papers"]:
-                return result["papers"][0]
-            return None
+        result = await upstream_cache.get_or_fetch("arxiv", "query", params, lambda: _fetch_feed(params))
+        if result["papers"]:
+            return result["papers"][0]
+        return None
     except Exception as e:
         logger.error(f"arXiv paper fetch error: {e}")
         return None
 
 
+def split_version(arxiv_id: str) -> Tuple[str, Optional[int]]:
+    """Split '2301.00001v2' into ('2301.00001', 2); unversioned IDs give None."""
+    match = _VERSION_RE.match(arxiv_id)
+    if not match:
+        return arxiv_id, None
+    return match.group(1), int(match.group(2))
+
+
+def to_unified(paper: Dict[str, Any]) -> Dict[str, Any]:
+    """arXiv entry dict in the cross-source shape used by multi-search."""
+    return {
+        "source": "arxiv",
+        "source_id": paper["arxiv_id"],
+        "title": paper["title"],
+        "abstract": paper.get("summary", ""),
+        "authors": paper.get("authors", []),
+        "year": paper.get("year"),
+        "citation_count": 0,
+        "url": paper.get("abstract_url", ""),
+        "pdf_url": paper.get("pdf_url"),
+        "doi": paper.get("doi"),
+        "journal": paper.get("journal_ref"),
+        "fields_of_study": paper.get("categories", []),
+    }
+
+
+async def get_arxiv_papers(arxiv_ids: List[str], refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Resolve many arXiv IDs using comma-separated id_list batches.
+    Returns papers keyed by the ID as requested; IDs arXiv doesn't know are
+    left out. Unversioned IDs resolve to the latest version. refresh=True skips
+    the response cache, for callers that need arXiv's current version.
+    """
+    requested = list(dict.fromkeys(i.strip() for i in arxiv_ids if i and i.strip()))
+    chunks = [requested[i:i + ARXIV_ID_BATCH_SIZE] for i in range(0, len(requested), ARXIV_ID_BATCH_SIZE)]
+
+    async def fetch_chunk(chunk: List[str]) -> List[Dict[str, Any]]:
+        params = {"id_list": ",".join(chunk), "start": 0, "max_results": len(chunk)}
+        try:
+            result = await upstream_cache.get_or_fetch("arxiv", "query", params, lambda: _fetch_feed(params), refresh=refresh)
+            return result["papers"]
+        except Exception as e:
+            logger.error(f"arXiv batch fetch error ({len(chunk)} ids): {e}")
+            return []
+
+    # Chunks are queued on the arXiv rate limiter, which spaces them out
+    results = await asyncio.gather(*[fetch_chunk(c) for c in chunks])
+
+    by_exact = {}
+    by_base = {}
+    for papers in results:
+        for paper in papers:
+            by_exact[paper["arxiv_id"]] = paper
+            by_base[split_version(paper["arxiv_id"])[0]] = paper
+
+    found = {}
+    for arxiv_id in requested:
+        paper = by_exact.get(arxiv_id)
+        if paper is None and split_version(arxiv_id)[1] is None:
+            paper = by_base.get(arxiv_id)
+        if paper is not None:
+            found[arxiv_id] = paper
+    return found
+
+
 async def get_latest_papers(
     category: str = "cs.AI",
     max_results: int = 20,
@@ -234,6 +386,28 @@ async def get_latest_papers(
     )
 
 
+async def list_category_papers(
+    category: str,
+    submitted_from: str,
+    submitted_to: str,
+    start: int = 0,
+    max_results: int = 200,
+) -> Dict[str, Any]:
+    """
+    One page of a category's papers submitted between two GMT timestamps
+    (YYYYMMDDHHMM), newest first. Not cached and not written through; the
+    harvester stores pages itself.
+    """
+    params = {
+        "search_query": f"cat:{category} AND submittedDate:[{submitted_from} TO {submitted_to}]",
+        "start": start,
+        "max_results": max_results,
+        "sortBy": "submittedDate",
+        "sortOrder": "descending",
+    }
+    return await _fetch_feed(params, store=False)
+
+
 def get_categories() -> List[Dict[str, str]]:
     """Return list of supported arXiv categories."""
     return [
@@ -0,0 +1,373 @@
+"""
+Paper Comparison
+Side-by-side comparison of up to COMPARE_MAX_PAPERS papers. Everything except
+the narrative is computed locally: metadata columns, a pairwise text-similarity
+matrix from the cached paper embeddings, and author and field overlap from
+paper-by-name incidence matrices. Per-paper summaries come from the summary
+cache only. The LLM writes just the narrative, from its own comparison prompt
+fed with those summaries where they exist and the abstracts otherwise, and can
+do so inline, as a background job or not at all. Narratives are cached by
+prompt, apart from the per-paper summaries.
+"""
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.ai_service import (
+    CHARS_PER_TOKEN, SUMMARY_MODEL, SUMMARY_PROVIDER, SummaryStreamParser, lookup_summary, summary_flights, summary_key,
+)
+from services.embedding_service import EMBEDDING_MODEL, embedding_cache
+from services.job_queue import enqueue, register_job
+from services.llm_client import API_KEY, llm_client
+from services.response_cache import upstream_cache
+from services.suggest_service import normalize
+
+logger = logging.getLogger(__name__)
+
+COMPARE_MAX_PAPERS = int(os.environ.get("COMPARE_MAX_PAPERS", 50))
+# "auto" writes the narrative inline up to this many papers and as a background job above it
+COMPARE_INLINE_NARRATIVE = int(os.environ.get("COMPARE_INLINE_NARRATIVE", 5))
+NARRATIVE_MODES = ("auto", "inline", "background", "none")
+# Prompt size for the narrative; abstracts of papers without a cached summary share what is left
+NARRATIVE_PROMPT_TOKENS = int(os.environ.get("NARRATIVE_PROMPT_TOKENS", 24000))
+NARRATIVE_CACHE_TTL = int(os.environ.get("NARRATIVE_CACHE_TTL", 30 * 24 * 3600))
+# Bump when the comparison prompt or its parsing changes so older cached narratives are not served
+NARRATIVE_PROMPT_VERSION = "v1"
+NARRATIVE_SYSTEM_MESSAGE = "You are an expert research analyst who compares academic papers and explains how they relate."
+NARRATIVE_SECTIONS = (
+    ("OVERVIEW:", "overview"),
+    ("DIFFERENCES:", "differences"),
+    ("COMMON_THEMES:", "common_themes"),
+    ("MOST_IMPACTFUL:", "most_impactful"),
+)
+# Sections written as "- " bullet lists; the others are prose
+NARRATIVE_LIST_SECTIONS = ("differences", "common_themes")
+TOP_PAIRS = 10
+
+# Cache namespace for narratives, keyed by prompt
+CACHE_SOURCE = "llm_comparison"
+CACHE_ENDPOINT = "narrative"
+
+
+def comparison_matrix(papers: List[dict]) -> Dict[str, list]:
+    matrix = {
+        "titles": [],
+        "authors": [],
+        "years": [],
+        "citations": [],
+        "sources": [],
+        "journals": [],
+        "fields": [],
+        "has_pdf": [],
+    }
+
+    for p in papers:
+        matrix["titles"].append(p.get("title", ""))
+        matrix["authors"].append(", ".join(p.get("authors", [])[:3]))
+        matrix["years"].append(p.get("year"))
+        matrix["citations"].append(p.get("citation_count", 0))
+        matrix["sources"].append(p.get("source", ""))
+        matrix["journals"].append(p.get("journal") or "N/A")
+        matrix["fields"].append(", ".join(p.get("fields_of_study", [])[:3]) or "N/A")
+        matrix["has_pdf"].append(bool(p.get("pdf_url")))
+    return matrix
+
+
+def _author_key(name: str) -> str:
+    """Surname plus first initial, so "G. Hinton" and "Geoffrey Hinton" match."""
+    parts = normalize(name).split()
+    if len(parts) < 2:
+        return " ".join(parts)
+    return f"{parts[-1]} {parts[0][0]}"
+
+
+def _incidence(groups: List[List[str]], key: Callable[[str], str]) -> Tuple[np.ndarray, List[str]]:
+    """Papers x distinct names 0/1 matrix, with the first spelling seen of each name."""
+    columns: Dict[str, int] = {}
+    labels: List[str] = []
+    rows, cols = [], []
+    for i, names in enumerate(groups):
+        for name in names:
+            k = key(name or "")
+            if not k:
+                continue
+            if k not in columns:
+                columns[k] = len(labels)
+                labels.append(name)
+            rows.append(i)
+            cols.append(columns[k])
+    matrix = np.zeros((len(groups), len(labels)))
+    matrix[rows, cols] = 1.0
+    return matrix, labels
+
+
+def _overlap(matrix: np.ndarray, labels: List[str]) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    """Pairwise Jaccard overlap, and the shared names of every pair that has any."""
+    shared = matrix @ matrix.T
+    sizes = np.diag(shared)
+    union = sizes[:, None] + sizes[None, :] - shared
+    jaccard = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+    pairs = [
+        {"papers": [int(i), int(j)], "names": [labels[k] for k in np.flatnonzero(matrix[i] * matrix[j])]}
+        for i, j in zip(*np.nonzero(np.triu(shared, 1)))
+    ]
+    return jaccard, pairs
+
+
+async def similarity_analysis(papers: List[dict]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    vectors, _ = await embedding_cache.embed_papers(papers)
+    vectors = vectors.astype(np.float32)
+    # float64 before rounding, so the JSON carries 0.882 rather than 0.8820000290870667
+    text = np.clip(vectors @ vectors.T, -1.0, 1.0).astype(np.float64)
+
+    authors, author_names = _incidence([p.get("authors") or [] for p in papers], _author_key)
+    fields, field_names = _incidence(
+        [list(p.get("fields_of_study") or []) + list(p.get("categories") or []) for p in papers], normalize
+    )
+    author_overlap, shared_authors = _overlap(authors, author_names)
+    field_overlap, shared_fields = _overlap(fields, field_names)
+
+    upper = np.triu_indices(len(papers), 1)
+    pair_scores = text[upper]
+    top = np.argsort(-pair_scores, kind="stable")[:TOP_PAIRS]
+    return {
+        "method": EMBEDDING_MODEL,
+        "text_similarity": np.round(text, 3).tolist(),
+        "author_overlap": np.round(author_overlap, 3).tolist(),
+        "field_overlap": np.round(field_overlap, 3).tolist(),
+        "most_similar_pairs": [
+            {"papers": [int(upper[0][k]), int(upper[1][k])], "similarity": round(float(pair_scores[k]), 3)} for k in top
+        ],
+        "shared_authors": [{"papers": p["papers"], "authors": p["names"]} for p in shared_authors],
+        "shared_fields": [{"papers": p["papers"], "fields": p["names"]} for p in shared_fields],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def _cached_summaries(papers: List[dict]) -> List[Optional[dict]]:
+    return [
+        lookup_summary(summary_key(p.get("title") or "", p.get("abstract") or "")) if p.get("abstract") else None
+        for p in papers
+    ]
+
+
+async def local_comparison(papers: List[dict]) -> Dict[str, Any]:
+    """Everything but the narrative: metadata matrix, similarity analysis and cached per-paper summaries."""
+    summaries, analysis = await asyncio.gather(
+        asyncio.to_thread(_cached_summaries, papers), similarity_analysis(papers)
+    )
+    return {
+        "comparison_matrix": comparison_matrix(papers),
+        "analysis": analysis,
+        "summaries": summaries,
+    }
+
+
+def _abstract_caps(lengths: List[int], budget: int) -> List[int]:
+    """Split budget characters across abstracts: short ones whole, the rest an equal share of what remains."""
+    caps = [0] * len(lengths)
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    for n, i in enumerate(order):
+        caps[i] = min(lengths[i], max(budget, 0) // (len(order) - n))
+        budget -= caps[i]
+    return caps
+
+
+def _clip(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + " ..."
+
+
+def narrative_prompt(papers: List[dict], local: Dict[str, Any]) -> str:
+    """
+    Comparison prompt: each paper's cached summary, or its abstract, clipped only
+    when the abstracts together would overrun NARRATIVE_PROMPT_TOKENS, plus the
+    overlap measured locally.
+    """
+    summaries = local["summaries"]
+    abstracts = [" ".join((p.get("abstract") or "").split()) if not s else "" for p, s in zip(papers, summaries)]
+    used = sum(len(p.get("title") or "") + len(s["summary"]) for p, s in zip(papers, summaries) if s)
+    caps = _abstract_caps([len(a) for a in abstracts], NARRATIVE_PROMPT_TOKENS * CHARS_PER_TOKEN - used)
+    combined = "\n\n".join([
+        f"Paper {i+1}: {p.get('title', '')}\nSummary: {s['summary']}" if s else
+        f"Paper {i+1}: {p.get('title', '')}\nAbstract: {_clip(a, cap)}"
+        for i, (p, s, a, cap) in enumerate(zip(papers, summaries, abstracts, caps))
+    ])
+    analysis = local["analysis"]
+    findings = [
+        f"Papers {pair['papers'][0] + 1} and {pair['papers'][1] + 1} are the closest in content (similarity {pair['similarity']:.2f})"
+        for pair in analysis["most_similar_pairs"][:3]
+    ]
+    findings += [
+        f"Papers {pair['papers'][0] + 1} and {pair['papers'][1] + 1} share authors: {', '.join(pair['authors'][:3])}"
+        for pair in analysis["shared_authors"][:5]
+    ]
+    overlap = "\n".join(f"- {f}" for f in findings) or "- None found"
+    return f"""Compare these {len(papers)} academic papers, referring to them as Paper 1, Paper 2 and so on.
+
+{combined}
+
+Measured overlap:
+{overlap}
+
+Provide your response in this exact format:
+OVERVIEW: [2-3 sentences on what the papers have in common and where they part ways]
+DIFFERENCES:
+- [How one paper's approach differs from the others, naming the papers]
+- [Another difference]
+COMMON_THEMES:
+- [A theme several papers share, naming them]
+- [Another theme]
+MOST_IMPACTFUL: [Which paper is likely the most impactful and why, in one or two sentences]"""
+
+
+def narrative_key(prompt: str) -> str:
+    parts = [prompt, f"{SUMMARY_PROVIDER}/{SUMMARY_MODEL}", NARRATIVE_PROMPT_VERSION]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def parse_narrative(text: str) -> Dict[str, Any]:
+    result: Dict[str, Any] = {name: [] if name in NARRATIVE_LIST_SECTIONS else "" for _, name in NARRATIVE_SECTIONS}
+    section = None
+    for line in text.strip().split("\n"):
+        line = line.strip()
+        header = next((h for h in NARRATIVE_SECTIONS if line.startswith(h[0])), None)
+        if header is not None:
+            section = header[1]
+            line = line[len(header[0]):].strip()
+            if not line:
+                continue
+        if section is None or not line:
+            continue
+        if section in NARRATIVE_LIST_SECTIONS:
+            if line.startswith("-"):
+                result[section].append(line[1:].strip())
+        else:
+            result[section] = f"{result[section]} {line}".strip()
+    if not any(result.values()):
+        result["overview"] = text.strip()[:1000]
+    return result
+
+
+async def lookup_narrative(prompt: str) -> Optional[dict]:
+    """Cached narrative for a comparison prompt, or None."""
+    (hit,) = await upstream_cache.lookup_many(CACHE_SOURCE, CACHE_ENDPOINT, [{"key": narrative_key(prompt)}])
+    return {**hit[0], "cached": True} if hit is not None else None
+
+
+async def _store_narrative(prompt: str, result: dict):
+    await upstream_cache.store_many(
+        CACHE_SOURCE, CACHE_ENDPOINT, [({"key": narrative_key(prompt)}, result)], ttl=NARRATIVE_CACHE_TTL
+    )
+
+
+async def _write_uncached(prompt: str, owner) -> dict:
+    text = await llm_client.complete(prompt, NARRATIVE_SYSTEM_MESSAGE, f"{SUMMARY_PROVIDER}/{SUMMARY_MODEL}", owner=owner)
+    result = parse_narrative(text)
+    await _store_narrative(prompt, result)
+    return result
+
+
+async def write_narrative(prompt: str, owner=None) -> dict:
+    """
+    Narrative for a comparison prompt, from the cache or the LLM. Concurrent calls
+    for the same prompt share a single LLM call. Raises if the LLM call fails.
+    """
+    cached = await lookup_narrative(prompt)
+    if cached is not None:
+        return cached
+    if not API_KEY:
+        raise RuntimeError("AI comparison unavailable. API key not configured.")
+    result = await summary_flights.do("comparison", narrative_key(prompt), lambda: _write_uncached(prompt, owner))
+    return {**result, "cached": False}
+
+
+async def stream_narrative(prompt: str, owner=None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of write_narrative: "section" and "token" events as the LLM
+    writes, then a "narrative" event with the parsed result, or an "error" event.
+    """
+    started = time.perf_counter()
+    cached = await lookup_narrative(prompt)
+    if cached is not None:
+        for _, section in NARRATIVE_SECTIONS:
+            yield {"event": "section", "section": section}
+        yield {"event": "narrative", **cached, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+        return
+    if not API_KEY:
+        yield {"event": "error", "error": "AI comparison unavailable. API key not configured."}
+        return
+
+    parser = SummaryStreamParser(NARRATIVE_SECTIONS)
+    chunks = llm_client.stream(prompt, NARRATIVE_SYSTEM_MESSAGE, f"{SUMMARY_PROVIDER}/{SUMMARY_MODEL}", owner=owner)
+    try:
+        async for chunk in chunks:
+            for event in parser.feed(chunk):
+                yield event
+    except Exception as e:
+        logger.error(f"AI comparison stream error: {e}")
+        yield {"event": "error", "error": f"AI comparison failed: {str(e)}"}
+        return
+    finally:
+        # Runs when the consumer closes this generator early too, so the LLM slot is freed at once
+        await chunks.aclose()
+    for event in parser.finish():
+        yield event
+
+    result = parse_narrative(parser.text)
+    await _store_narrative(prompt, result)
+    yield {"event": "narrative", **result, "cached": False, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+async def compare(papers: List[dict], owner: Optional[int], narrative: str = "auto") -> Dict[str, Any]:
+    """
+    Local comparison plus the narrative. "inline" waits for the LLM, "background"
+    queues it and returns the job handle in narrative_job (unless it is already
+    cached), "none" skips it. An inline narrative that fails leaves ai_comparison
+    empty and the reason in narrative_error.
+    """
+    local = await local_comparison(papers)
+    result = {"papers": papers, **local, "ai_comparison": None, "narrative_job": None}
+    if narrative == "auto":
+        narrative = "inline" if len(papers) <= COMPARE_INLINE_NARRATIVE else "background"
+    if narrative == "none":
+        return result
+
+    prompt = narrative_prompt(papers, local)
+    if narrative == "inline":
+        try:
+            result["ai_comparison"] = await write_narrative(prompt, owner)
+        except Exception as e:
+            logger.error(f"AI comparison error: {e}")
+            result["narrative_error"] = f"AI comparison failed: {str(e)}"
+    else:
+        cached = await lookup_narrative(prompt)
+        if cached is not None:
+            result["ai_comparison"] = cached
+        else:
+            result["narrative_job"] = await enqueue("compare_narrative", {"prompt": prompt}, owner)
+    return result
+
+
+async def _narrative_job(payload: Dict[str, Any], user_id: Optional[int]) -> dict:
+    """Background narrative; an LLM failure raises so the job queue retries it."""
+    return await write_narrative(payload["prompt"], user_id)
+
+
+async def _compare_job(payload: Dict[str, Any], user_id: Optional[int]) -> dict:
+    """Background comparison; an LLM failure raises so the job queue retries it."""
+    papers = payload["papers"]
+    local = await local_comparison(papers)
+    ai_comparison = await write_narrative(narrative_prompt(papers, local), user_id)
+    return {"papers": papers, **local, "ai_comparison": ai_comparison, "narrative_job": None}
+
+
+register_job("compare", _compare_job)
+register_job("compare_narrative", _narrative_job)
@@ -0,0 +1,214 @@
+"""
+Embedding Service
+CPU-only text embeddings for semantic reranking: character 3-5-gram features are
+hashed into a fixed number of buckets (signed, log-scaled) and reduced with a
+seeded Gaussian random projection, then L2-normalized. Feature extraction and
+projection are vectorized over a whole batch. Paper vectors are cached in memory
+and in SQLite, keyed on a hash of the model version and the paper's text.
+"""
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.ranking_service import ASCII_FOLD
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "./embeddings.db")
+EMBEDDING_MEMORY_ENTRIES = int(os.environ.get("EMBEDDING_MEMORY_ENTRIES", 20000))
+EMBEDDING_DIM = 256
+HASH_BUCKETS = 4096
+NGRAM_SIZES = (3, 4, 5)
+PROJECTION_SEED = 20240601
+# Bump when features or projection change so cached vectors are not reused
+EMBEDDING_MODEL = f"hashngram-{'-'.join(map(str, NGRAM_SIZES))}-{HASH_BUCKETS}x{EMBEDDING_DIM}-v1"
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_BUCKET_SHIFT = np.uint64(64 - HASH_BUCKETS.bit_length() + 1)
+_projection: Optional[np.ndarray] = None
+
+
+def _projection_matrix() -> np.ndarray:
+    global _projection
+    if _projection is None:
+        rng = np.random.default_rng(PROJECTION_SEED)
+        _projection = (rng.standard_normal((HASH_BUCKETS, EMBEDDING_DIM)) / np.sqrt(EMBEDDING_DIM)).astype(np.float32)
+    return _projection
+
+
+def encode(texts: List[str]) -> np.ndarray:
+    """(len(texts), EMBEDDING_DIM) float32 unit vectors, one batch at a time."""
+    if not texts:
+        return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    # One folded, space-collapsed byte buffer; n-grams never straddle two texts
+    folded = [b" " + b" ".join(t.encode().translate(ASCII_FOLD).split()) + b" " for t in texts]
+    buf = np.frombuffer(b"".join(folded), dtype=np.uint8).astype(np.uint64)
+    ends = np.cumsum([len(f) for f in folded])
+    doc_of = np.repeat(np.arange(len(texts), dtype=np.int64), [len(f) for f in folded])
+
+    features = np.zeros((len(texts), HASH_BUCKETS), dtype=np.float32)
+    for n in NGRAM_SIZES:
+        if len(buf) < n:
+            continue
+        count = len(buf) - n + 1
+        code = np.zeros(count, dtype=np.uint64)
+        for k in range(n):
+            code = (code << np.uint64(8)) | buf[k:k + count]
+        starts = np.arange(count)
+        valid = starts + n <= ends[doc_of[:count]]
+        mixed = code[valid] * _GOLDEN
+        buckets = (mixed >> _BUCKET_SHIFT).astype(np.int64)
+        # Lowest bit of the mixed hash picks the sign, so collisions cancel on average
+        signs = np.where(mixed & np.uint64(1), 1.0, -1.0)
+        flat = doc_of[:count][valid] * HASH_BUCKETS + buckets
+        features += np.bincount(flat, weights=signs, minlength=len(texts) * HASH_BUCKETS).reshape(len(texts), HASH_BUCKETS)
+
+    features = np.sign(features) * np.log1p(np.abs(features))
+    vectors = features @ _projection_matrix()
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+
+def paper_text(paper: Dict[str, Any]) -> str:
+    title = paper.get("title") or ""
+    # Title repeated so it carries more weight than any one abstract sentence
+    return f"{title} {title} {paper.get('abstract') or paper.get('summary') or ''}"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(f"{EMBEDDING_MODEL}\n{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, memory_entries: int = EMBEDDING_MEMORY_ENTRIES):
+        self.path = path
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._disabled = False
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "encoded": 0, "encode_ms": 0.0}
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and not self._disabled:
+            try:
+                conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding disk cache unavailable, using memory only: {e}")
+                self._disabled = True
+        return self._conn
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return found
+            try:
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    rows = conn.execute(
+                        f"SELECT hash, vector FROM embeddings WHERE hash IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache read error: {e}")
+        return found
+
+    def _disk_put_many(self, items: List[Tuple[str, np.ndarray]]):
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (hash, vector) VALUES (?, ?)",
+                    [(key, vector.astype(np.float16).tobytes()) for key, vector in items],
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                conn.execute("ROLLBACK")
+                logger.warning(f"Embedding cache write error: {e}")
+
+    async def embed_papers(self, papers: List[Dict[str, Any]]) -> Tuple[np.ndarray, Dict[str, int]]:
+        """
+        Unit vectors for papers, from cache where possible; misses are encoded in a
+        single batch and written back. Returns (vectors, {"cached", "encoded"}).
+        """
+        keys = [content_hash(paper_text(p)) for p in papers]
+        vectors: Dict[str, np.ndarray] = {}
+        for key in keys:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                vectors[key] = self._memory[key]
+        self._stats["memory_hits"] += len(vectors)
+
+        missing = [k for k in dict.fromkeys(keys) if k not in vectors]
+        if missing:
+            from_disk = await asyncio.to_thread(self._disk_get_many, missing)
+            self._stats["disk_hits"] += len(from_disk)
+            for key, vector in from_disk.items():
+                vectors[key] = vector
+                self._remember(key, vector)
+
+        to_encode = [k for k in dict.fromkeys(keys) if k not in vectors]
+        if to_encode:
+            texts = dict(zip(keys, (paper_text(p) for p in papers)))
+            started = time.perf_counter()
+            encoded = await asyncio.to_thread(encode, [texts[k] for k in to_encode])
+            self._stats["encode_ms"] += (time.perf_counter() - started) * 1000
+            self._stats["encoded"] += len(to_encode)
+            for key, vector in zip(to_encode, encoded):
+                vectors[key] = vector
+                self._remember(key, vector)
+            await asyncio.to_thread(self._disk_put_many, list(zip(to_encode, encoded)))
+
+        matrix = np.stack([vectors[k] for k in keys]) if keys else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        return matrix, {"cached": len(keys) - len(to_encode), "encoded": len(to_encode)}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"model": EMBEDDING_MODEL, "memory_entries": len(self._memory), **{k: round(v, 1) for k, v in self._stats.items()}}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+embedding_cache = EmbeddingCache()
+
+
+async def semantic_rerank(query: str, papers: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Order papers by cosine similarity to the query; sets each paper's "score"."""
+    started = time.perf_counter()
+    doc_vectors, counts = await embedding_cache.embed_papers(papers)
+    if not papers:
+        return papers, {"method": "semantic", "latency_ms": 0.0, **counts}
+    similarity = doc_vectors @ encode([query])[0]
+    order = np.argsort(-similarity, kind="stable")
+    ranked = []
+    for i in order:
+        papers[i]["score"] = round(float(similarity[i]), 4)
+        ranked.append(papers[i])
+    return ranked, {"method": "semantic", "latency_ms": round((time.perf_counter() - started) * 1000, 2), **counts}
@@ -0,0 +1,188 @@
+"""
+Citation Enrichment Service
+Fills in citation counts, DOIs and open-access PDF links from Semantic Scholar's
+/paper/batch endpoint (up to 500 IDs per call). Results are cached per paper, so
+search results can be enriched inline under a latency budget while a periodic
+job keeps saved and workspace papers fresh.
+"""
+import os
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from db.postgres import SessionLocal
+from models.user_models import SavedArxivPaper, WorkspacePaper
+from services.arxiv_service import split_version
+from services.rate_limiter import background_lane, get_scheduler, rate_limited_request
+from services.response_cache import upstream_cache
+from services.semantic_scholar_service import SS_API
+
+logger = logging.getLogger(__name__)
+
+S2_BATCH_SIZE = 500
+S2_BATCH_FIELDS = "paperId,citationCount,externalIds,openAccessPdf"
+ENRICHMENT_TTL = int(os.environ.get("ENRICHMENT_TTL", 24 * 3600))
+ENRICHMENT_INLINE_BUDGET_MS = int(os.environ.get("ENRICHMENT_INLINE_BUDGET_MS", 800))
+ENRICHMENT_REFRESH_INTERVAL = int(os.environ.get("ENRICHMENT_REFRESH_INTERVAL", 12 * 3600))
+
+# Cache namespace for per-paper enrichment records
+CACHE_SOURCE = "s2_enrichment"
+CACHE_ENDPOINT = "paper/batch"
+
+_pending = set()
+# Strong references to fetches that outlive the request, so they aren't collected mid-flight
+_tasks = set()
+_stats = {"inline": 0, "over_budget": 0, "deferred": 0}
+
+
+def s2_lookup_id(paper: Dict[str, Any]) -> Optional[str]:
+    """Semantic Scholar batch ID for a unified paper dict, or None if it can't be looked up."""
+    source = paper.get("source")
+    source_id = paper.get("source_id") or ""
+    if source == "semantic_scholar" and source_id:
+        return source_id
+    if source == "arxiv" and source_id:
+        return f"ARXIV:{split_version(source_id)[0]}"
+    if paper.get("doi"):
+        return f"DOI:{paper['doi']}"
+    return None
+
+
+def _to_record(item: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # Unknown IDs are cached as an empty record so they aren't re-requested every search
+    if not item:
+        return {}
+    external = item.get("externalIds") or {}
+    return {
+        "paper_id": item.get("paperId"),
+        "citation_count": item.get("citationCount"),
+        "doi": external.get("DOI"),
+        "arxiv_id": external.get("ArXiv"),
+        "pdf_url": (item.get("openAccessPdf") or {}).get("url"),
+    }
+
+
+async def _fetch_batch(ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """POST one /paper/batch request and cache each record."""
+    resp = await rate_limited_request(
+        "semantic_scholar", "POST", f"{SS_API}/paper/batch",
+        params={"fields": S2_BATCH_FIELDS}, json={"ids": ids},
+    )
+    resp.raise_for_status()
+    records = {i: _to_record(item) for i, item in zip(ids, resp.json())}
+    await upstream_cache.store_many(
+        CACHE_SOURCE, CACHE_ENDPOINT, [({"id": i}, r) for i, r in records.items()], ttl=ENRICHMENT_TTL
+    )
+    return records
+
+
+async def fetch_records(ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Fetch enrichment records for IDs from upstream, in chunks of 500."""
+    records = {}
+    for i in range(0, len(ids), S2_BATCH_SIZE):
+        chunk = ids[i:i + S2_BATCH_SIZE]
+        try:
+            records.update(await _fetch_batch(chunk))
+        except Exception as e:
+            logger.error(f"Semantic Scholar batch error ({len(chunk)} ids): {e}")
+    return records
+
+
+def _start_fetch(ids: List[str]) -> asyncio.Task:
+    task = asyncio.ensure_future(fetch_records(ids))
+    _tasks.add(task)
+
+    def done(t):
+        _tasks.discard(t)
+        _pending.difference_update(ids)
+
+    task.add_done_callback(done)
+    return task
+
+
+def _apply(paper: Dict[str, Any], record: Dict[str, Any]):
+    if not record:
+        return
+    if record.get("citation_count") is not None:
+        paper["citation_count"] = max(paper.get("citation_count") or 0, record["citation_count"])
+    if not paper.get("doi") and record.get("doi"):
+        paper["doi"] = record["doi"]
+    if not paper.get("pdf_url") and record.get("pdf_url"):
+        paper["pdf_url"] = record["pdf_url"]
+
+
+async def enrich_papers(papers: List[Dict[str, Any]], budget_ms: Optional[int] = ENRICHMENT_INLINE_BUDGET_MS) -> List[Dict[str, Any]]:
+    """
+    Enrich unified paper dicts in place with citation counts, DOIs and PDF links.
+    Cached records are applied immediately. Misses are fetched upstream, waiting
+    at most budget_ms (None waits for completion); a fetch that overruns keeps
+    going in the background and fills the cache for the next request. When the
+    Semantic Scholar scheduler has no token free (a search to the same host is
+    usually queued alongside), the fetch goes straight to the background lane
+    instead of spending the budget waiting behind it.
+    """
+    ids = [s2_lookup_id(p) for p in papers]
+    wanted = list(dict.fromkeys(i for i in ids if i))
+    if not wanted:
+        return papers
+
+    cached = await upstream_cache.lookup_many(CACHE_SOURCE, CACHE_ENDPOINT, [{"id": i} for i in wanted])
+    records = {i: hit[0] for i, hit in zip(wanted, cached) if hit is not None}
+    missing = [i for i, hit in zip(wanted, cached) if hit is None or not hit[1]]
+    missing = [i for i in missing if i not in _pending]
+
+    if missing:
+        _pending.update(missing)
+        if budget_ms is not None and not get_scheduler("semantic_scholar").ready():
+            with background_lane():
+                _start_fetch(missing)
+            _stats["deferred"] += 1
+            logger.info(f"Semantic Scholar busy; {len(missing)} papers will be enriched in the background")
+        else:
+            task = _start_fetch(missing)
+            _stats["inline"] += 1
+            try:
+                if budget_ms is None:
+                    records.update(await task)
+                else:
+                    records.update(await asyncio.wait_for(asyncio.shield(task), budget_ms / 1000))
+            except asyncio.TimeoutError:
+                _stats["over_budget"] += 1
+                logger.info(f"Enrichment over budget ({budget_ms}ms); {len(missing)} papers will be filled from cache later")
+
+    for paper, lookup_id in zip(papers, ids):
+        if lookup_id:
+            _apply(paper, records.get(lookup_id, {}))
+    return papers
+
+
+def enrichment_stats() -> Dict[str, Any]:
+    return dict(_stats)
+
+
+def _library_papers() -> List[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        papers = [
+            {"source": "arxiv", "source_id": row[0]}
+            for row in db.query(SavedArxivPaper.arxiv_id).distinct().all()
+        ]
+        papers += [
+            {"source": row[0], "source_id": row[1], "doi": row[2]}
+            for row in db.query(WorkspacePaper.source, WorkspacePaper.source_id, WorkspacePaper.doi).distinct().all()
+        ]
+        return papers
+    finally:
+        db.close()
+
+
+async def refresh_library_enrichment() -> int:
+    """Periodic job: refetch enrichment for every saved arXiv paper and workspace paper."""
+    # The library queries are sync SQLAlchemy; run them off the event loop
+    papers = await asyncio.to_thread(_library_papers)
+    ids = list(dict.fromkeys(i for i in (s2_lookup_id(p) for p in papers) if i))
+    if not ids:
+        return 0
+    with background_lane():
+        records = await fetch_records(ids)
+    logger.info(f"Refreshed citation data for {len(records)}/{len(ids)} library papers")
+    return len(records)
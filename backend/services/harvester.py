@@ -0,0 +1,172 @@
+"""
+arXiv Category Harvester
+Background job that walks each tracked category by submission date and fills the
+local paper store, instead of polling the newest 50 papers. Progress is
+checkpointed per category after every page, so an interrupted harvest resumes
+where it stopped.
+"""
+import os
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+from db.postgres import SessionLocal
+from models.user_models import ArxivHarvestCheckpoint
+from services.arxiv_service import ARXIV_CATEGORIES, list_category_papers
+from services.paper_store import paper_store
+from services.rate_limiter import background_lane
+
+logger = logging.getLogger(__name__)
+
+HARVEST_ENABLED = os.environ.get("HARVEST_ENABLED", "true").lower() in ("1", "true", "yes")
+HARVEST_INTERVAL = int(os.environ.get("HARVEST_INTERVAL", 3600))
+HARVEST_CATEGORIES = [
+    c.strip() for c in os.environ.get("HARVEST_CATEGORIES", ",".join(ARXIV_CATEGORIES)).split(",") if c.strip()
+]
+HARVEST_PAGE_SIZE = int(os.environ.get("HARVEST_PAGE_SIZE", 200))
+# Pages stop after this many papers per category per run; the next run resumes
+HARVEST_MAX_PER_RUN = int(os.environ.get("HARVEST_MAX_PER_RUN", 5000))
+HARVEST_BACKFILL_DAYS = int(os.environ.get("HARVEST_BACKFILL_DAYS", 7))
+# arXiv lists papers a day or two after submission, so each window re-reads this far back
+HARVEST_OVERLAP_HOURS = int(os.environ.get("HARVEST_OVERLAP_HOURS", 72))
+
+ARXIV_TIME_FORMAT = "%Y%m%d%H%M"
+
+_stats: Dict[str, Dict[str, Any]] = {}
+
+
+def _format(dt: datetime) -> str:
+    return dt.strftime(ARXIV_TIME_FORMAT)
+
+
+def _parse(stamp: str) -> datetime:
+    return datetime.strptime(stamp, ARXIV_TIME_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def _open_window(checkpoint: ArxivHarvestCheckpoint, now: datetime):
+    if checkpoint.harvested_until:
+        start = _parse(checkpoint.harvested_until) - timedelta(hours=HARVEST_OVERLAP_HOURS)
+    else:
+        start = now - timedelta(days=HARVEST_BACKFILL_DAYS)
+    checkpoint.window_from = _format(start)
+    checkpoint.window_to = _format(now)
+    checkpoint.next_start = 0
+
+
+async def harvest_category(category: str) -> int:
+    """
+    Harvest one category from its checkpoint. Each page is upserted in a single
+    transaction and the checkpoint committed right after. Returns papers stored.
+    """
+    db = SessionLocal()
+    started = time.monotonic()
+    stored = 0
+    skipped = 0
+    try:
+        checkpoint = db.query(ArxivHarvestCheckpoint).filter(ArxivHarvestCheckpoint.category == category).first()
+        if checkpoint is None:
+            checkpoint = ArxivHarvestCheckpoint(category=category, next_start=0, total_harvested=0)
+            db.add(checkpoint)
+        if not checkpoint.window_to:
+            _open_window(checkpoint, datetime.now(timezone.utc))
+        checkpoint.last_run_at = datetime.now(timezone.utc)
+        checkpoint.last_error = None
+        db.commit()
+
+        complete = False
+        with background_lane():
+            while stored < HARVEST_MAX_PER_RUN:
+                page = await list_category_papers(
+                    category, checkpoint.window_from, checkpoint.window_to,
+                    start=checkpoint.next_start, max_results=HARVEST_PAGE_SIZE,
+                )
+                papers = page["papers"]
+                if not papers:
+                    # arXiv occasionally returns an empty page mid-listing; only trust it at the end
+                    complete = checkpoint.next_start >= page["total_results"]
+                    break
+                # Only a store failure stops the run; entries without an ID or title are skipped
+                written = await paper_store.add_many("arxiv", papers, raise_errors=True)
+                if written < len(papers):
+                    skipped += len(papers) - written
+                    logger.warning(
+                        f"Harvest of {category} skipped {len(papers) - written} unusable entries"
+                        f" at offset {checkpoint.next_start}"
+                    )
+                stored += written
+                checkpoint.next_start += len(papers)
+                checkpoint.total_harvested += len(papers)
+                db.commit()
+                if checkpoint.next_start >= page["total_results"]:
+                    complete = True
+                    break
+
+        if complete:
+            checkpoint.harvested_until = checkpoint.window_to
+            checkpoint.window_from = checkpoint.window_to = None
+            checkpoint.next_start = 0
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        checkpoint = db.query(ArxivHarvestCheckpoint).filter(ArxivHarvestCheckpoint.category == category).first()
+        if checkpoint is not None:
+            checkpoint.last_error = str(e)
+            db.commit()
+        raise
+    finally:
+        db.close()
+        _record(category, stored, skipped, time.monotonic() - started)
+    return stored
+
+
+def _record(category: str, stored: int, skipped: int, elapsed: float):
+    stats = _stats.setdefault(category, {"runs": 0, "papers": 0, "skipped": 0, "seconds": 0.0})
+    stats["runs"] += 1
+    stats["papers"] += stored
+    stats["skipped"] += skipped
+    stats["seconds"] += elapsed
+    stats["last_run_papers"] = stored
+    stats["last_run_papers_per_min"] = round(stored / elapsed * 60, 1) if elapsed > 0 else None
+
+
+async def harvest_all() -> int:
+    """Periodic job: harvest every configured category in turn."""
+    total = 0
+    for category in HARVEST_CATEGORIES:
+        try:
+            total += await harvest_category(category)
+        except Exception as e:
+            logger.error(f"Harvest of {category} failed: {e}")
+    logger.info(f"Harvested {total} arXiv papers across {len(HARVEST_CATEGORIES)} categories")
+    return total
+
+
+def harvest_stats() -> Dict[str, Any]:
+    papers = sum(s["papers"] for s in _stats.values())
+    seconds = sum(s["seconds"] for s in _stats.values())
+    return {
+        "papers": papers,
+        "papers_per_min": round(papers / seconds * 60, 1) if seconds > 0 else None,
+        "categories": {c: dict(s) for c, s in _stats.items()},
+        "checkpoints": get_checkpoints(),
+    }
+
+
+def get_checkpoints() -> List[Dict[str, Any]]:
+    """Persisted harvest progress per category."""
+    db = SessionLocal()
+    try:
+        return [
+            {
+                "category": c.category,
+                "harvested_until": c.harvested_until,
+                "in_progress": bool(c.window_to),
+                "next_start": c.next_start,
+                "total_harvested": c.total_harvested,
+                "last_run_at": c.last_run_at,
+                "last_error": c.last_error,
+            }
+            for c in db.query(ArxivHarvestCheckpoint).order_by(ArxivHarvestCheckpoint.category).all()
+        ]
+    finally:
+        db.close()
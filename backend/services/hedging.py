@@ -0,0 +1,102 @@
+"""
+Hedged Upstream Calls
+If a source hasn't answered within its recent p95 latency, a duplicate request
+is sent and whichever finishes first wins. The hedge runs outside request
+coalescing, so it is not joined to the slow original and a losing hedge is
+cancelled for real. A losing original is a shared flight that runs on and
+fills the cache; it is counted as abandoned.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from services.rate_limiter import get_scheduler, upstream_latency
+from services.singleflight import flight_attempt
+
+logger = logging.getLogger(__name__)
+
+HEDGE_SOURCES = {s.strip() for s in os.environ.get("HEDGE_SOURCES", "semantic_scholar,openalex").split(",") if s.strip()}
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", 95))
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", 20))
+HEDGE_DEFAULT_DELAY_MS = int(os.environ.get("HEDGE_DEFAULT_DELAY_MS", 1500))
+HEDGE_MIN_DELAY_MS = int(os.environ.get("HEDGE_MIN_DELAY_MS", 100))
+
+_stats = defaultdict(lambda: {
+    "calls": 0, "hedges_sent": 0, "hedges_won": 0, "hedges_cancelled": 0, "abandoned": 0, "failed_over": 0, "failures": 0,
+})
+
+
+def hedge_delay(source: str) -> Optional[float]:
+    """Seconds to wait before hedging, or None if this source shouldn't be hedged now."""
+    if source not in HEDGE_SOURCES:
+        return None
+    if get_scheduler(source).queued:
+        # A duplicate would only queue behind the rate limiter too
+        return None
+    if upstream_latency.count(source) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY_MS / 1000
+    p = upstream_latency.percentile(source, HEDGE_PERCENTILE)
+    return max(HEDGE_MIN_DELAY_MS / 1000, p)
+
+
+async def _run_as_hedge(factory: Callable[[], Awaitable[Any]]) -> Any:
+    # Runs in its own task, so the context var change stays local to the hedge
+    flight_attempt.set(1)
+    return await factory()
+
+
+async def call_with_hedge(source: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, Dict[str, Any]]:
+    """Run factory(), hedging after the adaptive delay. Returns (result, timing); raises if every attempt failed."""
+    stats = _stats[source]
+    stats["calls"] += 1
+    started = time.perf_counter()
+    primary = asyncio.ensure_future(factory())
+    tasks = [primary]
+    try:
+        delay = hedge_delay(source)
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                stats["hedges_sent"] += 1
+                tasks.append(asyncio.ensure_future(_run_as_hedge(factory)))
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        if pending and all(task.exception() is not None for task in done):
+            # The first attempt to finish failed; the other one may still succeed
+            stats["failed_over"] += 1
+            done, _ = await asyncio.wait(pending)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                # Only the hedge's own request stops; the original's keeps using upstream capacity
+                stats["abandoned" if task is primary else "hedges_cancelled"] += 1
+
+    # Primary first, and a successful attempt over a failed one
+    finished = sorted(done, key=lambda task: (task.exception() is not None, task is not primary))
+    winner = finished[0]
+    if winner.exception() is not None:
+        stats["failures"] += 1
+    hedge_won = winner is not primary and winner.exception() is None
+    if hedge_won:
+        stats["hedges_won"] += 1
+    timing = {
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "hedged": len(tasks) > 1,
+        "hedge_won": hedge_won,
+    }
+    return winner.result(), timing
+
+
+def hedging_stats() -> Dict[str, Any]:
+    out = {}
+    for source in set(_stats) | HEDGE_SOURCES:
+        p = upstream_latency.percentile(source, HEDGE_PERCENTILE)
+        out[source] = {
+            **_stats[source],
+            "hedging_enabled": source in HEDGE_SOURCES,
+            f"p{int(HEDGE_PERCENTILE)}_ms": round(p * 1000, 1) if p is not None else None,
+            "samples": upstream_latency.count(source),
+        }
+    return out
@@ -0,0 +1,96 @@
+"""
+Upstream HTTP Client Registry
+Keeps one pooled httpx.AsyncClient per upstream source (arXiv, Semantic Scholar,
+OpenAlex) so searches reuse keep-alive connections instead of paying for TCP
+and TLS setup on every call. Clients are created lazily and closed in the
+server lifespan.
+"""
+import os
+import logging
+import importlib.util
+from typing import Dict
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_HTTP2 = os.environ.get("UPSTREAM_HTTP2", "false").lower() in ("1", "true", "yes")
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.environ.get("UPSTREAM_KEEPALIVE_EXPIRY", 30.0))
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", 5.0))
+
+# Per-source settings. Each source talks to a single host, so the pool limits
+# below are effectively per-host connection limits.
+UPSTREAM_SOURCES = {
+    "arxiv": {
+        "timeout": float(os.environ.get("ARXIV_TIMEOUT", 30.0)),
+        "max_connections": int(os.environ.get("ARXIV_MAX_CONNECTIONS", 4)),
+        "max_keepalive": 4,
+        "follow_redirects": True,
+    },
+    "semantic_scholar": {
+        "timeout": float(os.environ.get("SEMANTIC_SCHOLAR_TIMEOUT", 15.0)),
+        "max_connections": int(os.environ.get("SEMANTIC_SCHOLAR_MAX_CONNECTIONS", 10)),
+        "max_keepalive": 10,
+        "follow_redirects": False,
+    },
+    "openalex": {
+        "timeout": float(os.environ.get("OPENALEX_TIMEOUT", 15.0)),
+        "max_connections": int(os.environ.get("OPENALEX_MAX_CONNECTIONS", 20)),
+        "max_keepalive": 20,
+        "follow_redirects": False,
+    },
+}
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class UpstreamClients:
+    """Process-wide registry of shared upstream clients, one per source."""
+    _clients: Dict[str, httpx.AsyncClient] = {}
+
+    @classmethod
+    def _build(cls, source: str) -> httpx.AsyncClient:
+        config = UPSTREAM_SOURCES[source]
+        http2 = UPSTREAM_HTTP2
+        if http2 and not _http2_available():
+            logger.warning("UPSTREAM_HTTP2 is set but the 'h2' package is not installed - using HTTP/1.1")
+            http2 = False
+
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(config["timeout"], connect=UPSTREAM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=config["max_connections"],
+                max_keepalive_connections=config["max_keepalive"],
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+            ),
+            follow_redirects=config["follow_redirects"],
+            http2=http2,
+            headers={"User-Agent": "Re-Search/1.0 (research-search@example.com)"},
+        )
+
+    @classmethod
+    def get(cls, source: str) -> httpx.AsyncClient:
+        client = cls._clients.get(source)
+        if client is None or client.is_closed:
+            client = cls._build(source)
+            cls._clients[source] = client
+        return client
+
+    @classmethod
+    def start(cls):
+        for source in UPSTREAM_SOURCES:
+            cls.get(source)
+        logger.info(f"Upstream HTTP clients ready: {', '.join(UPSTREAM_SOURCES)}")
+
+    @classmethod
+    async def close(cls):
+        clients, cls._clients = cls._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+def get_client(source: str) -> httpx.AsyncClient:
+    """Return the shared client for an upstream source."""
+    return UpstreamClients.get(source)
@@ -0,0 +1,307 @@
+"""
+Background Job Queue
+Persistent queue for slow work (LLM summaries and comparisons) kept in the main
+database. Endpoints enqueue a job and answer 202 with its ID straight away; a
+pool of local workers claims queued jobs, stores their results and retries
+failures with exponential backoff. A running job holds a lease, so jobs left
+behind by a crashed process are claimed again once the lease runs out.
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+
+from db.postgres import SessionLocal
+from models.user_models import Job
+
+logger = logging.getLogger(__name__)
+
+# Workers in this process; 0 leaves jobs to other processes
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 2))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+# Delay before the first retry; doubled for each further attempt
+JOB_RETRY_BACKOFF = float(os.environ.get("JOB_RETRY_BACKOFF", 5))
+JOB_TIMEOUT = float(os.environ.get("JOB_TIMEOUT", 300))
+# Finished jobs (and their results) are deleted after this many seconds
+JOB_RESULT_TTL = int(os.environ.get("JOB_RESULT_TTL", 7 * 86400))
+JOB_CLEANUP_INTERVAL = int(os.environ.get("JOB_CLEANUP_INTERVAL", 3600))
+# Lease beyond the job timeout, so a live worker always gives up before its lease expires
+LEASE_MARGIN = 60
+CLAIM_BATCH = 5
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+JobHandler = Callable[[Dict[str, Any], Optional[int]], Awaitable[Any]]
+_handlers: Dict[str, JobHandler] = {}
+_stats = {"enqueued": 0, "deduplicated": 0, "succeeded": 0, "failed": 0, "retried": 0, "run_ms": 0.0}
+
+
+def register_job(kind: str, handler: JobHandler):
+    """handler(payload, user_id) runs the job and returns its JSON-serializable result."""
+    _handlers[kind] = handler
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def job_view(job: Job) -> Dict[str, Any]:
+    return {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "result": json.loads(job.result) if job.result is not None else None,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "status_url": f"/api/jobs/{job.job_id}",
+    }
+
+
+def _insert(kind: str, body: str, digest: str, user_id: Optional[int], max_attempts: Optional[int]) -> Dict[str, Any]:
+    """View of the new job, or of the user's identical pending job (then nothing is inserted)."""
+    db = SessionLocal()
+    try:
+        # The unique index on pending jobs settles races: the request that loses rereads the winner's job
+        for _ in range(3):
+            existing = (
+                db.query(Job)
+                .filter(Job.user_id == user_id, Job.payload_hash == digest, Job.status.in_(("queued", "running")))
+                .order_by(Job.id.desc())
+                .first()
+            )
+            if existing is not None:
+                _stats["deduplicated"] += 1
+                return job_view(existing)
+            job = Job(
+                job_id=uuid.uuid4().hex, user_id=user_id, kind=kind, status="queued", payload=body, payload_hash=digest,
+                attempts=0, max_attempts=max_attempts or JOB_MAX_ATTEMPTS, run_after=_utcnow(),
+            )
+            db.add(job)
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                continue
+            db.refresh(job)
+            _stats["enqueued"] += 1
+            return job_view(job)
+        raise RuntimeError("Could not enqueue job: an identical job keeps changing state")
+    finally:
+        db.close()
+
+
+async def enqueue(kind: str, payload: Dict[str, Any], user_id: Optional[int] = None, max_attempts: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Queue a job and return its view. If the user already has the same job queued
+    or running, that job is returned instead, so a retried request does not
+    start the work twice. Finished jobs are never reused: asking again runs the
+    job again (a summary job then answers from the summary cache).
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(f"{kind}\x1f{body}".encode("utf-8")).hexdigest()
+    job = await asyncio.to_thread(_insert, kind, body, digest, user_id, max_attempts)
+    if job["status"] == "queued":
+        job_workers.wake()
+    return job
+
+
+def accepted_response(job: Dict[str, Any]) -> JSONResponse:
+    """202 Accepted with the job handle, for endpoints that can run in the background."""
+    return JSONResponse(status_code=202, content=jsonable_encoder(job), headers={"Location": job["status_url"]})
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(Job.status == "queued", Job.run_after <= now),
+        and_(Job.status == "running", Job.lease_until < now),
+    )
+
+
+def _claim(worker: str) -> Optional[Dict[str, Any]]:
+    """Take the next due job; the conditional UPDATE makes sure only one worker gets it."""
+    now = _utcnow()
+    db = SessionLocal()
+    try:
+        candidates = db.query(Job.id).filter(_claimable(now)).order_by(Job.run_after, Job.id).limit(CLAIM_BATCH).all()
+        for (row_id,) in candidates:
+            claimed = db.query(Job).filter(Job.id == row_id, _claimable(now)).update({
+                Job.status: "running",
+                Job.attempts: Job.attempts + 1,
+                Job.lease_until: now + timedelta(seconds=JOB_TIMEOUT + LEASE_MARGIN),
+                Job.worker: worker,
+                Job.started_at: now,
+            }, synchronize_session=False)
+            db.commit()
+            if claimed:
+                job = db.query(Job).filter(Job.id == row_id).one()
+                return {
+                    "id": job.id, "job_id": job.job_id, "kind": job.kind, "payload": json.loads(job.payload),
+                    "user_id": job.user_id, "attempts": job.attempts, "max_attempts": job.max_attempts,
+                }
+        return None
+    finally:
+        db.close()
+
+
+def _finish(row_id: int, worker: str, values: Dict[str, Any]):
+    """Update a job this worker still holds; a no-op if its lease expired and someone else took it."""
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id == row_id, Job.status == "running", Job.worker == worker).update(
+            {getattr(Job, k): v for k, v in values.items()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+class JobWorkers:
+    def __init__(self):
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._running = 0
+
+    def start(self, count: int = JOB_WORKERS):
+        if self._tasks or count <= 0:
+            return
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._loop(f"{self.name}:{i}")) for i in range(count)]
+        logger.info(f"Started {count} job workers")
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _loop(self, worker: str):
+        while True:
+            self._wake.clear()
+            try:
+                job = await asyncio.to_thread(_claim, worker)
+            except Exception as e:
+                logger.error(f"Job claim failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(worker, job)
+
+    async def _run(self, worker: str, job: Dict[str, Any]):
+        handler = _handlers.get(job["kind"])
+        if handler is None:
+            await asyncio.to_thread(_finish, job["id"], worker, {"status": "failed", "error": f"Unknown job kind: {job['kind']}", "finished_at": _utcnow()})
+            _stats["failed"] += 1
+            return
+        if job["attempts"] > job["max_attempts"]:
+            # Claimed again after its worker disappeared, with no attempts left
+            await asyncio.to_thread(_finish, job["id"], worker, {"status": "failed", "error": "Worker lost on the last attempt", "finished_at": _utcnow()})
+            _stats["failed"] += 1
+            return
+
+        self._running += 1
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(handler(job["payload"], job["user_id"]), JOB_TIMEOUT)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back without using up an attempt
+            await asyncio.to_thread(_finish, job["id"], worker, {"status": "queued", "attempts": job["attempts"] - 1, "lease_until": None, "worker": None})
+            raise
+        except Exception as e:
+            error = f"Timed out after {JOB_TIMEOUT:.0f}s" if isinstance(e, asyncio.TimeoutError) else (str(e) or type(e).__name__)
+            if job["attempts"] < job["max_attempts"]:
+                retry_at = _utcnow() + timedelta(seconds=JOB_RETRY_BACKOFF * 2 ** (job["attempts"] - 1))
+                logger.warning(f"Job {job['job_id']} ({job['kind']}) attempt {job['attempts']} failed, retrying: {error}")
+                await asyncio.to_thread(_finish, job["id"], worker, {"status": "queued", "error": error, "run_after": retry_at, "lease_until": None})
+                _stats["retried"] += 1
+            else:
+                logger.error(f"Job {job['job_id']} ({job['kind']}) failed: {error}")
+                await asyncio.to_thread(_finish, job["id"], worker, {"status": "failed", "error": error, "lease_until": None, "finished_at": _utcnow()})
+                _stats["failed"] += 1
+        else:
+            await asyncio.to_thread(_finish, job["id"], worker, {
+                "status": "succeeded", "result": json.dumps(jsonable_encoder(result)), "error": None,
+                "lease_until": None, "finished_at": _utcnow(),
+            })
+            _stats["succeeded"] += 1
+        finally:
+            self._running -= 1
+            _stats["run_ms"] += (time.perf_counter() - started) * 1000
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": len(self._tasks), "running": self._running}
+
+
+job_workers = JobWorkers()
+
+
+def cancel_job(job: Job) -> bool:
+    """Cancel a queued job; running and finished jobs are left alone."""
+    db = SessionLocal()
+    try:
+        cancelled = db.query(Job).filter(Job.id == job.id, Job.status == "queued").update(
+            {Job.status: "cancelled", Job.finished_at: _utcnow()}, synchronize_session=False
+        )
+        db.commit()
+        return bool(cancelled)
+    finally:
+        db.close()
+
+
+def _purge_finished() -> int:
+    cutoff = _utcnow() - timedelta(seconds=JOB_RESULT_TTL)
+    db = SessionLocal()
+    try:
+        deleted = db.query(Job).filter(Job.status.in_(FINISHED), Job.finished_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+async def purge_finished_jobs():
+    """Periodic job: delete finished jobs older than JOB_RESULT_TTL."""
+    deleted = await asyncio.to_thread(_purge_finished)
+    if deleted:
+        logger.info(f"Deleted {deleted} finished jobs")
+
+
+def job_stats() -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        counts = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+    finally:
+        db.close()
+    finished = _stats["succeeded"] + _stats["failed"]
+    return {
+        **job_workers.stats(),
+        "by_status": counts,
+        **{k: v for k, v in _stats.items() if k != "run_ms"},
+        "avg_run_ms": round(_stats["run_ms"] / (finished + _stats["retried"]), 1) if finished + _stats["retried"] else None,
+    }
@@ -0,0 +1,298 @@
+"""
+LLM Client
+Shared entry point for every LLM call. Calls take a slot from a global pool and
+from a small per-user pool, and each call has a deadline that covers both the
+wait for a slot and the provider's answer. A circuit breaker watches the recent
+error rate and rejects calls outright while the provider is failing, so callers
+can fall back at once instead of queueing behind requests that will time out.
+"""
+import os
+import time
+import asyncio
+import logging
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+
+from dotenv import load_dotenv
+from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+try:
+    import litellm
+except ImportError:  # streaming falls back to whole responses
+    litellm = None
+
+env_path = Path(__file__).parent.parent / ".env"
+load_dotenv(env_path)
+
+logger = logging.getLogger(__name__)
+
+API_KEY = os.environ.get("EMERGENT_LLM_KEY") or os.environ.get("GEMINI_API_KEY")
+# Token streaming talks to Gemini directly, so it needs a Gemini key rather than the Emergent one
+STREAM_API_KEY = os.environ.get("GEMINI_API_KEY")
+
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+LLM_MAX_PER_USER = int(os.environ.get("LLM_MAX_PER_USER", 4))
+# Seconds per call, including the wait for a free slot
+LLM_CALL_TIMEOUT = float(os.environ.get("LLM_CALL_TIMEOUT", 30))
+# Open the breaker when at least this share of the calls in the window failed...
+LLM_BREAKER_ERROR_RATE = float(os.environ.get("LLM_BREAKER_ERROR_RATE", 0.5))
+# ...and the window holds at least this many calls
+LLM_BREAKER_MIN_CALLS = int(os.environ.get("LLM_BREAKER_MIN_CALLS", 10))
+LLM_BREAKER_WINDOW = float(os.environ.get("LLM_BREAKER_WINDOW", 60))
+# Seconds the breaker stays open before letting one probe call through
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", 30))
+
+
+class LLMUnavailable(Exception):
+    pass
+
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+
+class LLMTimeout(LLMUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through and outcomes are counted over a sliding window.
+    Open: calls are rejected until the cooldown passes. Half-open: a single
+    probe call decides whether to close again or reopen.
+    """
+
+    def __init__(self, error_rate: float, min_calls: int, window: float, cooldown: float):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened = 0
+        self._outcomes: deque = deque()
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self.state = "half_open"
+            self._probing = False
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record(self, ok: Optional[bool]):
+        """Outcome of an allowed call; None when it ended without saying anything about the provider."""
+        now = time.monotonic()
+        if self.state == "half_open":
+            self._probing = False
+            if ok:
+                self.state = "closed"
+                self._outcomes.clear()
+                logger.info("LLM circuit closed")
+            elif ok is False:
+                self._open(now)
+            return
+        if ok is None:
+            return
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+        failures = sum(1 for _, success in self._outcomes if not success)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+            self._open(now)
+
+    def _open(self, now: float):
+        logger.warning(f"LLM circuit opened for {self.cooldown:.0f}s")
+        self.state = "open"
+        self.opened += 1
+        self._opened_at = now
+        self._outcomes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        failures = sum(1 for _, success in self._outcomes if not success)
+        return {
+            "state": self.state,
+            "opened": self.opened,
+            "window_calls": len(self._outcomes),
+            "window_failures": failures,
+        }
+
+
+class LLMClient:
+    def __init__(self, max_concurrency: int, max_per_user: int, timeout: float, breaker: CircuitBreaker):
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self.timeout = timeout
+        self.breaker = breaker
+        self._global: Optional[asyncio.Semaphore] = None
+        # owner -> [semaphore, callers holding or waiting for it]
+        self._users: Dict[Any, list] = {}
+        self._sessions = itertools.count(1)
+        self._queued = 0
+        self._in_flight = 0
+        self._stats = {"calls": 0, "completed": 0, "failures": 0, "timeouts": 0, "rejected": 0, "queue_ms": 0.0}
+
+    def _global_slots(self) -> asyncio.Semaphore:
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.max_concurrency)
+        return self._global
+
+    async def _acquire(self, user: Optional[asyncio.Semaphore]):
+        if user is not None:
+            await user.acquire()
+        try:
+            await self._global_slots().acquire()
+        except BaseException:
+            if user is not None:
+                user.release()
+            raise
+
+    @asynccontextmanager
+    async def _slot(self, owner: Any, deadline: float):
+        """Hold a global (and, given an owner, per-user) slot; raises CircuitOpen or LLMTimeout."""
+        self._stats["calls"] += 1
+        if not self.breaker.allow():
+            self._stats["rejected"] += 1
+            raise CircuitOpen("LLM provider is failing; circuit open")
+        user = None
+        if owner is not None:
+            entry = self._users.setdefault(owner, [asyncio.Semaphore(self.max_per_user), 0])
+            entry[1] += 1
+            user = entry[0]
+        queued_at = time.monotonic()
+        self._queued += 1
+        try:
+            try:
+                await asyncio.wait_for(self._acquire(user), deadline - queued_at)
+            except asyncio.TimeoutError:
+                self._stats["timeouts"] += 1
+                self.breaker.record(None)
+                raise LLMTimeout("Timed out waiting for a free LLM slot")
+            except BaseException:
+                self.breaker.record(None)
+                raise
+            finally:
+                self._queued -= 1
+            self._stats["queue_ms"] += (time.monotonic() - queued_at) * 1000
+            self._in_flight += 1
+            try:
+                yield
+            finally:
+                self._in_flight -= 1
+                self._global_slots().release()
+                if user is not None:
+                    user.release()
+        finally:
+            if owner is not None:
+                self._users[owner][1] -= 1
+                if not self._users[owner][1]:
+                    del self._users[owner]
+
+    def _finished(self, ok: Optional[bool], timed_out: bool = False):
+        self.breaker.record(ok)
+        if ok:
+            self._stats["completed"] += 1
+        elif ok is False:
+            self._stats["timeouts" if timed_out else "failures"] += 1
+
+    async def _send(self, prompt: str, system_message: str, model: str) -> str:
+        # A fresh LlmChat per call on purpose: LlmChat is a conversation, and keeps every message
+        # sent and received under its session to replay as context on the next send_message. A
+        # shared instance would make each summary prompt carry all the earlier ones. It is a plain
+        # object that opens no connection itself, so building one costs next to nothing beside
+        # the call.
+        provider, name = model.split("/", 1)
+        chat = LlmChat(api_key=API_KEY, session_id=f"llm-{next(self._sessions)}", system_message=system_message)
+        chat.with_model(provider, name)
+        return await chat.send_message(UserMessage(text=prompt))
+
+    async def _send_stream(self, prompt: str, system_message: str, model: str) -> AsyncIterator[str]:
+        if litellm is None or not STREAM_API_KEY:
+            yield await self._send(prompt, system_message, model)
+            return
+        response = await litellm.acompletion(
+            model=model,
+            api_key=STREAM_API_KEY,
+            messages=[{"role": "system", "content": system_message}, {"role": "user", "content": prompt}],
+            stream=True,
+        )
+        async for chunk in response:
+            text = chunk.choices[0].delta.content
+            if text:
+                yield text
+
+    async def complete(self, prompt: str, system_message: str, model: str, owner: Any = None, timeout: Optional[float] = None) -> str:
+        """Whole response for prompt; model is "provider/name"."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        async with self._slot(owner, deadline):
+            ok = None
+            try:
+                text = await asyncio.wait_for(self._send(prompt, system_message, model), deadline - time.monotonic())
+                ok = True
+            except asyncio.TimeoutError:
+                ok = False
+                self._finished(ok, timed_out=True)
+                raise LLMTimeout(f"LLM call exceeded {timeout or self.timeout:.0f}s")
+            except Exception:
+                ok = False
+                self._finished(ok)
+                raise
+            finally:
+                if ok is not False:
+                    self._finished(ok)
+        return text
+
+    async def stream(self, prompt: str, system_message: str, model: str, owner: Any = None, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Response chunks as the provider sends them, under the same slots and deadline as complete()."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        async with self._slot(owner, deadline):
+            chunks = self._send_stream(prompt, system_message, model)
+            ok = None
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), deadline - time.monotonic())
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+                ok = True
+            except asyncio.TimeoutError:
+                ok = False
+                self._finished(ok, timed_out=True)
+                raise LLMTimeout(f"LLM stream exceeded {timeout or self.timeout:.0f}s")
+            except Exception:
+                ok = False
+                self._finished(ok)
+                raise
+            finally:
+                if ok is not False:
+                    self._finished(ok)
+                await chunks.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        started = self._stats["calls"] - self._stats["rejected"]
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_per_user": self.max_per_user,
+            "in_flight": self._in_flight,
+            "queued": self._queued,
+            "active_users": len(self._users),
+            **{k: v for k, v in self._stats.items() if k != "queue_ms"},
+            "avg_queue_ms": round(self._stats["queue_ms"] / started, 1) if started else None,
+            "breaker": self.breaker.stats(),
+        }
+
+
+llm_client = LLMClient(
+    LLM_MAX_CONCURRENCY, LLM_MAX_PER_USER, LLM_CALL_TIMEOUT,
+    CircuitBreaker(LLM_BREAKER_ERROR_RATE, LLM_BREAKER_MIN_CALLS, LLM_BREAKER_WINDOW, LLM_BREAKER_COOLDOWN),
+)
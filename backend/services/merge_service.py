@@ -0,0 +1,177 @@
+"""
+Cross-source Merge Service
+Collapses the same paper returned by arXiv, Semantic Scholar and OpenAlex into one
+record. Records are clustered on DOI, arXiv ID and near-identical normalized titles
+(MinHash + LSH banding, so no pairwise comparison of every record), then each
+cluster is folded into a canonical record that keeps every source link.
+"""
+import re
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from services.arxiv_service import split_version
+
+TITLE_SIMILARITY = 0.8
+MINHASH_BANDS = 6
+MINHASH_ROWS = 2
+# Titles this short only merge on an exact normalized match
+MIN_FUZZY_TOKENS = 4
+
+_HASH_MASK = (1 << 48) - 1
+_PERMUTATIONS = [
+    (1 + 2 * zlib.crc32(f"a{i}".encode()), zlib.crc32(f"b{i}".encode()))
+    for i in range(MINHASH_BANDS * MINHASH_ROWS)
+]
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_ARXIV_DOI = re.compile(r"^10\.48550/arxiv\.(.+)$")
+_SOURCE_ORDER = {"arxiv": 0, "semantic_scholar": 1, "openalex": 2}
+
+
+def normalize_doi(doi: Optional[str]) -> Optional[str]:
+    if not doi:
+        return None
+    doi = doi.strip().lower()
+    for prefix in ("https://doi.org/", "http://doi.org/", "http://dx.doi.org/", "doi:"):
+        if doi.startswith(prefix):
+            doi = doi[len(prefix):]
+    return doi or None
+
+
+def title_tokens(title: Optional[str]) -> List[str]:
+    return _NON_WORD.sub(" ", (title or "").lower()).split()
+
+
+def _arxiv_id(paper: Dict[str, Any], doi: Optional[str]) -> Optional[str]:
+    raw = paper.get("source_id") if paper.get("source") == "arxiv" else paper.get("arxiv_id")
+    if not raw and doi:
+        match = _ARXIV_DOI.match(doi)
+        raw = match.group(1) if match else None
+    return split_version(raw.lower())[0] if raw else None
+
+
+def _minhash_bands(tokens: List[str]) -> List[tuple]:
+    hashes = [zlib.crc32(t.encode()) for t in set(tokens)]
+    signature = [min([(a * h + b) & _HASH_MASK for h in hashes]) for a, b in _PERMUTATIONS]
+    return [
+        (band, tuple(signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]))
+        for band in range(MINHASH_BANDS)
+    ]
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            # Keep the earliest record as root so clusters stay in result order
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+
+def _titles_match(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    if a["doi"] and b["doi"] and a["doi"] != b["doi"] and not (a["arxiv_doi"] or b["arxiv_doi"]):
+        # Two different publisher DOIs are different works even with the same title
+        return False
+    ya, yb = a["year"], b["year"]
+    if ya and yb and abs(ya - yb) > 1:
+        return False
+    if a["title"] == b["title"]:
+        return True
+    if len(a["tokens"]) < MIN_FUZZY_TOKENS or len(b["tokens"]) < MIN_FUZZY_TOKENS:
+        return False
+    inter = len(a["tokens"] & b["tokens"])
+    return inter / (len(a["tokens"]) + len(b["tokens"]) - inter) >= TITLE_SIMILARITY
+
+
+def cluster_papers(papers: List[Dict[str, Any]]) -> List[List[int]]:
+    """Group indexes of records describing the same work; clusters are in first-seen order."""
+    keys = []
+    for p in papers:
+        doi = normalize_doi(p.get("doi"))
+        tokens = title_tokens(p.get("title"))
+        keys.append({
+            "doi": doi,
+            "arxiv_doi": bool(doi and _ARXIV_DOI.match(doi)),
+            "arxiv": _arxiv_id(p, doi),
+            "title": " ".join(tokens),
+            "tokens": set(tokens),
+            "year": p.get("year"),
+        })
+
+    uf = _UnionFind(len(papers))
+    by_doi: Dict[str, int] = {}
+    by_arxiv: Dict[str, int] = {}
+    buckets = defaultdict(list)
+
+    for i, k in enumerate(keys):
+        if k["doi"]:
+            uf.union(i, by_doi.setdefault(k["doi"], i))
+        if k["arxiv"]:
+            uf.union(i, by_arxiv.setdefault(k["arxiv"], i))
+        if not k["tokens"]:
+            continue
+        candidates = set()
+        for band in _minhash_bands(list(k["tokens"])):
+            candidates.update(buckets[band])
+            buckets[band].append(i)
+        for j in candidates:
+            if uf.find(i) != uf.find(j) and _titles_match(k, keys[j]):
+                uf.union(i, j)
+
+    clusters = defaultdict(list)
+    for i in range(len(papers)):
+        clusters[uf.find(i)].append(i)
+    return [clusters[root] for root in sorted(clusters)]
+
+
+def _source_link(p: Dict[str, Any]) -> Dict[str, Any]:
+    return {"source": p.get("source"), "source_id": p.get("source_id"), "url": p.get("url"), "pdf_url": p.get("pdf_url")}
+
+
+def merge_cluster(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fold one cluster into a canonical record; arXiv's record is the base when present."""
+    if len(records) == 1:
+        return {**records[0], "sources": [_source_link(records[0])]}
+    records = sorted(records, key=lambda r: _SOURCE_ORDER.get(r.get("source"), len(_SOURCE_ORDER)))
+    merged = dict(records[0])
+    merged["abstract"] = max((r.get("abstract") or "" for r in records), key=len)
+    merged["authors"] = max((r.get("authors") or [] for r in records), key=len)
+    merged["citation_count"] = max(r.get("citation_count") or 0 for r in records)
+    for field in ("year", "url", "pdf_url", "doi", "journal"):
+        if not merged.get(field):
+            merged[field] = next((r[field] for r in records if r.get(field)), merged.get(field))
+    merged["fields_of_study"] = list(dict.fromkeys(f for r in records for f in (r.get("fields_of_study") or [])))
+    merged["sources"] = [_source_link(r) for r in records]
+    return merged
+
+
+def dedup_keys(paper: Dict[str, Any]) -> List[str]:
+    """
+    Exact identity keys of a unified or merged record: DOI, arXiv ID, every source ID
+    and, for titles long enough to be distinctive, the normalized title.
+    """
+    doi = normalize_doi(paper.get("doi"))
+    keys = [f"doi:{doi}"] if doi else []
+    arxiv_id = _arxiv_id(paper, doi)
+    if arxiv_id:
+        keys.append(f"arxiv:{arxiv_id}")
+    for link in paper.get("sources") or [paper]:
+        if link.get("source") and link.get("source_id"):
+            keys.append(f"{link['source']}:{link['source_id']}")
+    tokens = title_tokens(paper.get("title"))
+    if len(tokens) >= MIN_FUZZY_TOKENS:
+        keys.append("title:" + " ".join(tokens))
+    return keys
+
+
+def merge_papers(papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Deduplicate unified paper dicts across sources, preserving result order."""
+    return [merge_cluster([papers[i] for i in cluster]) for cluster in cluster_papers(papers)]
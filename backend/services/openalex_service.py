@@ -3,13 +3,82 @@ OpenAlex API Service
 Free open-access academic data API.
 Docs: https://docs.openalex.org/
 """
-import httpx
+import os
+import json
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+from services.rate_limiter import rate_limited_get
+from services.response_cache import upstream_cache
+from services.paper_store import paper_store
+
+try:
+    import orjson  # optional, faster JSON decoding
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
 OA_API = "https://api.openalex.org"
+OA_MAILTO = "research-search@example.com"
+TRENDS_TTL = int(os.environ.get("TRENDS_TTL", 24 * 3600))
+
+# Only the fields _parse_work reads; full work objects are several times larger
+WORK_FIELDS = ",".join([
+    "id", "doi", "display_name", "title", "publication_year", "cited_by_count",
+    "authorships", "abstract_inverted_index", "open_access", "primary_location", "concepts",
+])
+
+
+def loads(content: bytes) -> Any:
+    return orjson.loads(content) if orjson is not None else json.loads(content)
+
+
+def rebuild_abstract(inverted_index: Optional[Dict[str, List[int]]]) -> str:
+    """
+    Rebuild abstract text from OpenAlex's word -> positions index by writing
+    each word straight into its slot of a preallocated list (no sort).
+    """
+    if not inverted_index:
+        return ""
+    words: List[Optional[str]] = [None] * sum(map(len, inverted_index.values()))
+    size = len(words)
+    for word, positions in inverted_index.items():
+        for pos in positions:
+            if pos >= size:
+                # Positions can have gaps; grow to fit
+                words.extend([None] * (pos + 1 - size))
+                size = len(words)
+            words[pos] = word
+    return " ".join(w for w in words if w is not None)
+
+
+def _parse_work(w: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize one OpenAlex work into the unified paper shape."""
+    authors = []
+    for a in (w.get("authorships") or [])[:10]:
+        name = (a.get("author") or {}).get("display_name", "")
+        if name:
+            authors.append(name)
+
+    pdf_url = None
+    oa_info = w.get("open_access") or {}
+    if oa_info.get("oa_url"):
+        pdf_url = oa_info["oa_url"]
+
+    return {
+        "source": "openalex",
+        "source_id": (w.get("id") or "").replace("https://openalex.org/", ""),
+        "title": w.get("display_name") or w.get("title") or "",
+        "abstract": rebuild_abstract(w.get("abstract_inverted_index"))[:2000],
+        "authors": authors,
+        "year": w.get("publication_year"),
+        "citation_count": w.get("cited_by_count", 0),
+        "url": w.get("id", ""),
+        "pdf_url": pdf_url,
+        "doi": (w.get("doi") or "").replace("https://doi.org/", "") if w.get("doi") else None,
+        "journal": ((w.get("primary_location") or {}).get("source") or {}).get("display_name"),
+        "fields_of_study": [c.get("display_name", "") for c in (w.get("concepts") or [])[:5]],
+    }
 
 
 async def search_openalex(
@@ -19,14 +88,21 @@ async def search_openalex(
     from_year: Optional[int] = None,
     to_year: Optional[int] = None,
     sort: str = "relevance_score:desc",
+    raise_errors: bool = False,
 ) -> Dict[str, Any]:
-    """Search OpenAlex works."""
+    """Search OpenAlex works. Errors give an empty result unless raise_errors is set."""
+    if sort == "relevance_score:desc":
+        local = await paper_store.search("openalex", query, limit, (page - 1) * limit, year_from=from_year, year_to=to_year)
+        if local is not None:
+            return {"total": local[0], "page": page, "papers": local[1]}
+
     params = {
         "search": query,
         "per_page": min(limit, 50),
         "page": page,
         "sort": sort,
-        "mailto": "research-search@example.com",
+        "mailto": OA_MAILTO,
+        "select": WORK_FIELDS,
     }
     filters = []
     if from_year:
@@ -36,51 +112,48 @@ async def search_openalex(
     if filters:
         params["filter"] = ",".join(filters)
 
+    async def fetch():
+        resp = await rate_limited_get("openalex", f"{OA_API}/works", params=params)
+        resp.raise_for_status()
+        data = loads(resp.content)
+
+        papers = [_parse_work(w) for w in data.get("results", [])]
+        await paper_store.add_many("openalex", papers)
+        total = data.get("meta", {}).get("count", 0)
+        await paper_store.add_total("openalex", query, total, year_from=from_year, year_to=to_year)
+        return {"total": total, "page": page, "papers": papers}
+
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(f"{OA_API}/works", params=params)
-            resp.raise_for_status()
-            data = resp.json()
-
-            papers = []
-            for w in data.get("results", []):
-                authors = []
-                for a in (w.get("authorships") or [])[:10]:
-                    name = (a.get("author") or {}).get("display_name", "")
-                    if name:
-                        authors.append(name)
-
-                abstract = ""
-                inv = w.get("abstract_inverted_index")
-                if inv:
-                    words = {}
-                    for word, positions in inv.items():
-                        for pos in positions:
-                            words[pos] = word
-                    abstract = " ".join(words[k] for k in sorted(words.keys()))
-
-                pdf_url = None
-                oa_info = w.get("open_access") or {}
-                if oa_info.get("oa_url"):
-                    pdf_url = oa_info["oa_url"]
-
-                papers.append({
-                    "source": "openalex",
-                    "source_id": (w.get("id") or "").replace("https://openalex.org/", ""),
-                    "title": w.get("display_name") or w.get("title") or "",
-                    "abstract": abstract[:2000],
-                    "authors": authors,
-                    "year": w.get("publication_year"),
-                    "citation_count": w.get("cited_by_count", 0),
-                    "url": w.get("id", ""),
-                    "pdf_url": pdf_url,
-                    "doi": (w.get("doi") or "").replace("https://doi.org/", "") if w.get("doi") else None,
-                    "journal": (w.get("primary_location") or {}).get("source", {}).get("display_name") if w.get("primary_location") else None,
-                    "fields_of_study": [c.get("display_name", "") for c in (w.get("concepts") or [])[:5]],
-                })
-
-            total = data.get("meta", {}).get("count", 0)
-            return {"total": total, "page": page, "papers": papers}
+        return await upstream_cache.get_or_fetch("openalex", "works", params, fetch)
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error(f"OpenAlex search error: {e}")
         return {"total": 0, "page": 1, "papers": []}
+
+
+async def get_publication_histogram(query: str, from_year: int, to_year: int) -> Dict[int, int]:
+    """
+    Works per publication year for a query, from a single grouped request
+    (group_by=publication_year) instead of one search per year. Cached daily.
+    """
+    params = {
+        "search": query,
+        "filter": f"publication_year:{from_year}-{to_year}",
+        "group_by": "publication_year",
+        "mailto": OA_MAILTO,
+    }
+
+    async def fetch():
+        resp = await rate_limited_get("openalex", f"{OA_API}/works", params=params)
+        resp.raise_for_status()
+        data = loads(resp.content)
+        # JSON object keys would turn into strings in the cache, so keep pairs
+        return [[int(g["key"]), g.get("count", 0)] for g in data.get("group_by", []) if str(g.get("key", "")).isdigit()]
+
+    try:
+        pairs = await upstream_cache.get_or_fetch("openalex", "works/group_by", params, fetch, ttl=TRENDS_TTL)
+        return {year: count for year, count in pairs}
+    except Exception as e:
+        logger.error(f"OpenAlex trends error: {e}")
+        return {}
@@ -0,0 +1,350 @@
+"""
+Local Paper Store
+Every paper the upstream services return is written into a SQLite database with
+an FTS5 full-text index over title, abstract and authors, along with the total
+each upstream search reported. Relevance searches are answered from it when it
+holds a full page of recent strong matches and a recent upstream total for the
+same query, and only go to the upstream APIs when it doesn't.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PAPER_STORE_PATH = os.environ.get("PAPER_STORE_PATH", "./paper_store.db")
+PAPER_STORE_LOCAL_SEARCH = os.environ.get("PAPER_STORE_LOCAL_SEARCH", "true").lower() in ("1", "true", "yes")
+# A hit counts as strong when its (negated) FTS5 bm25 score is at least this
+PAPER_STORE_MIN_SCORE = float(os.environ.get("PAPER_STORE_MIN_SCORE", 2.0))
+# Papers and upstream totals older than this many seconds are not used to answer searches
+PAPER_STORE_MAX_AGE = int(os.environ.get("PAPER_STORE_MAX_AGE", 7 * 86400))
+
+# bm25() column weights: title, abstract, authors
+FTS_WEIGHTS = (4.0, 1.0, 2.0)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+# Query syntax the local index can't interpret (arXiv field prefixes, boolean operators)
+_UPSTREAM_SYNTAX = re.compile(r":|\b(AND|OR|ANDNOT|NOT)\b|[\"()]")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS papers ("
+    " id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, source TEXT NOT NULL,"
+    " title TEXT NOT NULL, abstract TEXT, authors TEXT, categories TEXT,"
+    " year INTEGER, published TEXT, updated TEXT, doc TEXT NOT NULL, stored_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_papers_source_year ON papers(source, year)",
+    "CREATE INDEX IF NOT EXISTS idx_papers_stored_at ON papers(stored_at, id)",
+    "CREATE TABLE IF NOT EXISTS query_totals ("
+    " source TEXT NOT NULL, query TEXT NOT NULL, total INTEGER NOT NULL, stored_at REAL NOT NULL,"
+    " PRIMARY KEY (source, query))",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5("
+    " title, abstract, authors, content='papers', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN"
+    " INSERT INTO papers_fts(rowid, title, abstract, authors) VALUES (new.id, new.title, new.abstract, new.authors); END",
+    "CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN"
+    " INSERT INTO papers_fts(papers_fts, rowid, title, abstract, authors) VALUES ('delete', old.id, old.title, old.abstract, old.authors); END",
+    "CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN"
+    " INSERT INTO papers_fts(papers_fts, rowid, title, abstract, authors) VALUES ('delete', old.id, old.title, old.abstract, old.authors);"
+    " INSERT INTO papers_fts(rowid, title, abstract, authors) VALUES (new.id, new.title, new.abstract, new.authors); END",
+)
+
+_ORDER_COLUMNS = {"relevance": "score", "submittedDate": "published", "lastUpdatedDate": "updated", "year": "year"}
+
+
+def fts_query(text: str) -> Optional[str]:
+    """Plain text to an FTS5 query matching every word; None if it has no words."""
+    words = _WORD.findall(text)
+    if not words:
+        return None
+    return " ".join('"' + w.replace('"', '""') + '"' for w in words)
+
+
+def is_plain_query(text: str) -> bool:
+    return bool(text.strip()) and not _UPSTREAM_SYNTAX.search(text)
+
+
+def _total_key(text: str, filters: Dict[str, Any]) -> str:
+    """Query words plus filters, so "Graph  Neural" and "graph neural" share an upstream total."""
+    words = " ".join(w.lower() for w in _WORD.findall(text))
+    return json.dumps([words, sorted((k, v) for k, v in filters.items() if v)], separators=(",", ":"))
+
+
+def _row_for(source: str, doc: Dict[str, Any]) -> Optional[tuple]:
+    if source == "arxiv":
+        # Keyed on the base ID so a new version replaces the old one
+        source_id = re.sub(r"v\d+$", "", doc.get("arxiv_id") or "")
+        abstract = doc.get("summary") or ""
+        categories = " ".join(doc.get("categories") or [])
+    else:
+        source_id = doc.get("source_id") or ""
+        abstract = doc.get("abstract") or ""
+        categories = " ".join(doc.get("fields_of_study") or [])
+    if not source_id or not doc.get("title"):
+        return None
+    return (
+        f"{source}:{source_id}", source, doc["title"], abstract, ", ".join(doc.get("authors") or []),
+        f" {categories} ", doc.get("year"), doc.get("published"), doc.get("updated"),
+        json.dumps(doc, separators=(",", ":")), time.time(),
+    )
+
+
+class PaperStore:
+    def __init__(self, path: str = PAPER_STORE_PATH, min_score: float = PAPER_STORE_MIN_SCORE, max_age: int = PAPER_STORE_MAX_AGE):
+        self.path = path
+        self.min_score = min_score
+        self.max_age = max_age
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._disabled = False
+        self._latencies = deque(maxlen=500)
+        self._stats = defaultdict(lambda: {"local_hits": 0, "fallbacks": 0, "no_total": 0, "written": 0})
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and not self._disabled:
+            try:
+                conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"Paper store unavailable, searches will go upstream: {e}")
+                self._disabled = True
+        return self._conn
+
+    # --- Writes ---
+
+    def upsert_many(self, source: str, docs: List[Dict[str, Any]], raise_errors: bool = False) -> int:
+        """
+        Store the docs that have an ID and a title; returns how many were written.
+        A store that is unavailable or fails the write gives 0 unless raise_errors is set.
+        """
+        rows = [r for r in (_row_for(source, d) for d in docs) if r]
+        if not rows:
+            return 0
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                if raise_errors:
+                    raise RuntimeError("paper store unavailable")
+                return 0
+            try:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT INTO papers (key, source, title, abstract, authors, categories, year, published, updated, doc, stored_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET title=excluded.title, abstract=excluded.abstract,"
+                    " authors=excluded.authors, categories=excluded.categories, year=excluded.year,"
+                    " published=excluded.published, updated=excluded.updated, doc=excluded.doc, stored_at=excluded.stored_at",
+                    rows,
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                conn.execute("ROLLBACK")
+                if raise_errors:
+                    raise
+                logger.warning(f"Paper store write error: {e}")
+                return 0
+        self._stats[source]["written"] += len(rows)
+        return len(rows)
+
+    async def add_many(self, source: str, docs: List[Dict[str, Any]], raise_errors: bool = False) -> int:
+        """Write-through from the upstream services; never raises unless raise_errors is set."""
+        if not docs:
+            return 0
+        return await asyncio.to_thread(self.upsert_many, source, docs, raise_errors)
+
+    def set_total(self, source: str, text: str, total: int, **filters):
+        if not is_plain_query(text):
+            return
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT INTO query_totals (source, query, total, stored_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(source, query) DO UPDATE SET total=excluded.total, stored_at=excluded.stored_at",
+                    (source, _total_key(text, filters), total, time.time()),
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"Paper store write error: {e}")
+
+    async def add_total(self, source: str, text: str, total: int, **filters):
+        """Remember the total an upstream search reported, for local answers to the same query."""
+        await asyncio.to_thread(self.set_total, source, text, total, **filters)
+
+    # --- Reads ---
+
+    def query(
+        self,
+        source: str,
+        text: str,
+        limit: int,
+        offset: int = 0,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        category: Optional[str] = None,
+        sort: str = "relevance",
+        descending: bool = True,
+    ) -> Tuple[int, List[Tuple[Dict[str, Any], float]]]:
+        """(strong match count, [(doc, score)]) for one source, best first, from papers stored within max_age."""
+        match = fts_query(text)
+        if match is None:
+            return 0, []
+        where = ["papers_fts MATCH ?", "p.source = ?", "p.stored_at >= ?"]
+        args: List[Any] = [match, source, time.time() - self.max_age]
+        if year_from:
+            where.append("p.year >= ?")
+            args.append(year_from)
+        if year_to:
+            where.append("p.year <= ?")
+            args.append(year_to)
+        if category:
+            where.append("p.categories LIKE ?")
+            args.append(f"% {category} %")
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        # bm25() is negative with better matches lower; negate it so higher is better
+        strong = (
+            f"SELECT p.doc AS doc, -bm25(papers_fts, {weights}) AS score, p.published, p.updated, p.year"
+            f" FROM papers_fts CROSS JOIN papers p ON p.id = papers_fts.rowid"
+            f" WHERE {' AND '.join(where)} AND -bm25(papers_fts, {weights}) >= ?"
+        )
+        order = _ORDER_COLUMNS.get(sort, "score")
+        direction = "DESC" if descending or order == "score" else "ASC"
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return 0, []
+            try:
+                total = conn.execute(f"SELECT COUNT(*) FROM ({strong})", [*args, self.min_score]).fetchone()[0]
+                if total < offset + limit:
+                    return total, []
+                rows = conn.execute(
+                    f"SELECT doc, score FROM ({strong}) ORDER BY {order} {direction} LIMIT ? OFFSET ?",
+                    [*args, self.min_score, limit, offset],
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Paper store query error: {e}")
+                return 0, []
+        return total, [(json.loads(doc), score) for doc, score in rows]
+
+    def upstream_total(self, source: str, text: str, **filters) -> Optional[int]:
+        """Total the upstream search last reported for this query, if within max_age."""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(
+                    "SELECT total FROM query_totals WHERE source = ? AND query = ? AND stored_at >= ?",
+                    (source, _total_key(text, filters), time.time() - self.max_age),
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Paper store query error: {e}")
+                return None
+        return row[0] if row else None
+
+    def _local_page(self, source: str, text: str, limit: int, offset: int, filters: Dict[str, Any]):
+        total = self.upstream_total(source, text, **filters)
+        if total is None or total < offset + limit:
+            return total, []
+        return total, self.query(source, text, limit, offset, **filters)[1]
+
+    async def search(self, source: str, text: str, limit: int, offset: int = 0, **filters) -> Optional[Tuple[int, List[Dict[str, Any]]]]:
+        """
+        (upstream total, docs) for a relevance search when the local index can fill
+        the whole requested page with strong matches and knows the upstream total
+        for the query, or None to tell the caller to go upstream. Other sort orders
+        always go upstream: the store only holds the papers searches have returned,
+        so its newest papers are not the source's newest.
+        """
+        if not PAPER_STORE_LOCAL_SEARCH or self._disabled or not is_plain_query(text):
+            return None
+        started = time.perf_counter()
+        total, hits = await asyncio.to_thread(self._local_page, source, text, limit, offset, filters)
+        self._latencies.append(time.perf_counter() - started)
+        if total is None:
+            self._stats[source]["no_total"] += 1
+            return None
+        if len(hits) < limit:
+            self._stats[source]["fallbacks"] += 1
+            return None
+        self._stats[source]["local_hits"] += 1
+        return total, [doc for doc, _ in hits]
+
+    def docs_since(self, stored_at: float, row_id: int, limit: int) -> List[Tuple[str, Dict[str, Any], float, int]]:
+        """Papers written after the (stored_at, id) cursor, oldest first, as (source, doc, stored_at, id)."""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return []
+            try:
+                rows = conn.execute(
+                    "SELECT source, doc, stored_at, id FROM papers WHERE (stored_at, id) > (?, ?) ORDER BY stored_at, id LIMIT ?",
+                    (stored_at, row_id, limit),
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Paper store read error: {e}")
+                return []
+        return [(source, json.loads(doc), at, i) for source, doc, at, i in rows]
+
+    def fields_since(self, stored_at: float, row_id: int, limit: int) -> List[Tuple[str, str, str, float, int]]:
+        """Like docs_since but only (title, authors, categories, stored_at, id), without decoding documents."""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return []
+            try:
+                return conn.execute(
+                    "SELECT title, authors, categories, stored_at, id FROM papers"
+                    " WHERE (stored_at, id) > (?, ?) ORDER BY stored_at, id LIMIT ?",
+                    (stored_at, row_id, limit),
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Paper store read error: {e}")
+                return []
+
+    def stats(self) -> Dict[str, Any]:
+        papers = 0
+        with self._lock:
+            conn = self._connection()
+            if conn is not None:
+                try:
+                    papers = conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+        size = 0
+        for suffix in ("", "-wal"):
+            try:
+                size += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        latencies = sorted(self._latencies)
+        sources = {}
+        for source, s in self._stats.items():
+            lookups = s["local_hits"] + s["fallbacks"] + s["no_total"]
+            sources[source] = {**s, "local_hit_ratio": round(s["local_hits"] / lookups, 3) if lookups else None}
+        return {
+            "papers": papers,
+            "index_bytes": size,
+            "query_ms_avg": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            "query_ms_p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else None,
+            "sources": sources,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+paper_store = PaperStore()
@@ -0,0 +1,59 @@
+"""
+Periodic Background Tasks
+Minimal scheduler for recurring maintenance jobs (version checks, refreshes,
+harvesting). Jobs are started from the server lifespan and cancelled on shutdown.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_JOBS_ENABLED = os.environ.get("BACKGROUND_JOBS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class PeriodicTasks:
+    _tasks: Dict[str, asyncio.Task] = {}
+    _stats: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def start(cls, name: str, interval: float, fn: Callable[[], Awaitable[Any]], initial_delay: float = 30.0):
+        if not BACKGROUND_JOBS_ENABLED:
+            logger.info(f"Background jobs disabled - not starting {name}")
+            return
+        if name in cls._tasks and not cls._tasks[name].done():
+            return
+        cls._stats[name] = {"interval_s": interval, "runs": 0, "errors": 0, "last_run": None, "last_duration_s": None, "last_error": None}
+        cls._tasks[name] = asyncio.create_task(cls._loop(name, interval, fn, initial_delay))
+
+    @classmethod
+    async def _loop(cls, name: str, interval: float, fn: Callable[[], Awaitable[Any]], initial_delay: float):
+        stats = cls._stats[name]
+        await asyncio.sleep(initial_delay)
+        while True:
+            started = time.monotonic()
+            try:
+                await fn()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats["errors"] += 1
+                stats["last_error"] = str(e)
+                logger.error(f"Background job {name} failed: {e}")
+            stats["runs"] += 1
+            stats["last_run"] = time.time()
+            stats["last_duration_s"] = round(time.monotonic() - started, 3)
+            await asyncio.sleep(interval)
+
+    @classmethod
+    async def stop_all(cls):
+        tasks, cls._tasks = cls._tasks, {}
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {name: dict(s) for name, s in cls._stats.items()}
@@ -0,0 +1,115 @@
+"""
+Relevance Ranking Service
+Scores merged multi-search results against the query with BM25 over title and
+abstract, blended with log-scaled citation counts and recency. Term counting
+and scoring are vectorized with numpy over the whole candidate set at once.
+"""
+import os
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+RANK_WEIGHT_TEXT = float(os.environ.get("RANK_WEIGHT_TEXT", 0.7))
+RANK_WEIGHT_CITATIONS = float(os.environ.get("RANK_WEIGHT_CITATIONS", 0.2))
+RANK_WEIGHT_RECENCY = float(os.environ.get("RANK_WEIGHT_RECENCY", 0.1))
+RANK_TITLE_BOOST = float(os.environ.get("RANK_TITLE_BOOST", 2.0))
+# Years after which the recency component has halved
+RANK_RECENCY_HALF_LIFE = float(os.environ.get("RANK_RECENCY_HALF_LIFE", 5.0))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def query_terms(query: str) -> List[str]:
+    return list(dict.fromkeys(_TOKEN.findall(query.lower())))
+
+
+# Byte table that lowercases ASCII and turns punctuation into spaces; non-ASCII bytes pass through
+ASCII_FOLD = bytes(
+    c if c >= 128 or chr(c).islower() or chr(c).isdigit() else (c + 32 if chr(c).isupper() else 32)
+    for c in range(256)
+)
+
+
+def _term_counts(texts: List[str], terms: List[str]) -> np.ndarray:
+    """(len(texts), len(terms)) matrix of whole-word query-term occurrences."""
+    # All texts go into one case-folded byte array, space-padded past the longest term.
+    # Word starts are found once with vectorized comparisons and indexed by their first
+    # byte; each term then only filters the words starting with its own first byte, byte
+    # by byte, keeps those followed by a space, and maps them back with searchsorted.
+    encoded = [t.encode() for t in texts]
+    raw_terms = [term.encode() for term in terms]
+    pad = b" " * (max(len(r) for r in raw_terms) + 1)
+    buf = np.frombuffer((b" " + b"  ".join(encoded) + pad).translate(ASCII_FOLD), dtype=np.uint8)
+    doc_starts = np.cumsum([0] + [len(e) + 2 for e in encoded[:-1]])
+    space = buf == 32
+    word_starts = np.flatnonzero(space[:-1] & ~space[1:]) + 1
+    first_bytes = buf[word_starts]
+
+    counts = np.zeros((len(texts), len(terms)), dtype=np.float32)
+    for col, raw in enumerate(raw_terms):
+        hits = word_starts[first_bytes == raw[0]]
+        for k in range(1, len(raw)):
+            hits = hits[buf[hits + k] == raw[k]]
+        hits = hits[space[hits + len(raw)]]
+        if len(hits):
+            docs = np.searchsorted(doc_starts, hits, side="right") - 1
+            counts[:, col] = np.bincount(docs, minlength=len(texts))
+    return counts
+
+
+def bm25_scores(query: str, papers: List[Dict[str, Any]], title_boost: float = RANK_TITLE_BOOST) -> np.ndarray:
+    """BM25 of each paper's title + abstract, with IDF computed over the candidate set."""
+    terms = query_terms(query)
+    if not terms or not papers:
+        return np.zeros(len(papers), dtype=np.float32)
+    titles = [p.get("title") or "" for p in papers]
+    abstracts = [p.get("abstract") or "" for p in papers]
+
+    tf = title_boost * _term_counts(titles, terms) + _term_counts(abstracts, terms)
+    # BM25 only uses length relative to the mean, so character length stands in for word count
+    lengths = np.array([title_boost * len(t) + len(a) for t, a in zip(titles, abstracts)], dtype=np.float32)
+    n = len(papers)
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((n - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(lengths.mean(), 1.0))
+    return (tf * (BM25_K1 + 1) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+
+def rank_papers(
+    query: str,
+    papers: List[Dict[str, Any]],
+    weights: Optional[Dict[str, float]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Sort papers by blended relevance, best first, and set each paper's "score".
+    weights may override "text", "citations" and "recency".
+    """
+    if not papers:
+        return papers
+    w = {"text": RANK_WEIGHT_TEXT, "citations": RANK_WEIGHT_CITATIONS, "recency": RANK_WEIGHT_RECENCY, **(weights or {})}
+
+    text = bm25_scores(query, papers)
+    if text.max() > 0:
+        text = text / text.max()
+
+    citations = np.log1p(np.array([max(p.get("citation_count") or 0, 0) for p in papers], dtype=np.float32))
+    if citations.max() > 0:
+        citations = citations / citations.max()
+
+    this_year = datetime.now(timezone.utc).year
+    years = np.array([p.get("year") or 0 for p in papers], dtype=np.float32)
+    age = np.clip(this_year - years, 0, None)
+    recency = np.where(years > 0, 0.5 ** (age / RANK_RECENCY_HALF_LIFE), 0.0)
+
+    scores = w["text"] * text + w["citations"] * citations + w["recency"] * recency
+    order = np.argsort(-scores, kind="stable")
+    ranked = []
+    for i in order:
+        paper = papers[i]
+        paper["score"] = round(float(scores[i]), 4)
+        ranked.append(paper)
+    return ranked
@@ -0,0 +1,260 @@
+"""
+Upstream Rate-limit Scheduler
+One token bucket per upstream host. Requests wait in a priority queue so
+interactive searches are always dispatched before background work (harvesting,
+enrichment, cache refreshes). 429/503 responses pause the whole host for the
+server's Retry-After (or a jittered exponential backoff) and are retried.
+"""
+import os
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from services.http_client import get_client
+
+logger = logging.getLogger(__name__)
+
+LANE_INTERACTIVE = "interactive"
+LANE_BACKGROUND = "background"
+LANE_PRIORITY = {LANE_INTERACTIVE: 0, LANE_BACKGROUND: 1}
+
+# Requests per second and burst size per upstream. arXiv asks for one request
+# every three seconds; unauthenticated Semantic Scholar allows roughly one per second.
+UPSTREAM_RATES = {
+    "arxiv": (
+        1.0 / float(os.environ.get("ARXIV_MIN_INTERVAL", 3.0)),
+        int(os.environ.get("ARXIV_BURST", 1)),
+    ),
+    "semantic_scholar": (
+        float(os.environ.get("SEMANTIC_SCHOLAR_RATE", 1.0)),
+        int(os.environ.get("SEMANTIC_SCHOLAR_BURST", 1)),
+    ),
+    "openalex": (
+        float(os.environ.get("OPENALEX_RATE", 10.0)),
+        int(os.environ.get("OPENALEX_BURST", 10)),
+    ),
+}
+
+RETRY_STATUSES = (429, 503)
+MAX_RETRIES = int(os.environ.get("UPSTREAM_MAX_RETRIES", 3))
+BACKOFF_BASE = float(os.environ.get("UPSTREAM_BACKOFF_BASE", 1.0))
+# Longest pause an interactive request will sit through; background work waits out any Retry-After
+INTERACTIVE_MAX_RETRY_DELAY = float(os.environ.get("UPSTREAM_INTERACTIVE_MAX_RETRY_DELAY", 10.0))
+BACKGROUND_MAX_RETRY_DELAY = float(os.environ.get("UPSTREAM_BACKGROUND_MAX_RETRY_DELAY", 300.0))
+
+current_lane: ContextVar[str] = ContextVar("upstream_lane", default=LANE_INTERACTIVE)
+
+
+class LatencyTracker:
+    """Rolling window of successful upstream response times per source (queue wait excluded)."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Dict[str, deque] = {}
+        self.window = window
+
+    def record(self, source: str, seconds: float):
+        self._samples.setdefault(source, deque(maxlen=self.window)).append(seconds)
+
+    def count(self, source: str) -> int:
+        return len(self._samples.get(source, ()))
+
+    def percentile(self, source: str, pct: float) -> Optional[float]:
+        samples = sorted(self._samples.get(source, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+upstream_latency = LatencyTracker()
+
+
+@contextmanager
+def background_lane():
+    """Run upstream calls made inside this block in the low-priority lane."""
+    token = current_lane.set(LANE_BACKGROUND)
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+def _retry_after_seconds(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_delay(resp: httpx.Response, attempt: int) -> float:
+    retry_after = _retry_after_seconds(resp)
+    if retry_after is not None:
+        # Small jitter so paused callers don't all return on the same tick
+        return retry_after + random.uniform(0, BACKOFF_BASE)
+    return BACKOFF_BASE * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class HostScheduler:
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._throttled = 0
+        self._retries = 0
+        self._lane_stats = {
+            lane: {"requests": 0, "wait_total": 0.0, "wait_max": 0.0, "recent": deque(maxlen=500)}
+            for lane in LANE_PRIORITY
+        }
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, lane: str = LANE_INTERACTIVE) -> float:
+        """Wait for a send slot; returns the seconds spent queued."""
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        heapq.heappush(self._waiters, (LANE_PRIORITY.get(lane, 0), next(self._seq), fut))
+        if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await fut
+
+        waited = time.monotonic() - started
+        stats = self._lane_stats[lane]
+        stats["requests"] += 1
+        stats["wait_total"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+        stats["recent"].append(waited)
+        return waited
+
+    async def _dispatch(self):
+        while self._waiters:
+            now = time.monotonic()
+            self._refill(now)
+            delay = self._blocked_until - now
+            if delay <= 0 and self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                # Caller was cancelled while queued
+                continue
+            self._tokens -= 1
+            fut.set_result(None)
+
+    def ready(self) -> bool:
+        """True when a request sent now would be dispatched at once: a token free, no queue, no pause."""
+        now = time.monotonic()
+        self._refill(now)
+        return self._tokens >= 1 and not self._waiters and now >= self._blocked_until
+
+    def pause(self, seconds: float):
+        """Hold every request to this host for the given time."""
+        self._throttled += 1
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def record_retry(self):
+        self._retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lanes = {}
+        for lane, s in self._lane_stats.items():
+            recent = sorted(s["recent"])
+            p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+            lanes[lane] = {
+                "requests": s["requests"],
+                "wait_ms_avg": round(s["wait_total"] / s["requests"] * 1000, 1) if s["requests"] else 0.0,
+                "wait_ms_p95": round(p95 * 1000, 1),
+                "wait_ms_max": round(s["wait_max"] * 1000, 1),
+            }
+        return {
+            "rate_per_s": round(self.rate, 3),
+            "burst": self.burst,
+            "queued": len(self._waiters),
+            "paused_for_s": round(max(0.0, self._blocked_until - time.monotonic()), 2),
+            "throttled": self._throttled,
+            "retries": self._retries,
+            "lanes": lanes,
+        }
+
+
+_schedulers: Dict[str, HostScheduler] = {}
+
+
+def get_scheduler(source: str) -> HostScheduler:
+    scheduler = _schedulers.get(source)
+    if scheduler is None:
+        rate, burst = UPSTREAM_RATES.get(source, (5.0, 5))
+        scheduler = HostScheduler(source, rate, burst)
+        _schedulers[source] = scheduler
+    return scheduler
+
+
+async def rate_limited_request(source: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Send a request through the source's scheduler using the shared client.
+    Throttled responses (429/503) pause the host and are retried; the last
+    response is returned as-is so callers still raise_for_status() themselves.
+    """
+    scheduler = get_scheduler(source)
+    lane = current_lane.get()
+    max_delay = BACKGROUND_MAX_RETRY_DELAY if lane == LANE_BACKGROUND else INTERACTIVE_MAX_RETRY_DELAY
+
+    attempt = 0
+    while True:
+        await scheduler.acquire(lane)
+        started = time.monotonic()
+        resp = await get_client(source).request(method, url, **kwargs)
+        if resp.status_code < 400:
+            # Errors come back fast; counting them would pull the hedging p95 down
+            upstream_latency.record(source, time.monotonic() - started)
+        if resp.status_code not in RETRY_STATUSES:
+            return resp
+
+        delay = _backoff_delay(resp, attempt)
+        scheduler.pause(delay)
+        if attempt >= MAX_RETRIES or delay > max_delay:
+            logger.warning(f"{source} throttled ({resp.status_code}), giving up after {attempt + 1} attempt(s)")
+            return resp
+
+        attempt += 1
+        scheduler.record_retry()
+        logger.info(f"{source} throttled ({resp.status_code}), retrying in {delay:.1f}s")
+
+
+async def rate_limited_get(source: str, url: str, **kwargs) -> httpx.Response:
+    return await rate_limited_request(source, "GET", url, **kwargs)
+
+
+def scheduler_stats() -> Dict[str, Any]:
+    return {source: scheduler.stats() for source, scheduler in _schedulers.items()}
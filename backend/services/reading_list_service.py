@@ -0,0 +1,94 @@
+"""
+Reading List Service
+Keeps saved arXiv papers current: a background job resolves every saved ID in
+batches and records the latest version, so users can see which saved papers
+have been revised since they saved them.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from sqlalchemy.orm import Session
+from db.postgres import SessionLocal
+from models.user_models import SavedArxivPaper, ArxivPaperVersion
+from services.arxiv_service import get_arxiv_papers, split_version
+from services.rate_limiter import background_lane
+
+logger = logging.getLogger(__name__)
+
+ARXIV_VERSION_CHECK_INTERVAL = int(os.environ.get("ARXIV_VERSION_CHECK_INTERVAL", 6 * 3600))
+
+
+async def refresh_saved_versions() -> int:
+    """Look up the latest version of every saved arXiv paper. Returns papers checked."""
+    base_ids = await asyncio.to_thread(_saved_base_ids)
+    if not base_ids:
+        return 0
+
+    # Straight from arXiv: a cached feed would report the version from up to a day ago
+    with background_lane():
+        papers = await get_arxiv_papers(base_ids, refresh=True)
+
+    # The session is only opened once the (slow, rate-limited) fetch is done
+    await asyncio.to_thread(_store_versions, base_ids, papers)
+    logger.info(f"Checked versions for {len(papers)}/{len(base_ids)} saved arXiv papers")
+    return len(papers)
+
+
+def _saved_base_ids() -> List[str]:
+    db = SessionLocal()
+    try:
+        saved_ids = [row[0] for row in db.query(SavedArxivPaper.arxiv_id).distinct().all()]
+    finally:
+        db.close()
+    return list(dict.fromkeys(split_version(i)[0] for i in saved_ids))
+
+
+def _store_versions(base_ids: List[str], papers: Dict[str, Dict[str, Any]]):
+    db = SessionLocal()
+    try:
+        existing = {
+            v.base_id: v for v in db.query(ArxivPaperVersion).filter(ArxivPaperVersion.base_id.in_(base_ids)).all()
+        }
+        now = datetime.now(timezone.utc)
+        for base_id, paper in papers.items():
+            version = split_version(paper["arxiv_id"])[1]
+            row = existing.get(base_id)
+            if row is None:
+                row = ArxivPaperVersion(base_id=base_id)
+                db.add(row)
+            row.latest_version = version
+            row.updated = paper.get("updated")
+            row.checked_at = now
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_version_updates(db: Session, user_id: int) -> List[Dict[str, Any]]:
+    """Saved papers (stored with an explicit version) that have a newer version on arXiv."""
+    saved = db.query(SavedArxivPaper).filter(SavedArxivPaper.user_id == user_id).all()
+    by_base = {}
+    for paper in saved:
+        base_id, version = split_version(paper.arxiv_id)
+        if version is not None:
+            by_base[base_id] = (paper, version)
+    if not by_base:
+        return []
+
+    latest = db.query(ArxivPaperVersion).filter(ArxivPaperVersion.base_id.in_(list(by_base))).all()
+    updates = []
+    for row in latest:
+        paper, saved_version = by_base[row.base_id]
+        if row.latest_version and row.latest_version > saved_version:
+            updates.append({
+                "arxiv_id": paper.arxiv_id,
+                "title": paper.title,
+                "saved_version": saved_version,
+                "latest_version": row.latest_version,
+                "latest_id": f"{row.base_id}v{row.latest_version}",
+                "updated": row.updated,
+                "checked_at": row.checked_at,
+            })
+    return updates
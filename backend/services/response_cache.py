@@ -0,0 +1,322 @@
+"""
+Upstream Response Cache
+Two-tier TTL cache for upstream API responses: an in-memory LRU in front of a
+SQLite file. Entries are keyed on the source, endpoint and normalized request
+parameters. Expired entries are still served for a grace period while a
+background task refreshes them (stale-while-revalidate).
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from services.singleflight import upstream_flights
+from services.rate_limiter import background_lane
+
+logger = logging.getLogger(__name__)
+
+CACHE_DB_PATH = os.environ.get("UPSTREAM_CACHE_PATH", "./upstream_cache.db")
+CACHE_MEMORY_ENTRIES = int(os.environ.get("UPSTREAM_CACHE_MEMORY_ENTRIES", 512))
+CACHE_MAX_BYTES = int(os.environ.get("UPSTREAM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CACHE_STALE_TTL = int(os.environ.get("UPSTREAM_CACHE_STALE_TTL", 24 * 3600))
+
+# Seconds an entry is considered fresh, per source
+SOURCE_TTLS = {
+    "arxiv": int(os.environ.get("UPSTREAM_CACHE_TTL_ARXIV", 3600)),
+    "semantic_scholar": int(os.environ.get("UPSTREAM_CACHE_TTL_SEMANTIC_SCHOLAR", 6 * 3600)),
+    "openalex": int(os.environ.get("UPSTREAM_CACHE_TTL_OPENALEX", 6 * 3600)),
+}
+DEFAULT_TTL = 3600
+
+# (payload, stored_at, expires_at)
+CacheEntry = Tuple[bytes, float, float]
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    return value
+
+
+def make_cache_key(source: str, endpoint: str, params: Dict[str, Any]) -> str:
+    """Stable key for a request: normalized string params, sorted, hashed."""
+    normalized = {k: _normalize(v) for k, v in params.items() if v is not None}
+    raw = json.dumps([source, endpoint, normalized], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: str = CACHE_DB_PATH,
+        memory_entries: int = CACHE_MEMORY_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        stale_ttl: int = CACHE_STALE_TTL,
+    ):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = 0
+        self._disk_disabled = False
+        self._refreshing = set()
+        self._tasks = set()
+        self._evictions = 0
+        self._stats = defaultdict(lambda: {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0})
+
+    # --- Disk tier ---
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and not self._disk_disabled:
+            try:
+                conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache_entries ("
+                    " key TEXT PRIMARY KEY, source TEXT NOT NULL, payload BLOB NOT NULL,"
+                    " size INTEGER NOT NULL, stored_at REAL NOT NULL, expires_at REAL NOT NULL,"
+                    " last_access REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache_entries(last_access)")
+                self._disk_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"Upstream cache disk store unavailable, using memory only: {e}")
+                self._disk_disabled = True
+        return self._conn
+
+    def _disk_get(self, key: str) -> Optional[CacheEntry]:
+        return self._disk_get_many([key]).get(key)
+
+    def _disk_get_many(self, keys: List[str]) -> Dict[str, CacheEntry]:
+        found: Dict[str, CacheEntry] = {}
+        with self._disk_lock:
+            conn = self._connection()
+            if conn is None:
+                return found
+            try:
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    rows = conn.execute(
+                        f"SELECT key, payload, stored_at, expires_at FROM cache_entries WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                    for key, payload, stored_at, expires_at in rows:
+                        found[key] = (bytes(payload), stored_at, expires_at)
+                if found:
+                    now = time.time()
+                    conn.executemany("UPDATE cache_entries SET last_access = ? WHERE key = ?", [(now, k) for k in found])
+            except sqlite3.Error as e:
+                logger.warning(f"Upstream cache read error: {e}")
+        return found
+
+    def _disk_put(self, key: str, source: str, entry: CacheEntry):
+        self._disk_put_many(source, [(key, entry)])
+
+    def _disk_put_many(self, source: str, items: List[Tuple[str, CacheEntry]]):
+        with self._disk_lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.execute("BEGIN")
+                for key, (payload, stored_at, expires_at) in items:
+                    old = conn.execute("SELECT size FROM cache_entries WHERE key = ?", (key,)).fetchone()
+                    conn.execute(
+                        "INSERT OR REPLACE INTO cache_entries (key, source, payload, size, stored_at, expires_at, last_access)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (key, source, payload, len(payload), stored_at, expires_at, stored_at),
+                    )
+                    self._disk_bytes += len(payload) - (old[0] if old else 0)
+                if self._disk_bytes > self.max_bytes:
+                    self._evict(conn)
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.warning(f"Upstream cache write error: {e}")
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used rows until the store is under 90% of its budget."""
+        target = int(self.max_bytes * 0.9)
+        rows = conn.execute("SELECT key, size FROM cache_entries ORDER BY last_access ASC").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._disk_bytes <= target:
+                break
+            doomed.append((key,))
+            self._disk_bytes -= size
+        conn.executemany("DELETE FROM cache_entries WHERE key = ?", doomed)
+        self._evictions += len(doomed)
+
+    # --- Memory tier ---
+
+    def _memory_get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        return entry
+
+    def _memory_put(self, key: str, entry: CacheEntry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    async def _lookup(self, key: str) -> Optional[CacheEntry]:
+        entry = self._memory_get(key)
+        if entry is None:
+            entry = await asyncio.to_thread(self._disk_get, key)
+            if entry is not None:
+                self._memory_put(key, entry)
+        return entry
+
+    async def _fetch_and_store(self, key: str, source: str, fetch: Callable[[], Awaitable[Any]], ttl: int) -> bytes:
+        value = await fetch()
+        now = time.time()
+        entry = (json.dumps(value, separators=(",", ":")).encode("utf-8"), now, now + ttl)
+        self._memory_put(key, entry)
+        await asyncio.to_thread(self._disk_put, key, source, entry)
+        return entry[0]
+
+    # --- Public API ---
+
+    async def get_or_fetch(
+        self,
+        source: str,
+        endpoint: str,
+        params: Dict[str, Any],
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+        refresh: bool = False,
+    ) -> Any:
+        """
+        Return the cached response for a request, calling fetch() on a miss.
+        Exceptions from fetch() propagate and nothing is cached, so callers keep
+        their existing error handling and failures are never served from cache.
+        Concurrent misses for the same key share a single fetch; each caller
+        decodes its own copy so route handlers can mutate results freely.
+        With refresh=True the cached entry is ignored and the fresh response
+        replaces it.
+        """
+        ttl = ttl if ttl is not None else SOURCE_TTLS.get(source, DEFAULT_TTL)
+        key = make_cache_key(source, endpoint, params)
+        stats = self._stats[source]
+
+        entry = None if refresh else await self._lookup(key)
+        if entry is not None:
+            payload, _, expires_at = entry
+            now = time.time()
+            if now < expires_at:
+                stats["hits"] += 1
+                return json.loads(payload)
+            if now < expires_at + self.stale_ttl:
+                stats["stale_hits"] += 1
+                self._schedule_refresh(key, source, ttl, fetch)
+                return json.loads(payload)
+
+        stats["misses"] += 1
+        payload = await upstream_flights.do(source, key, lambda: self._fetch_and_store(key, source, fetch, ttl))
+        return json.loads(payload)
+
+    async def lookup_many(
+        self, source: str, endpoint: str, params_list: List[Dict[str, Any]]
+    ) -> List[Optional[Tuple[Any, bool]]]:
+        """
+        Per-item lookup for callers that batch their own upstream requests.
+        Each result is (value, is_fresh), or None for a miss or an entry past
+        its stale grace period.
+        """
+        keys = [make_cache_key(source, endpoint, p) for p in params_list]
+        entries = {k: e for k in keys if (e := self._memory_get(k)) is not None}
+        disk_keys = [k for k in dict.fromkeys(keys) if k not in entries]
+        if disk_keys:
+            from_disk = await asyncio.to_thread(self._disk_get_many, disk_keys)
+            for key, entry in from_disk.items():
+                self._memory_put(key, entry)
+            entries.update(from_disk)
+
+        stats = self._stats[source]
+        now = time.time()
+        results = []
+        for key in keys:
+            entry = entries.get(key)
+            if entry is not None and now < entry[2]:
+                stats["hits"] += 1
+                results.append((json.loads(entry[0]), True))
+            elif entry is not None and now < entry[2] + self.stale_ttl:
+                stats["stale_hits"] += 1
+                results.append((json.loads(entry[0]), False))
+            else:
+                stats["misses"] += 1
+                results.append(None)
+        return results
+
+    async def store_many(
+        self, source: str, endpoint: str, items: List[Tuple[Dict[str, Any], Any]], ttl: Optional[int] = None
+    ):
+        """Store (params, value) pairs in one disk transaction."""
+        ttl = ttl if ttl is not None else SOURCE_TTLS.get(source, DEFAULT_TTL)
+        now = time.time()
+        rows = []
+        for params, value in items:
+            key = make_cache_key(source, endpoint, params)
+            entry = (json.dumps(value, separators=(",", ":")).encode("utf-8"), now, now + ttl)
+            self._memory_put(key, entry)
+            rows.append((key, entry))
+        if rows:
+            await asyncio.to_thread(self._disk_put_many, source, rows)
+
+    def _schedule_refresh(self, key: str, source: str, ttl: int, fetch: Callable[[], Awaitable[Any]]):
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                with background_lane():
+                    await upstream_flights.do(source, key, lambda: self._fetch_and_store(key, source, fetch, ttl))
+                self._stats[source]["refreshes"] += 1
+            except Exception as e:
+                self._stats[source]["refresh_errors"] += 1
+                logger.warning(f"Background refresh failed for {source}: {e}")
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> Dict[str, Any]:
+        per_source = {}
+        for source, s in self._stats.items():
+            lookups = s["hits"] + s["stale_hits"] + s["misses"]
+            per_source[source] = {**s, "hit_ratio": round((s["hits"] + s["stale_hits"]) / lookups, 4) if lookups else 0.0}
+        return {
+            "memory_entries": len(self._memory),
+            "memory_capacity": self.memory_entries,
+            "disk_bytes": self._disk_bytes,
+            "disk_capacity_bytes": self.max_bytes,
+            "evictions": self._evictions,
+            "refreshing": len(self._refreshing),
+            "sources": per_source,
+        }
+
+    def close(self):
+        with self._disk_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+upstream_cache = ResponseCache()
@@ -0,0 +1,100 @@
+"""
+Search Cursors
+Opaque, signed page tokens for multi-source search. A cursor carries each
+source's next offset (arXiv start, Semantic Scholar offset, OpenAlex page) and
+short digests of the dedup keys the last few pages returned, so later pages skip
+papers a recent page showed under another source. Only recent pages are kept so
+a cursor stays a few KB and fits in a GET parameter however deep the paging
+goes. Cursors are compressed JSON with an HMAC-SHA256 tag, and are bound to the
+query parameters that produced them.
+"""
+import os
+import hmac
+import json
+import zlib
+import base64
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from services.auth_service import SECRET_KEY
+
+CURSOR_SECRET = os.environ.get("CURSOR_SECRET", SECRET_KEY).encode("utf-8")
+# Pages whose dedup digests a cursor keeps; a paper an older page showed may be repeated
+CURSOR_SEEN_PAGES = int(os.environ.get("CURSOR_SEEN_PAGES", 3))
+# Cap on the digests kept over those pages; each adds about 7 characters to the cursor
+CURSOR_MAX_SEEN = int(os.environ.get("CURSOR_MAX_SEEN", 500))
+CURSOR_VERSION = 2
+# Hex digits per digest; packed into 5 bytes in the cursor
+SEEN_DIGEST_CHARS = 10
+TAG_BYTES = 16
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _tag(payload: bytes) -> bytes:
+    return hmac.new(CURSOR_SECRET, payload, hashlib.sha256).digest()[:TAG_BYTES]
+
+
+def fingerprint(**params: Any) -> str:
+    """Short hash of the query parameters a cursor belongs to."""
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def seen_digest(key: str) -> str:
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:SEEN_DIGEST_CHARS]
+
+
+def _recent(seen_pages: List[List[str]]) -> List[List[str]]:
+    """The newest pages of digests, within CURSOR_SEEN_PAGES and CURSOR_MAX_SEEN."""
+    kept: List[List[str]] = []
+    room = CURSOR_MAX_SEEN
+    for digests in reversed(seen_pages[-CURSOR_SEEN_PAGES:]):
+        if room <= 0:
+            break
+        kept.append(digests[-room:])
+        room -= len(kept[-1])
+    return kept[::-1]
+
+
+def encode_cursor(params: str, positions: Dict[str, int], seen_pages: List[List[str]], page: int) -> str:
+    """seen_pages holds the dedup digests of each page returned so far, oldest first."""
+    seen = [_b64encode(bytes.fromhex("".join(digests))) for digests in _recent(seen_pages)]
+    state = {"v": CURSOR_VERSION, "q": params, "pos": positions, "seen": seen, "page": page}
+    payload = zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"))
+    return f"{_b64encode(payload)}.{_b64encode(_tag(payload))}"
+
+
+def decode_cursor(cursor: str, params: Optional[str] = None) -> Dict[str, Any]:
+    """State dict of a cursor; raises InvalidCursor if it was tampered with or belongs to another query."""
+    try:
+        body, tag = cursor.split(".", 1)
+        payload = _b64decode(body)
+        valid = hmac.compare_digest(_tag(payload), _b64decode(tag))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if not valid:
+        raise InvalidCursor("Cursor signature does not match")
+    try:
+        state = json.loads(zlib.decompress(payload))
+    except (zlib.error, ValueError):
+        raise InvalidCursor("Malformed cursor")
+    if state.get("v") != CURSOR_VERSION:
+        raise InvalidCursor("Cursor is from an older version; start the search again")
+    if params is not None and state.get("q") != params:
+        raise InvalidCursor("Cursor belongs to a different query")
+    try:
+        packed = [_b64decode(page).hex() for page in state["seen"]]
+    except (KeyError, TypeError, ValueError):
+        raise InvalidCursor("Malformed cursor")
+    state["seen"] = [[p[i:i + SEEN_DIGEST_CHARS] for i in range(0, len(p), SEEN_DIGEST_CHARS)] for p in packed]
+    return state
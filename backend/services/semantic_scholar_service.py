@@ -3,23 +3,43 @@ Semantic Scholar API Service
 Free academic search API - no key required for basic search.
 Docs: https://api.semanticscholar.org/
 """
-import httpx
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+from services.rate_limiter import rate_limited_get
+from services.response_cache import upstream_cache
+from services.paper_store import paper_store
 
 logger = logging.getLogger(__name__)
 
 SS_API = "https://api.semanticscholar.org/graph/v1"
 
 
+def _year_range(year: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """Parse S2's year filter ("2019", "2016-2020", "2010-", "-2015") into bounds."""
+    if not year:
+        return None, None
+    start, dash, end = year.partition("-")
+    start_year = int(start) if start.isdigit() else None
+    if not dash:
+        return start_year, start_year
+    return start_year, int(end) if end.isdigit() else None
+
+
 async def search_semantic_scholar(
     query: str,
     limit: int = 20,
     offset: int = 0,
     year: Optional[str] = None,
     fields_of_study: Optional[str] = None,
+    raise_errors: bool = False,
 ) -> Dict[str, Any]:
-    """Search Semantic Scholar papers."""
+    """Search Semantic Scholar papers. Errors give an empty result unless raise_errors is set."""
+    year_from, year_to = _year_range(year)
+    if not fields_of_study:
+        local = await paper_store.search("semantic_scholar", query, limit, offset, year_from=year_from, year_to=year_to)
+        if local is not None:
+            return {"total": local[0], "offset": offset, "papers": local[1]}
+
     params = {
         "query": query,
         "limit": min(limit, 100),
@@ -31,63 +51,20 @@ async def search_semantic_scholar(
     if fields_of_study:
         params["fieldsOfStudy"] = fields_of_study
 
-    try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(f"{SS_API}/paper/search", params=params)
-            resp.raise_for_status()
-            data = resp.json()
-
-            papers = []
-            for p in data.get("data", []):
-                authors = [a.get("name", "") for a in (p.get("authors") or [])]
-                pdf_url = None
-                if p.get("openAccessPdf"):
-                    pdf_url = p["openAccessPdf"].get("url")
-                doi = (p.get("externalIds") or {}).get("DOI")
-
-                papers.append({
-                    "source": "semantic_scholar",
-                    "source_id": p.get("paperId", ""),
-                    "title": p.get("title", ""),
-                    "abstract": p.get("abstract") or "",
-                    "authors": authors,
-                    "year": p.get("year"),
-                    "citation_count": p.get("citationCount", 0),
-                    "url": p.get("url", ""),
-                    "pdf_url": pdf_url,
-                    "doi": doi,
-                    "journal": (p.get("journal") or {}).get("name"),
-                    "fields_of_study": p.get("fieldsOfStudy") or [],
-                })
-
-            return {
-                "total": data.get("total", 0),
-                "offset": data.get("offset", 0),
-                "papers": papers,
-            }
-    except Exception as e:
-        logger.error(f"Semantic Scholar search error: {e}")
-        return {"total": 0, "offset": 0, "papers": []}
-
-
-async def get_paper_details(paper_id: str) -> Optional[Dict[str, Any]]:
-    """Get detailed paper info from Semantic Scholar."""
-    fields = "paperId,title,abstract,authors,year,citationCount,referenceCount,url,externalIds,journal,fieldsOfStudy,openAccessPdf,citations.paperId,citations.title,citations.year,references.paperId,references.title,references.year"
-    try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(f"{SS_API}/paper/{paper_id}", params={"fields": fields})
-            resp.raise_for_status()
-            p = resp.json()
+    async def fetch():
+        resp = await rate_limited_get("semantic_scholar", f"{SS_API}/paper/search", params=params)
+        resp.raise_for_status()
+        data = resp.json()
 
+        papers = []
+        for p in data.get("data", []):
             authors = [a.get("name", "") for a in (p.get("authors") or [])]
             pdf_url = None
             if p.get("openAccessPdf"):
                 pdf_url = p["openAccessPdf"].get("url")
+            external_ids = p.get("externalIds") or {}
 
-            citations = [{"id": c["paperId"], "title": c.get("title", ""), "year": c.get("year")} for c in (p.get("citations") or [])[:20] if c.get("paperId")]
-            references = [{"id": r["paperId"], "title": r.get("title", ""), "year": r.get("year")} for r in (p.get("references") or [])[:20] if r.get("paperId")]
-
-            return {
+            papers.append({
                 "source": "semantic_scholar",
                 "source_id": p.get("paperId", ""),
                 "title": p.get("title", ""),
@@ -95,15 +72,69 @@ async def get_paper_details(paper_id: str) -> Optional[Dict[str, Any]]:
                 "authors": authors,
                 "year": p.get("year"),
                 "citation_count": p.get("citationCount", 0),
-                "reference_count": p.get("referenceCount", 0),
                 "url": p.get("url", ""),
                 "pdf_url": pdf_url,
-                "doi": (p.get("externalIds") or {}).get("DOI"),
+                "doi": external_ids.get("DOI"),
+                "arxiv_id": external_ids.get("ArXiv"),
                 "journal": (p.get("journal") or {}).get("name"),
                 "fields_of_study": p.get("fieldsOfStudy") or [],
-                "citations": citations,
-                "references": references,
-            }
+            })
+
+        await paper_store.add_many("semantic_scholar", papers)
+        if not fields_of_study:
+            await paper_store.add_total("semantic_scholar", query, data.get("total", 0), year_from=year_from, year_to=year_to)
+        return {
+            "total": data.get("total", 0),
+            "offset": data.get("offset", 0),
+            "papers": papers,
+        }
+
+    try:
+        return await upstream_cache.get_or_fetch("semantic_scholar", "paper/search", params, fetch)
+    except Exception as e:
+        if raise_errors:
+            raise
+        logger.error(f"Semantic Scholar search error: {e}")
+        return {"total": 0, "offset": 0, "papers": []}
+
+
+async def get_paper_details(paper_id: str) -> Optional[Dict[str, Any]]:
+    """Get detailed paper info from Semantic Scholar."""
+    fields = "paperId,title,abstract,authors,year,citationCount,referenceCount,url,externalIds,journal,fieldsOfStudy,openAccessPdf,citations.paperId,citations.title,citations.year,references.paperId,references.title,references.year"
+
+    async def fetch():
+        resp = await rate_limited_get("semantic_scholar", f"{SS_API}/paper/{paper_id}", params={"fields": fields})
+        resp.raise_for_status()
+        p = resp.json()
+
+        authors = [a.get("name", "") for a in (p.get("authors") or [])]
+        pdf_url = None
+        if p.get("openAccessPdf"):
+            pdf_url = p["openAccessPdf"].get("url")
+
+        citations = [{"id": c["paperId"], "title": c.get("title", ""), "year": c.get("year")} for c in (p.get("citations") or [])[:20] if c.get("paperId")]
+        references = [{"id": r["paperId"], "title": r.get("title", ""), "year": r.get("year")} for r in (p.get("references") or [])[:20] if r.get("paperId")]
+
+        return {
+            "source": "semantic_scholar",
+            "source_id": p.get("paperId", ""),
+            "title": p.get("title", ""),
+            "abstract": p.get("abstract") or "",
+            "authors": authors,
+            "year": p.get("year"),
+            "citation_count": p.get("citationCount", 0),
+            "reference_count": p.get("referenceCount", 0),
+            "url": p.get("url", ""),
+            "pdf_url": pdf_url,
+            "doi": (p.get("externalIds") or {}).get("DOI"),
+            "journal": (p.get("journal") or {}).get("name"),
+            "fields_of_study": p.get("fieldsOfStudy") or [],
+            "citations": citations,
+            "references": references,
+        }
+
+    try:
+        return await upstream_cache.get_or_fetch("semantic_scholar", f"paper/{paper_id}", {"fields": fields}, fetch)
     except Exception as e:
         logger.error(f"Semantic Scholar detail error: {e}")
         return None
@@ -0,0 +1,62 @@
+"""
+Single-flight Request Coalescing
+Concurrent callers asking for the same upstream request share one in-flight
+task instead of each sending their own copy upstream.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Hedged duplicates set this so they run on their own instead of joining the original
+flight_attempt: ContextVar[int] = ContextVar("flight_attempt", default=0)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._stats = defaultdict(lambda: {"calls": 0, "executed": 0, "collapsed": 0})
+
+    async def do(self, group: str, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() once per key at a time; concurrent callers await the same result.
+        The shared task is shielded so a cancelled caller (e.g. a dropped client
+        connection) does not cancel the request for everyone else. A hedged
+        duplicate has no one to share with, so it runs unshielded in the caller
+        and a losing hedge is cancelled along with its upstream request.
+        """
+        stats = self._stats[group]
+        stats["calls"] += 1
+        if flight_attempt.get():
+            stats["executed"] += 1
+            return await fn()
+
+        task = self._inflight.get(key)
+        if task is not None:
+            stats["collapsed"] += 1
+            return await asyncio.shield(task)
+
+        stats["executed"] += 1
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Retrieve the exception so an unawaited failure is not logged as never retrieved
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "groups": {group: dict(s) for group, s in self._stats.items()},
+        }
+
+
+upstream_flights = SingleFlight()
@@ -0,0 +1,39 @@
+"""
+Server-Sent Events
+Formatting for text/event-stream responses. Each event dict is sent under its
+"event" name with the whole dict as JSON data. ClosingStreamingResponse is used
+for every streamed endpoint, so the generator behind a stream is closed as soon
+as the client goes away.
+"""
+import json
+from typing import Any, Dict
+
+import anyio
+from starlette.responses import StreamingResponse
+from starlette.types import Send
+
+# Stop proxies (nginx) from buffering the stream and clients from caching it
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: Dict[str, Any]) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that closes its body generator when the stream ends for any
+    reason. On disconnect Starlette only cancels the send loop; a generator paused
+    at a yield would stay open, holding its LLM slot or queued jobs, until it is
+    garbage collected.
+    """
+
+    async def stream_response(self, send: Send) -> None:
+        try:
+            await super().stream_response(send)
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                # Shielded: the surrounding scope is usually being cancelled
+                with anyio.CancelScope(shield=True):
+                    await aclose()
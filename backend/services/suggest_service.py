@@ -0,0 +1,270 @@
+"""
+Typeahead Suggestions
+Prefix completions for search boxes over paper titles, author names and arXiv
+categories, answered from memory so partial input never reaches the upstream
+APIs. Entries are kept in a sorted array of normalized keys; a prefix lookup is
+two bisections plus a top-k over that slice. The index is built from the local
+paper store, saved and workspace papers and Neo4j Paper/Author nodes, and
+between full rebuilds new paper-store rows go into a small delta snapshot.
+"""
+import os
+import re
+import math
+import time
+import asyncio
+import logging
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from db.neo4j import Neo4jConnection
+from db.postgres import SessionLocal
+from models.user_models import SavedArxivPaper, WorkspacePaper
+from services.arxiv_service import ARXIV_CATEGORIES
+from services.paper_store import paper_store
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_REFRESH_INTERVAL = int(os.environ.get("SUGGEST_REFRESH_INTERVAL", 300))
+SUGGEST_REBUILD_INTERVAL = int(os.environ.get("SUGGEST_REBUILD_INTERVAL", 6 * 3600))
+# Delta entries after which the next refresh does a full rebuild instead
+SUGGEST_DELTA_MAX = int(os.environ.get("SUGGEST_DELTA_MAX", 50000))
+# Extra weight for papers someone saved or put in a workspace
+SUGGEST_LIBRARY_BOOST = float(os.environ.get("SUGGEST_LIBRARY_BOOST", 5.0))
+CATEGORY_WEIGHT = 1000.0
+STORE_BATCH = 5000
+
+KINDS = ("title", "author", "category")
+_KIND_INDEX = {kind: i for i, kind in enumerate(KINDS)}
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, accents stripped, punctuation collapsed to single spaces."""
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+class SuggestBuilder:
+    """Accumulates weighted entries keyed on (kind, normalized text)."""
+
+    def __init__(self):
+        # (kind index, key) -> [display text, value, weight]
+        self.entries: Dict[Tuple[int, str], list] = {}
+
+    def _add(self, kind: str, key: str, text: str, value: str, weight: float):
+        if not key:
+            return
+        entry = self.entries.get((_KIND_INDEX[kind], key))
+        if entry is None:
+            self.entries[(_KIND_INDEX[kind], key)] = [text, value, weight]
+        else:
+            entry[2] += weight
+
+    def add_title(self, title: str, weight: float = 1.0):
+        title = " ".join(title.split())
+        self._add("title", normalize(title), title, title, weight)
+
+    def add_author(self, name: str, weight: float = 1.0):
+        name = " ".join(name.split())
+        key = normalize(name)
+        self._add("author", key, name, name, weight)
+        # Surname first as well, so "hinton" finds "Geoffrey Hinton"
+        parts = key.split(" ")
+        if len(parts) > 1:
+            self._add("author", f"{parts[-1]} {' '.join(parts[:-1])}", name, name, weight)
+
+    def add_category(self, code: str, weight: float = 1.0):
+        name = ARXIV_CATEGORIES.get(code)
+        if name is None:
+            return
+        text = f"{name} ({code})"
+        self._add("category", normalize(code), text, code, weight)
+        self._add("category", normalize(name), text, code, weight)
+
+    def add_paper(self, title: str, authors: Iterable[str], categories: Iterable[str] = (), weight: float = 1.0):
+        if title:
+            self.add_title(title, weight)
+        for name in authors:
+            if name:
+                self.add_author(name, weight)
+        for code in categories:
+            self.add_category(code)
+
+    def snapshot(self) -> "_Snapshot":
+        return _Snapshot(self.entries)
+
+
+class _Snapshot:
+    """Immutable sorted array of entries; swapped in whole, so readers never lock."""
+
+    def __init__(self, entries: Dict[Tuple[int, str], list]):
+        items = sorted(entries.items(), key=lambda item: item[0][1])
+        self.keys = [key for (_, key), _ in items]
+        self.kinds = np.array([kind for (kind, _), _ in items], dtype=np.uint8)
+        self.texts = [entry[0] for _, entry in items]
+        self.values = [entry[1] for _, entry in items]
+        self.weights = np.array([entry[2] for _, entry in items], dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def matches(self, prefix: str, limit: int, kind_mask: Optional[np.ndarray]) -> List[int]:
+        """Indexes of the heaviest entries whose key starts with prefix."""
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo)
+        if hi <= lo:
+            return []
+        weights = self.weights[lo:hi]
+        if kind_mask is not None:
+            weights = np.where(kind_mask[self.kinds[lo:hi]], weights, -1.0)
+        if hi - lo > limit:
+            top = np.argpartition(-weights, limit - 1)[:limit]
+        else:
+            top = np.arange(hi - lo)
+        return [lo + int(i) for i in top if weights[i] >= 0]
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._base = _Snapshot({})
+        self._delta = _Snapshot({})
+        self._pending = SuggestBuilder()
+        self._cursor = (0.0, 0)
+        self._built_at = 0.0
+        self._build_lock = threading.Lock()
+        self._latencies = deque(maxlen=2000)
+        self._stats = {"queries": 0, "rebuilds": 0, "updates": 0, "last_build_s": None}
+
+    def suggest(self, query: str, limit: int = 8, kinds: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        started = time.perf_counter()
+        prefix = normalize(query)
+        results: List[Dict[str, Any]] = []
+        if prefix:
+            kind_mask = None
+            if kinds:
+                kind_mask = np.array([k in kinds for k in KINDS])
+            combined: Dict[Tuple[int, str], Dict[str, Any]] = {}
+            # Within a snapshot the same entry can match under two keys (author surname
+            # first), so take the max there; across base and delta, weights add up
+            for snapshot in (self._base, self._delta):
+                best: Dict[Tuple[int, str], Tuple[float, str]] = {}
+                for i in snapshot.matches(prefix, limit * 2, kind_mask):
+                    ident = (int(snapshot.kinds[i]), snapshot.values[i])
+                    weight = float(snapshot.weights[i])
+                    if ident not in best or weight > best[ident][0]:
+                        best[ident] = (weight, snapshot.texts[i])
+                for ident, (weight, text) in best.items():
+                    if ident in combined:
+                        combined[ident]["weight"] += weight
+                    else:
+                        combined[ident] = {"text": text, "kind": KINDS[ident[0]], "value": ident[1], "weight": weight}
+            results = sorted(combined.values(), key=lambda s: (-s["weight"], len(s["text"])))[:limit]
+            for suggestion in results:
+                suggestion["weight"] = round(suggestion["weight"], 2)
+        self._latencies.append(time.perf_counter() - started)
+        self._stats["queries"] += 1
+        return results
+
+    # --- Building ---
+
+    def load(self, builder: SuggestBuilder, cursor: Tuple[float, int] = (0.0, 0)):
+        """Swap in a fully built index; cursor is where paper-store updates continue from."""
+        self._base = builder.snapshot()
+        self._delta = _Snapshot({})
+        self._pending = SuggestBuilder()
+        self._cursor = cursor
+        self._built_at = time.time()
+
+    def _add_store_rows(self, builder: SuggestBuilder, cursor: Tuple[float, int]) -> Tuple[float, int]:
+        while True:
+            rows = paper_store.fields_since(cursor[0], cursor[1], STORE_BATCH)
+            if not rows:
+                return cursor
+            for title, authors, categories, _, _ in rows:
+                builder.add_paper(title, (authors or "").split(", "), (categories or "").split())
+            cursor = (rows[-1][3], rows[-1][4])
+
+    def rebuild(self):
+        started = time.perf_counter()
+        builder = SuggestBuilder()
+        for code in ARXIV_CATEGORIES:
+            builder.add_category(code, CATEGORY_WEIGHT)
+        cursor = self._add_store_rows(builder, (0.0, 0))
+        for title, authors in _library_papers():
+            builder.add_paper(title, authors, weight=SUGGEST_LIBRARY_BOOST)
+        _add_graph_entries(builder)
+        self.load(builder, cursor)
+        elapsed = time.perf_counter() - started
+        self._stats["rebuilds"] += 1
+        self._stats["last_build_s"] = round(elapsed, 2)
+        logger.info(f"Suggestion index rebuilt: {len(self._base)} entries in {elapsed:.1f}s")
+
+    def update(self):
+        """Fold paper-store rows written since the last build or update into the delta."""
+        cursor = self._add_store_rows(self._pending, self._cursor)
+        if cursor != self._cursor:
+            self._cursor = cursor
+            self._delta = self._pending.snapshot()
+            self._stats["updates"] += 1
+
+    def refresh(self):
+        with self._build_lock:
+            stale = time.time() - self._built_at > SUGGEST_REBUILD_INTERVAL
+            if not self._built_at or stale or len(self._pending.entries) > SUGGEST_DELTA_MAX:
+                self.rebuild()
+            else:
+                self.update()
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        return {
+            "entries": len(self._base),
+            "delta_entries": len(self._delta),
+            **self._stats,
+            "query_ms_p50": round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None,
+            "query_ms_p99": round(latencies[int(len(latencies) * 0.99)] * 1000, 3) if latencies else None,
+        }
+
+
+def _library_papers() -> List[Tuple[str, List[str]]]:
+    db = SessionLocal()
+    try:
+        rows = db.query(SavedArxivPaper.title, SavedArxivPaper.authors_str).all()
+        rows += db.query(WorkspacePaper.title, WorkspacePaper.authors_str).all()
+    finally:
+        db.close()
+    return [(title, (authors or "").split(", ")) for title, authors in rows]
+
+
+def _add_graph_entries(builder: SuggestBuilder):
+    driver = Neo4jConnection.get_driver()
+    if driver is None:
+        return
+    try:
+        with driver.session() as session:
+            for record in session.run(
+                "MATCH (p:Paper) WHERE p.title IS NOT NULL"
+                " RETURN p.title AS title, size([(p)<-[:CITES]-() | 1]) AS citations"
+            ):
+                builder.add_title(record["title"], 1.0 + math.log1p(record["citations"] or 0))
+            for record in session.run(
+                "MATCH (a:Author) WHERE a.name IS NOT NULL"
+                " RETURN a.name AS name, size([(a)-[:WROTE]->() | 1]) AS papers"
+            ):
+                builder.add_author(record["name"], float(record["papers"] or 1))
+    except Exception as e:
+        logger.warning(f"Could not read Neo4j papers and authors for suggestions: {e}")
+
+
+suggest_index = SuggestIndex()
+
+
+async def refresh_suggestions():
+    """Periodic job: full rebuild when due, otherwise fold in new paper-store rows."""
+    await asyncio.to_thread(suggest_index.refresh)
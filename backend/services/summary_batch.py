@@ -0,0 +1,218 @@
+"""
+Batch Summarization
+Summaries for many papers at once. Papers are deduplicated by summary cache key,
+cached summaries are returned straight away and the rest go through a fixed
+pool of workers shared by every user. Each user has their own queue and the
+workers serve the queues in turn, so one user's 100-paper batch cannot hold up
+another user's handful.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from services.ai_service import generate_summary, lookup_summary, summary_key
+
+logger = logging.getLogger(__name__)
+
+AI_BATCH_WORKERS = int(os.environ.get("AI_BATCH_WORKERS", 4))
+AI_BATCH_MAX_PAPERS = int(os.environ.get("AI_BATCH_MAX_PAPERS", 100))
+
+
+class FairWorkerPool:
+    """Fixed set of workers taking jobs from per-owner FIFO queues in round-robin order."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._queues: Dict[Any, deque] = {}
+        # Owners with queued jobs, in the order they are next served
+        self._turns: deque = deque()
+        self._ready: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running = 0
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "abandoned": 0, "wait_ms": 0.0}
+
+    def start(self):
+        if self._tasks and not any(task.done() for task in self._tasks):
+            return
+        # Restarting after a worker died: the old queue goes with the old workers, so fail
+        # its jobs rather than leave their callers waiting on futures nobody will resolve
+        for task in self._tasks:
+            task.cancel()
+        self._drop_queued(RuntimeError("Summary worker pool restarted"))
+        self._ready = asyncio.Semaphore(0)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, owner: Any, fn: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Queue fn() under owner; the returned future resolves with its result."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(owner)
+        if queue is None:
+            queue = self._queues[owner] = deque()
+            self._turns.append(owner)
+        queue.append((fn, future, time.perf_counter()))
+        self._stats["submitted"] += 1
+        self._ready.release()
+        return future
+
+    def _next_job(self) -> tuple:
+        owner = self._turns.popleft()
+        queue = self._queues[owner]
+        job = queue.popleft()
+        if queue:
+            self._turns.append(owner)
+        else:
+            del self._queues[owner]
+        return job
+
+    async def _worker(self):
+        while True:
+            await self._ready.acquire()
+            fn, future, queued_at = self._next_job()
+            if future.done():
+                # The caller went away (cancelled the future) while this was queued
+                self._stats["abandoned"] += 1
+                continue
+            self._stats["wait_ms"] += (time.perf_counter() - queued_at) * 1000
+            self._running += 1
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                self._stats["failed"] += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self._stats["completed"] += 1
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._running -= 1
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._drop_queued()
+
+    def _drop_queued(self, error: Optional[Exception] = None):
+        """Resolve every queued job's future (cancelled, or failed with error) and empty the queues."""
+        for queue in self._queues.values():
+            for _, future, _ in queue:
+                if future.done():
+                    continue
+                try:
+                    if error is None:
+                        future.cancel()
+                    else:
+                        future.set_exception(error)
+                except RuntimeError:
+                    # Its event loop is already closed; nobody can be awaiting it
+                    pass
+                self._stats["abandoned"] += 1
+        self._queues.clear()
+        self._turns.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        started = self._stats["completed"] + self._stats["failed"]
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "queued_owners": len(self._queues),
+            **{k: v for k, v in self._stats.items() if k != "wait_ms"},
+            "avg_wait_ms": round(self._stats["wait_ms"] / started, 1) if started else None,
+        }
+
+
+summary_pool = FairWorkerPool(AI_BATCH_WORKERS)
+
+
+async def summarize_batch(owner: Any, papers: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Summaries for a list of papers as events: "start" with the dedup counts, one
+    "summary" (or "error") per distinct paper in completion order, listing every
+    request index it answers, then "done" with totals and papers per minute.
+    """
+    started = time.perf_counter()
+    groups: Dict[str, Dict[str, Any]] = {}
+    for i, paper in enumerate(papers):
+        key = summary_key(paper["title"], paper["abstract"])
+        if key in groups:
+            groups[key]["indexes"].append(i)
+        else:
+            groups[key] = {"paper": paper, "indexes": [i]}
+
+    keys = list(groups)
+    cached = await asyncio.to_thread(lambda: [lookup_summary(key) for key in keys])
+    # Pool future -> summary key
+    pending: Dict[asyncio.Future, str] = {}
+    for key, result in zip(keys, cached):
+        if result is None:
+            paper = groups[key]["paper"]
+            future = summary_pool.submit(
+                owner, lambda k=key, p=paper: generate_summary(k, p["title"], p["abstract"], p.get("authors"), owner)
+            )
+            pending[future] = key
+
+    yield {
+        "event": "start",
+        "papers": len(papers),
+        "unique": len(groups),
+        "duplicates": len(papers) - len(groups),
+        "cached": len(groups) - len(pending),
+        "queued": len(pending),
+    }
+
+    def summary_event(key: str, result: dict) -> Dict[str, Any]:
+        return {
+            "event": "summary",
+            "indexes": groups[key]["indexes"],
+            "title": groups[key]["paper"]["title"],
+            **result,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    for key, result in zip(keys, cached):
+        if result is not None:
+            yield summary_event(key, result)
+
+    failed = 0
+    waiting = set(pending)
+    try:
+        while waiting:
+            done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                key = pending[future]
+                error = RuntimeError("Summary job was cancelled") if future.cancelled() else future.exception()
+                if error is not None:
+                    failed += 1
+                    logger.error(f"Batch summary failed for {groups[key]['paper']['title'][:80]!r}: {error}")
+                    yield {"event": "error", "indexes": groups[key]["indexes"], "title": groups[key]["paper"]["title"], "error": str(error)}
+                else:
+                    yield summary_event(key, future.result())
+    finally:
+        # Client went away mid-stream: drop this batch's jobs that have not started yet
+        for future in pending:
+            future.cancel()
+
+    elapsed = time.perf_counter() - started
+    summarized = len(groups) - failed
+    yield {
+        "event": "done",
+        "papers": len(papers),
+        "unique": len(groups),
+        "summarized": summarized,
+        "cached": len(groups) - len(pending),
+        "generated": len(pending) - failed,
+        "failed": failed,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "papers_per_min": round(summarized / elapsed * 60, 1) if elapsed > 0 else None,
+    }
+
@@ -0,0 +1,489 @@
+"""
+Paper Vector Index
+"More like this" over every paper we have seen: saved arXiv papers, workspace
+papers, Neo4j Paper nodes and everything in the local paper store (which holds
+all cached search results). Embeddings are stored as float16 rows in one
+append-only file that is memory-mapped, so every worker process shares the same
+page cache. An IVF index (spherical k-means centroids plus per-list row ids)
+limits each query to a few lists; rows appended since the last build are
+scanned exactly until the next build assigns them to their lists.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from db.neo4j import Neo4jConnection
+from db.postgres import SessionLocal
+from models.user_models import SavedArxivPaper, WorkspacePaper
+from services.arxiv_service import split_version, to_unified
+from services.embedding_service import EMBEDDING_DIM, content_hash, encode, paper_text
+from services.paper_store import paper_store
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_DIR = os.environ.get("VECTOR_INDEX_DIR", "./vector_index")
+VECTOR_INDEX_INTERVAL = int(os.environ.get("VECTOR_INDEX_INTERVAL", 1800))
+# Lists scanned per query; more lists trade latency for recall
+VECTOR_INDEX_NPROBE = int(os.environ.get("VECTOR_INDEX_NPROBE", 16))
+# Below this many vectors an exact scan is already fast enough and no IVF is built
+VECTOR_INDEX_MIN_IVF_ROWS = int(os.environ.get("VECTOR_INDEX_MIN_IVF_ROWS", 20000))
+# Centroids are retrained once the index has grown by this factor since the last training
+VECTOR_INDEX_RETRAIN_GROWTH = float(os.environ.get("VECTOR_INDEX_RETRAIN_GROWTH", 2.0))
+
+KMEANS_ITERATIONS = 8
+TRAIN_POINTS_PER_LIST = 16
+SCAN_CHUNK_ROWS = 1 << 16
+STORE_BATCH = 2000
+
+_KEEP_FIELDS = ("source", "source_id", "title", "abstract", "authors", "year", "citation_count", "url", "pdf_url", "doi")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS items (row INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, hash TEXT NOT NULL, doc TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT NOT NULL)",
+)
+
+
+def paper_key(paper: Dict[str, Any]) -> Optional[str]:
+    source, source_id = paper.get("source"), paper.get("source_id")
+    if not source or not source_id or not paper.get("title"):
+        return None
+    if source == "arxiv":
+        source_id = split_version(source_id)[0]
+    return f"{source}:{source_id}"
+
+
+class _IVF:
+    def __init__(self, generation: int, rows: int, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        self.generation = generation
+        self.rows = rows
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+
+class VectorIndex:
+    def __init__(self, directory: str = VECTOR_INDEX_DIR, nprobe: int = VECTOR_INDEX_NPROBE):
+        self.directory = directory
+        self.nprobe = nprobe
+        self.row_bytes = EMBEDDING_DIM * 2
+        self._vectors_path = os.path.join(directory, "vectors.f16")
+        self._ivf_path = os.path.join(directory, "ivf.json")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._disabled = False
+        self._map: Optional[np.memmap] = None
+        self._ivf: Optional[_IVF] = None
+        self._ivf_mtime = None
+        self._latencies = deque(maxlen=500)
+        self._stats = {"queries": 0, "ivf_queries": 0, "exact_queries": 0, "candidates": 0, "written": 0}
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and not self._disabled:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                # Other workers may hold the write lock while appending; wait for them
+                conn = sqlite3.connect(os.path.join(self.directory, "meta.db"), timeout=30, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+                self._conn = conn
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Vector index unavailable: {e}")
+                self._disabled = True
+        return self._conn
+
+    # --- Vector file ---
+
+    def _vectors(self) -> Optional[np.ndarray]:
+        """Memory map of every complete row, remapped when another process has appended."""
+        try:
+            rows = os.path.getsize(self._vectors_path) // self.row_bytes
+        except OSError:
+            return None
+        if rows == 0:
+            return None
+        if self._map is None or len(self._map) != rows:
+            self._map = np.memmap(self._vectors_path, dtype=np.float16, mode="r", shape=(rows, EMBEDDING_DIM))
+        return self._map
+
+    def _load_ivf(self) -> Optional[_IVF]:
+        try:
+            mtime = os.path.getmtime(self._ivf_path)
+        except OSError:
+            self._ivf = None
+            return None
+        if mtime != self._ivf_mtime:
+            try:
+                with open(self._ivf_path) as f:
+                    meta = json.load(f)
+                prefix = os.path.join(self.directory, f"ivf-{meta['generation']}")
+                self._ivf = _IVF(
+                    meta["generation"], meta["rows"],
+                    np.load(f"{prefix}-centroids.npy"),
+                    np.load(f"{prefix}-order.npy", mmap_mode="r"),
+                    np.load(f"{prefix}-offsets.npy"),
+                )
+                self._ivf_mtime = mtime
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Could not load IVF index, using exact search: {e}")
+                self._ivf = None
+        return self._ivf
+
+    # --- Writes ---
+
+    def add_many(self, papers: List[Dict[str, Any]]) -> int:
+        """
+        Add or refresh papers (cross-source dicts). New papers are appended as rows;
+        papers whose text changed are rewritten in place. Returns rows written.
+        """
+        items: Dict[str, Dict[str, Any]] = {}
+        for paper in papers:
+            key = paper_key(paper)
+            if key:
+                items[key] = {f: paper.get(f) for f in _KEEP_FIELDS}
+        if not items:
+            return 0
+        hashes = {key: content_hash(paper_text(doc)) for key, doc in items.items()}
+
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return 0
+            try:
+                known = self._rows_for(conn, list(items))
+            except sqlite3.Error as e:
+                logger.warning(f"Vector index read error: {e}")
+                return 0
+        changed = [k for k in items if k not in known or known[k][1] != hashes[k]]
+        if not changed:
+            return 0
+        vectors = encode([paper_text(items[k]) for k in changed])
+        return self._write(changed, [items[k] for k in changed], [hashes[k] for k in changed], vectors)
+
+    def _write(self, keys: List[str], docs: List[Dict[str, Any]], hashes: List[str], vectors: np.ndarray) -> int:
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return 0
+            try:
+                # BEGIN IMMEDIATE takes SQLite's write lock, which also serializes appends across processes
+                conn.execute("BEGIN IMMEDIATE")
+                known = self._rows_for(conn, keys)
+                first_new = conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM items").fetchone()[0]
+                new_keys = [k for k in keys if k not in known]
+                new_rows = dict(zip(new_keys, range(first_new, first_new + len(new_keys))))
+                rows = [known[k][0] if k in known else new_rows[k] for k in keys]
+                data = vectors.astype(np.float16)
+                mode = "r+b" if os.path.exists(self._vectors_path) else "w+b"
+                with open(self._vectors_path, mode) as f:
+                    for row, vector in zip(rows, data):
+                        if row < first_new:
+                            f.seek(row * self.row_bytes)
+                            f.write(vector.tobytes())
+                    if new_keys:
+                        # New rows are consecutive, so they go out in one write. Rows a crashed
+                        # writer left without keys are overwritten rather than truncated, since
+                        # other processes may still have them mapped.
+                        f.seek(first_new * self.row_bytes)
+                        f.write(data[[i for i, k in enumerate(keys) if k in new_rows]].tobytes())
+                conn.executemany(
+                    "INSERT INTO items (row, key, hash, doc) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET hash=excluded.hash, doc=excluded.doc",
+                    [(row, key, digest, json.dumps(doc, separators=(",", ":"))) for row, key, digest, doc in zip(rows, keys, hashes, docs)],
+                )
+                conn.execute("COMMIT")
+            except (sqlite3.Error, OSError) as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                logger.warning(f"Vector index write error: {e}")
+                return 0
+        self._stats["written"] += len(keys)
+        return len(keys)
+
+    @staticmethod
+    def _rows_for(conn: sqlite3.Connection, keys: List[str]) -> Dict[str, Tuple[int, str]]:
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            for key, row, digest in conn.execute(
+                f"SELECT key, row, hash FROM items WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ):
+                found[key] = (row, digest)
+        return found
+
+    def get_state(self, name: str, default: str = "") -> str:
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return default
+            row = conn.execute("SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, name: str, value: str):
+        with self._lock:
+            conn = self._connection()
+            if conn is not None:
+                conn.execute("INSERT OR REPLACE INTO state (name, value) VALUES (?, ?)", (name, value))
+
+    # --- IVF build ---
+
+    def build(self) -> Dict[str, Any]:
+        """
+        Bring the IVF index up to date: retrain centroids when there are none or the
+        index has grown past VECTOR_INDEX_RETRAIN_GROWTH, otherwise only assign the
+        rows appended since the last build. Runs in one process (the one running
+        background jobs); readers pick up the new generation on their next query.
+        """
+        with self._build_lock:
+            vectors = self._vectors()
+            rows = 0 if vectors is None else len(vectors)
+            if rows < VECTOR_INDEX_MIN_IVF_ROWS:
+                return {"rows": rows, "action": "none"}
+            started = time.perf_counter()
+            ivf = self._load_ivf()
+            if ivf is None or rows >= ivf.rows * VECTOR_INDEX_RETRAIN_GROWTH:
+                centroids = _train_centroids(vectors, _list_count(rows))
+                lists = _assign(vectors, centroids, 0, rows)
+                order = np.argsort(lists, kind="stable").astype(np.int64)
+                counts = np.bincount(lists, minlength=len(centroids))
+                action = "trained"
+            elif rows > ivf.rows:
+                centroids = ivf.centroids
+                old_lists = np.repeat(np.arange(len(centroids)), np.diff(ivf.offsets))
+                lists = np.concatenate([old_lists, _assign(vectors, centroids, ivf.rows, rows)])
+                all_rows = np.concatenate([np.asarray(ivf.order), np.arange(ivf.rows, rows, dtype=np.int64)])
+                order = all_rows[np.argsort(lists, kind="stable")]
+                counts = np.bincount(lists, minlength=len(centroids))
+                action = "appended"
+            else:
+                return {"rows": rows, "action": "none"}
+            offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+            self._write_ivf((ivf.generation if ivf else 0) + 1, rows, centroids, order, offsets)
+            elapsed = time.perf_counter() - started
+            logger.info(f"Vector index {action}: {rows} rows in {len(centroids)} lists ({elapsed:.1f}s)")
+            return {"rows": rows, "action": action, "lists": len(centroids), "seconds": round(elapsed, 2)}
+
+    def _write_ivf(self, generation: int, rows: int, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        prefix = os.path.join(self.directory, f"ivf-{generation}")
+        for name, array in (("centroids", centroids), ("order", order), ("offsets", offsets)):
+            np.save(f"{prefix}-{name}.tmp.npy", array)
+            os.replace(f"{prefix}-{name}.tmp.npy", f"{prefix}-{name}.npy")
+        with open(self._ivf_path + ".tmp", "w") as f:
+            json.dump({"generation": generation, "rows": rows, "lists": len(centroids)}, f)
+        os.replace(self._ivf_path + ".tmp", self._ivf_path)
+        # Readers still mapping the previous generation keep their open files
+        for name in ("centroids", "order", "offsets"):
+            try:
+                os.remove(os.path.join(self.directory, f"ivf-{generation - 1}-{name}.npy"))
+            except OSError:
+                pass
+
+    # --- Reads ---
+
+    def find(self, paper_id: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """(row, doc) for "source:id", or for a bare ID in any source."""
+        candidates = [paper_id] if ":" in paper_id else []
+        bare = paper_id.split(":", 1)[1] if paper_id.startswith(("arxiv:", "semantic_scholar:", "openalex:", "neo4j:")) else paper_id
+        candidates += [f"arxiv:{split_version(bare)[0]}", f"semantic_scholar:{bare}", f"openalex:{bare}", f"neo4j:{bare}"]
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return None
+            for key in candidates:
+                row = conn.execute("SELECT row, doc FROM items WHERE key = ?", (key,)).fetchone()
+                if row:
+                    return row[0], json.loads(row[1])
+        return None
+
+    def nearest(self, query: np.ndarray, limit: int, exclude: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+        """(rows, cosine scores, info) of the closest vectors to a unit query vector."""
+        vectors = self._vectors()
+        if vectors is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), {"method": "exact", "candidates": 0}
+        total = len(vectors)
+        query = query.astype(np.float32)
+        ivf = self._load_ivf()
+        if ivf is not None and ivf.rows <= total:
+            nprobe = min(self.nprobe, len(ivf.centroids))
+            probe = np.argpartition(-(ivf.centroids @ query), nprobe - 1)[:nprobe]
+            parts = [ivf.order[ivf.offsets[l]:ivf.offsets[l + 1]] for l in probe]
+            parts.append(np.arange(ivf.rows, total, dtype=np.int64))
+            rows = np.sort(np.concatenate(parts))
+            scores = vectors[rows].astype(np.float32) @ query
+            info = {"method": "ivf", "candidates": len(rows), "lists_probed": int(nprobe)}
+        else:
+            rows = np.arange(total, dtype=np.int64)
+            scores = np.concatenate([
+                vectors[i:i + SCAN_CHUNK_ROWS].astype(np.float32) @ query for i in range(0, total, SCAN_CHUNK_ROWS)
+            ])
+            info = {"method": "exact", "candidates": total}
+        if exclude is not None:
+            scores[rows == exclude] = -np.inf
+        k = min(limit, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k] if k else np.zeros(0, dtype=np.int64)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return rows[top], scores[top], info
+
+    def docs_for_rows(self, rows: List[int]) -> Dict[int, Dict[str, Any]]:
+        if not rows:
+            return {}
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return {}
+            found = conn.execute(f"SELECT row, doc FROM items WHERE row IN ({','.join('?' * len(rows))})", rows).fetchall()
+        return {row: json.loads(doc) for row, doc in found}
+
+    def similar(self, paper_id: str, limit: int) -> Optional[Dict[str, Any]]:
+        started = time.perf_counter()
+        item = self.find(paper_id)
+        vectors = self._vectors()
+        if item is None or vectors is None or item[0] >= len(vectors):
+            return None
+        row, doc = item
+        # Over-fetch a little: rows appended by a crashed writer have no document
+        rows, scores, info = self.nearest(np.asarray(vectors[row]), limit + 5, exclude=row)
+        docs = self.docs_for_rows([int(r) for r in rows])
+        papers = [{**docs[int(r)], "score": round(float(s), 4)} for r, s in zip(rows, scores) if int(r) in docs and r != row][:limit]
+        elapsed = time.perf_counter() - started
+        self._latencies.append(elapsed)
+        self._stats["queries"] += 1
+        self._stats[f"{info['method']}_queries"] += 1
+        self._stats["candidates"] += info["candidates"]
+        return {"paper": doc, "papers": papers, **info, "latency_ms": round(elapsed * 1000, 2)}
+
+    def stats(self) -> Dict[str, Any]:
+        vectors = self._vectors()
+        ivf = self._load_ivf()
+        latencies = sorted(self._latencies)
+        queries = self._stats["queries"]
+        return {
+            "vectors": 0 if vectors is None else len(vectors),
+            "ivf_rows": ivf.rows if ivf else 0,
+            "ivf_lists": len(ivf.centroids) if ivf else 0,
+            "ivf_generation": ivf.generation if ivf else 0,
+            "nprobe": self.nprobe,
+            **self._stats,
+            "avg_candidates": round(self._stats["candidates"] / queries) if queries else None,
+            "query_ms_avg": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            "query_ms_p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else None,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._map = None
+
+
+def _list_count(rows: int) -> int:
+    return int(np.clip(4 * np.sqrt(rows), 16, 8192))
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, start: int, stop: int) -> np.ndarray:
+    lists = np.empty(stop - start, dtype=np.int64)
+    for i in range(start, stop, SCAN_CHUNK_ROWS):
+        chunk = vectors[i:min(i + SCAN_CHUNK_ROWS, stop)].astype(np.float32)
+        lists[i - start:i - start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return lists
+
+
+def _train_centroids(vectors: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of rows; empty lists are reseeded from random points."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), lists * TRAIN_POINTS_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))].astype(np.float32)
+    centroids = sample[rng.choice(sample_size, lists, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=lists)
+        filled = np.flatnonzero(counts)
+        sums = np.add.reduceat(sample[order], np.concatenate([[0], np.cumsum(counts)[:-1]])[filled], axis=0)
+        centroids = centroids.copy()
+        centroids[filled] = sums
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-9)
+    return centroids
+
+
+vector_index = VectorIndex()
+
+
+# --- Indexing job ---
+
+def _library_papers() -> List[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        papers = [
+            {"source": "arxiv", "source_id": p.arxiv_id, "title": p.title, "abstract": p.summary or "",
+             "authors": (p.authors_str or "").split(", ") if p.authors_str else [], "pdf_url": p.pdf_url,
+             "url": f"https://arxiv.org/abs/{p.arxiv_id}"}
+            for p in db.query(SavedArxivPaper).all()
+        ]
+        papers += [
+            {"source": p.source, "source_id": p.source_id, "title": p.title, "abstract": p.abstract or "",
+             "authors": (p.authors_str or "").split(", ") if p.authors_str else [], "year": p.year,
+             "pdf_url": p.pdf_url, "doi": p.doi}
+            for p in db.query(WorkspacePaper).all()
+        ]
+    finally:
+        db.close()
+    return papers
+
+
+def _graph_papers() -> List[Dict[str, Any]]:
+    driver = Neo4jConnection.get_driver()
+    if driver is None:
+        return []
+    try:
+        with driver.session() as session:
+            result = session.run(
+                "MATCH (p:Paper) WHERE p.title IS NOT NULL"
+                " RETURN p.id AS id, p.title AS title, p.abstract AS abstract, p.year AS year, p.url AS url"
+            )
+            return [
+                {"source": "neo4j", "source_id": str(r["id"]), "title": r["title"], "abstract": r["abstract"] or "",
+                 "year": r["year"], "url": r["url"]}
+                for r in result if r["id"] is not None
+            ]
+    except Exception as e:
+        logger.warning(f"Could not read Neo4j papers for the vector index: {e}")
+        return []
+
+
+def _index_paper_store() -> int:
+    """Index paper store rows written since the last run, tracked by a (stored_at, id) cursor."""
+    stored_at, row_id = map(float, vector_index.get_state("paper_store_cursor", "0 0").split())
+    written = 0
+    while True:
+        batch = paper_store.docs_since(stored_at, int(row_id), STORE_BATCH)
+        if not batch:
+            break
+        written += vector_index.add_many([to_unified(doc) if source == "arxiv" else doc for source, doc, _, _ in batch])
+        stored_at, row_id = batch[-1][2], batch[-1][3]
+        vector_index.set_state("paper_store_cursor", f"{stored_at!r} {int(row_id)}")
+    return written
+
+
+async def refresh_vector_index() -> int:
+    """Periodic job: index new or changed papers from every source, then update the IVF lists."""
+    written = await asyncio.to_thread(vector_index.add_many, await asyncio.to_thread(_library_papers))
+    written += await asyncio.to_thread(vector_index.add_many, await asyncio.to_thread(_graph_papers))
+    written += await asyncio.to_thread(_index_paper_store)
+    await asyncio.to_thread(vector_index.build)
+    logger.info(f"Vector index: {written} papers added or updated")
+    return written
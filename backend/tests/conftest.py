@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# Services read their paths and limits from the environment at import time
+_workdir = tempfile.mkdtemp(prefix="research-search-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir}/research.db")
+os.environ.setdefault("UPSTREAM_CACHE_PATH", f"{_workdir}/upstream_cache.db")
+os.environ.setdefault("PAPER_STORE_PATH", f"{_workdir}/paper_store.db")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", f"{_workdir}/embeddings.db")
+os.environ.setdefault("VECTOR_INDEX_DIR", f"{_workdir}/vector_index")
+# The stand-in arXiv feed answers at once; the default 3s interval would only slow the tests
+os.environ.setdefault("ARXIV_MIN_INTERVAL", "0.001")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,76 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+from services import rate_limiter
+from services.enrichment_service import enrich_papers, enrichment_stats
+from services.http_client import UpstreamClients
+from services.semantic_scholar_service import search_semantic_scholar
+
+
+def _install(requests):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((request.method, request.url.path, rate_limiter.current_lane.get()))
+        await asyncio.sleep(0.05)
+        if request.method == "POST":
+            ids = json.loads(request.content)["ids"]
+            return httpx.Response(200, json=[{"paperId": f"p-{i}", "citationCount": 42} for i in ids])
+        return httpx.Response(200, json={"total": 1, "offset": 0, "data": [{"paperId": "s1", "title": "Graph networks"}]})
+
+    UpstreamClients._clients["semantic_scholar"] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    # A fresh bucket per test: one token, refilled at the default one request per second
+    rate_limiter._schedulers.pop("semantic_scholar", None)
+
+
+def _arxiv_papers(prefix):
+    return [{"source": "arxiv", "source_id": f"{prefix}.{i:05d}v1", "citation_count": 0} for i in range(3)]
+
+
+def test_inline_enrichment_when_semantic_scholar_is_idle():
+    requests = []
+    _install(requests)
+
+    async def run():
+        return await enrich_papers(_arxiv_papers("2401"), budget_ms=800)
+
+    papers = asyncio.run(run())
+    assert [p["citation_count"] for p in papers] == [42, 42, 42]
+    assert requests == [("POST", "/graph/v1/paper/batch", "interactive")]
+
+
+def test_concurrent_search_defers_enrichment_to_background():
+    requests = []
+    _install(requests)
+
+    async def run():
+        search = asyncio.ensure_future(search_semantic_scholar("graph networks", limit=5))
+        # As in multi-search, the Semantic Scholar search is on the wire before arXiv answers
+        while not requests:
+            await asyncio.sleep(0.005)
+        started = time.perf_counter()
+        papers = await enrich_papers(_arxiv_papers("2402"), budget_ms=800)
+        elapsed = time.perf_counter() - started
+        await search
+        # The deferred batch waits for the next token, about a second after the search
+        for _ in range(40):
+            if len(requests) == 2:
+                break
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(0.1)
+        again = await enrich_papers(_arxiv_papers("2402"), budget_ms=800)
+        return papers, elapsed, again
+
+    deferred = enrichment_stats()["deferred"]
+    papers, elapsed, again = asyncio.run(run())
+
+    # The search took the only token, so enrichment returned at once instead of spending its budget
+    assert elapsed < 0.3
+    assert [p["citation_count"] for p in papers] == [0, 0, 0]
+    assert enrichment_stats()["deferred"] == deferred + 1
+    assert requests[0] == ("GET", "/graph/v1/paper/search", "interactive")
+    assert requests[1] == ("POST", "/graph/v1/paper/batch", "background")
+    # The background batch filled the cache for the next search
+    assert [p["citation_count"] for p in again] == [42, 42, 42]
+    assert len(requests) == 2
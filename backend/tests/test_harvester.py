@@ -0,0 +1,107 @@
+import asyncio
+import re
+from urllib.parse import parse_qs
+
+import httpx
+
+from benchmarks.feeds import make_feed
+from db.postgres import SessionLocal, init_db
+from models.user_models import ArxivHarvestCheckpoint
+from services import harvester
+from services.http_client import UpstreamClients
+
+PAGE = 20
+
+
+def _install(category_total, requests, fail_at=None, blank_at=None):
+    """A stand-in arXiv API serving `category_total` papers newest first, paged by start/max_results."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        query = parse_qs(request.url.query.decode())
+        start = int(query["start"][0])
+        max_results = int(query["max_results"][0])
+        requests.append((start, query["search_query"][0]))
+        if start == fail_at:
+            return httpx.Response(500, text="upstream unavailable")
+        count = max(0, min(max_results, category_total - start))
+        body = make_feed(count, start=start, total=category_total)
+        if start == blank_at:
+            # Entries without a title are rejected by the paper store
+            body = re.sub(r"<title>.*?</title>", "<title></title>", body, flags=re.DOTALL)
+        return httpx.Response(200, text=body, headers={"Content-Type": "application/atom+xml"})
+
+    UpstreamClients._clients["arxiv"] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def _checkpoint(category):
+    db = SessionLocal()
+    try:
+        return db.query(ArxivHarvestCheckpoint).filter(ArxivHarvestCheckpoint.category == category).first()
+    finally:
+        db.close()
+
+
+def setup_module():
+    init_db()
+    harvester.HARVEST_PAGE_SIZE = PAGE
+
+
+def test_checkpoint_advances_and_completes():
+    requests = []
+    _install(50, requests)
+
+    stored = asyncio.run(harvester.harvest_category("cs.LG"))
+
+    assert stored == 50
+    assert [start for start, _ in requests] == [0, 20, 40]
+    checkpoint = _checkpoint("cs.LG")
+    assert checkpoint.total_harvested == 50
+    assert checkpoint.window_from is None and checkpoint.window_to is None
+    assert checkpoint.next_start == 0
+    assert checkpoint.harvested_until is not None
+
+
+def test_interrupted_run_resumes_from_checkpoint():
+    requests = []
+    _install(70, requests, fail_at=40)
+
+    try:
+        asyncio.run(harvester.harvest_category("cs.CL"))
+    except httpx.HTTPStatusError:
+        pass
+    else:
+        raise AssertionError("the failing page should stop the run")
+
+    checkpoint = _checkpoint("cs.CL")
+    window = (checkpoint.window_from, checkpoint.window_to)
+    assert checkpoint.next_start == 40
+    assert checkpoint.total_harvested == 40
+    assert all(window)
+    assert checkpoint.last_error
+
+    requests.clear()
+    _install(70, requests)
+    stored = asyncio.run(harvester.harvest_category("cs.CL"))
+
+    # Same window, starting at the failed page rather than from the top
+    assert stored == 30
+    assert [start for start, _ in requests] == [40, 60]
+    assert all(f"[{window[0]} TO {window[1]}]" in search for _, search in requests)
+    checkpoint = _checkpoint("cs.CL")
+    assert checkpoint.total_harvested == 70
+    assert checkpoint.harvested_until == window[1]
+    assert checkpoint.last_error is None
+
+
+def test_rejected_page_still_advances_checkpoint():
+    requests = []
+    _install(50, requests, blank_at=20)
+
+    stored = asyncio.run(harvester.harvest_category("cs.AI"))
+
+    assert stored == 30
+    assert [start for start, _ in requests] == [0, 20, 40]
+    checkpoint = _checkpoint("cs.AI")
+    assert checkpoint.window_to is None
+    assert checkpoint.total_harvested == 50
+    assert harvester.harvest_stats()["categories"]["cs.AI"]["skipped"] == 20
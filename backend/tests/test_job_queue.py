@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+from db.postgres import SessionLocal, init_db
+from models.user_models import Job
+from services import job_queue
+from services.job_queue import enqueue, register_job
+
+# Fits the default thread pool on a single-CPU machine (five workers)
+RACERS = 4
+
+
+async def _noop(payload, user_id):
+    return payload
+
+
+def setup_module():
+    init_db()
+    register_job("test_noop", _noop)
+
+
+def test_concurrent_identical_requests_share_one_job():
+    # Every request passes the SELECT before any of them inserts, the race the unique index settles
+    barrier = threading.Barrier(RACERS)
+    query = SessionLocal.class_.query
+
+    def racing_query(self, *entities):
+        if entities == (Job,) and not getattr(threading.current_thread(), "raced", False):
+            threading.current_thread().raced = True
+            barrier.wait(timeout=5)
+        return query(self, *entities)
+
+    async def run():
+        return await asyncio.gather(*[enqueue("test_noop", {"paper": 1}, user_id=7) for _ in range(RACERS)])
+
+    SessionLocal.class_.query = racing_query
+    try:
+        jobs = asyncio.run(run())
+    finally:
+        SessionLocal.class_.query = query
+
+    assert len({job["job_id"] for job in jobs}) == 1
+    db = SessionLocal()
+    try:
+        assert db.query(Job).filter(Job.kind == "test_noop", Job.user_id == 7).count() == 1
+    finally:
+        db.close()
+
+
+def test_finished_job_is_not_reused():
+    first = asyncio.run(enqueue("test_noop", {"paper": 2}, user_id=7))
+    job_queue.cancel_job(SessionLocal().query(Job).filter(Job.job_id == first["job_id"]).one())
+    second = asyncio.run(enqueue("test_noop", {"paper": 2}, user_id=7))
+    assert second["job_id"] != first["job_id"]
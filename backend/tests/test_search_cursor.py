@@ -0,0 +1,55 @@
+import pytest
+
+from services.search_cursor import (
+    CURSOR_MAX_SEEN, CURSOR_SEEN_PAGES, InvalidCursor, decode_cursor, encode_cursor, fingerprint, seen_digest,
+)
+
+# Keys per paper: DOI, arXiv ID, source ID and title
+KEYS_PER_PAPER = 4
+# Largest page multi-search returns: limit=30 from each of three sources
+PAPERS_PER_PAGE = 90
+
+
+def _page_digests(page: int):
+    return [seen_digest(f"key:{page}:{paper}:{k}") for paper in range(PAPERS_PER_PAGE) for k in range(KEYS_PER_PAPER)]
+
+
+def test_cursor_length_is_bounded_after_many_pages():
+    params = fingerprint(query="graph neural networks", sources=["arxiv", "semantic_scholar", "openalex"], limit=30)
+    positions = {"arxiv": 0, "semantic_scholar": 0, "openalex": 0}
+    seen_pages = []
+    lengths = []
+    for page in range(50):
+        if page:
+            state = decode_cursor(cursor, params)
+            seen_pages = state["seen"]
+            positions = {name: offset + 30 for name, offset in state["pos"].items()}
+        seen_pages.append(_page_digests(page))
+        cursor = encode_cursor(params, positions, seen_pages, page + 1)
+        lengths.append(len(cursor))
+
+    # Well inside the 8 KB request-line limit of common proxies and servers
+    assert max(lengths) < 4096
+    # Once the digest cap is reached the cursor stops growing
+    assert max(lengths[CURSOR_SEEN_PAGES:]) - min(lengths[CURSOR_SEEN_PAGES:]) < 64
+    state = decode_cursor(cursor, params)
+    assert state["page"] == 50
+    assert state["pos"] == {"arxiv": 49 * 30, "semantic_scholar": 49 * 30, "openalex": 49 * 30}
+    assert sum(len(digests) for digests in state["seen"]) <= CURSOR_MAX_SEEN
+
+
+def test_cursor_keeps_the_most_recent_digests():
+    params = fingerprint(query="q")
+    pages = [[seen_digest(f"{page}:{i}") for i in range(50)] for page in range(CURSOR_SEEN_PAGES + 2)]
+    state = decode_cursor(encode_cursor(params, {"arxiv": 10}, pages, 1), params)
+    assert state["seen"] == pages[-CURSOR_SEEN_PAGES:]
+
+
+def test_tampered_or_foreign_cursor_is_rejected():
+    params = fingerprint(query="q")
+    cursor = encode_cursor(params, {"arxiv": 10}, [[seen_digest("doi:10.1/x")]], 1)
+    body, tag = cursor.split(".")
+    with pytest.raises(InvalidCursor):
+        decode_cursor(body[:-2] + "AA." + tag, params)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, fingerprint(query="other"))
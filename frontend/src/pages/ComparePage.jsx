@@ -112,19 +112,22 @@ const ComparePage = () => {
             <h3 className="font-serif text-base font-semibold mb-3 flex items-center gap-2">
               <Sparkles className="h-4 w-4 text-primary" /> AI Analysis
             </h3>
-            <p className="text-sm text-foreground leading-relaxed mb-3">{aiComp.summary}</p>
-            {aiComp.key_points?.length > 0 && (
-              <ul className="space-y-1.5">
-                {aiComp.key_points.map((pt, i) => (
-                  <li key={i} className="text-xs text-muted-foreground pl-3 relative before:content-[''] before:absolute before:left-0 before:top-1.5 before:w-1 before:h-1 before:rounded-full before:bg-primary">
-                    {pt}
-                  </li>
-                ))}
-              </ul>
-            )}
-            {aiComp.significance && (
+            <p className="text-sm text-foreground leading-relaxed mb-3">{aiComp.overview}</p>
+            {[['differences', 'Differences'], ['common_themes', 'Common themes']].map(([key, label]) => aiComp[key]?.length > 0 && (
+              <div key={key} className="mb-3">
+                <p className="text-xs font-medium text-muted-foreground mb-1.5">{label}</p>
+                <ul className="space-y-1.5">
+                  {aiComp[key].map((pt, i) => (
+                    <li key={i} className="text-xs text-muted-foreground pl-3 relative before:content-[''] before:absolute before:left-0 before:top-1.5 before:w-1 before:h-1 before:rounded-full before:bg-primary">
+                      {pt}
+                    </li>
+                  ))}
+                </ul>
+              </div>
+            ))}
+            {aiComp.most_impactful && (
               <div className="mt-3 p-3 bg-primary/5 rounded border border-primary/10">
-                <p className="text-xs text-primary/80 italic">{aiComp.significance}</p>
+                <p className="text-xs text-primary/80 italic">{aiComp.most_impactful}</p>
               </div>
             )}
           </Card>